@@ -0,0 +1,205 @@
+"""
+Deterministic pre-router in front of the RAG agent. Questions that plainly ask
+for the current wait time at one hospital, or for the hospital with the
+shortest wait, are answered by calling the wait-time tool directly and filling
+in a template, skipping the agent's LLM round trips. Anything else, or
+anything ambiguous, is left to the agent.
+"""
+import asyncio
+import logging
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from langchain_core.agents import AgentAction
+
+from tools.wait_times import (
+    aget_current_wait_times,
+    aget_most_available_hospital,
+    format_wait_minutes,
+)
+from utils.entity_index import (
+    EntityNameIndex,
+    GraphNameIndex,
+    hospital_names,
+    normalize_name,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+_WAIT = re.compile(r"\bwait(s|ing)?\b")
+_SHORTEST_WAIT = re.compile(
+    r"\b(shortest|lowest|least|smallest|minimum|quickest|fastest)\b.*\bwait"
+    r"|\bwait.*\b(shortest|lowest|least|smallest|minimum|quickest|fastest)\b"
+    r"|\b(least busy|most available)\b"
+)
+# aggregate or historical wait times: only the agent (Graph tool) knows them
+_AGGREGATE = re.compile(
+    r"\b(average|avg|mean|median|max|maximum|longest|highest|historical|history"
+    r"|past|last|previous|yesterday|total|trend|typical|typically|usually"
+    r"|compare|per|each|every|all)\b"
+)
+# past waits, e.g. "what was the wait in 2019": only the agent knows them
+_PAST = re.compile(r"\b(was|were|did|had|been)\b|\b(19|20)\d{2}\b")
+# a place the question is scoped to; the wait-time tools only know the
+# current waits of all hospitals
+_LOCATION = re.compile(r"\b(near|nearby|nearest|closest|around|close to)\b")
+_STATE_NAMES = re.compile(
+    r"\b(alabama|alaska|arizona|arkansas|california|colorado|connecticut"
+    r"|delaware|florida|georgia|hawaii|idaho|illinois|indiana|iowa|kansas"
+    r"|kentucky|louisiana|maine|maryland|massachusetts|michigan|minnesota"
+    r"|mississippi|missouri|montana|nebraska|nevada|new hampshire|new jersey"
+    r"|new mexico|new york|north carolina|north dakota|ohio|oklahoma|oregon"
+    r"|pennsylvania|rhode island|south carolina|south dakota|tennessee|texas"
+    r"|utah|vermont|virginia|washington|west virginia|wisconsin|wyoming)\b"
+)
+_CAPITALIZED = re.compile(r"\b[A-Z][A-Za-z]*\b")
+# capitalized words that name no place or entity
+_PLAIN_CAPITALIZED = {"i", "er", "hospital"}
+# other subjects the question may also be about
+_OTHER_TOPICS = re.compile(
+    r"\b(review|reviews|patient|patients|physician|physicians|doctor|doctors"
+    r"|visit|visits|billing|billed|insurance|payer|payers|say|saying|said"
+    r"|complain|complaining|state|states)\b"
+)
+
+FAST_PATH_LOG = "Answered by the fast-path router, without the agent LLM."
+
+
+@dataclass(frozen=True)
+class Route:
+    """A tool to call directly, and its input."""
+    tool: str
+    tool_input: str
+
+
+class FastPathRouter:
+    """
+    Matches questions against the wait-time rules and answers them.
+    """
+
+    def __init__(self, names: GraphNameIndex = hospital_names):
+        self._names = names
+        self._lock = threading.Lock()
+        self._routed: dict[str, int] = {"Waits": 0, "Availability": 0}
+        self._fallbacks = 0
+
+    def match(self, question: str, index: EntityNameIndex) -> Optional[Route]:
+        """
+        Decide whether a question can skip the agent.
+
+        Args:
+            question (str): The user question.
+            index (EntityNameIndex): The hospital names.
+        Returns:
+            Optional[Route]: The tool to call, or None to use the agent.
+        """
+        text = question.lower()
+        if text.count("?") > 1:
+            return None
+        if _AGGREGATE.search(text) or _OTHER_TOPICS.search(text):
+            return None
+
+        if _PAST.search(text) or _LOCATION.search(text):
+            return None
+
+        hospitals = index.find(question)
+        if self._names_other_entity(question, hospitals):
+            return None
+        if _SHORTEST_WAIT.search(text):
+            return None if hospitals else Route("Availability", "")
+        if _WAIT.search(text) and len(hospitals) == 1:
+            return Route("Waits", hospitals[0])
+        return None
+
+    @staticmethod
+    def _names_other_entity(question: str, hospitals: list[str]) -> bool:
+        """
+        Whether the question names a place or entity other than the hospitals
+        found in it, e.g. "Which hospital in Texas has the shortest wait?".
+        """
+        hospital_words = set(normalize_name(" ".join(hospitals)).split())
+        for match in _STATE_NAMES.finditer(question.lower()):
+            if not set(match.group().split()) <= hospital_words:
+                return True
+        for match in _CAPITALIZED.finditer(question):
+            # the first word of a sentence is capitalized anyway
+            before = question[: match.start()].rstrip()
+            if not before or before.endswith((".", "?", "!")):
+                continue
+            word = match.group().lower()
+            if word not in hospital_words and word not in _PLAIN_CAPITALIZED:
+                return True
+        return False
+
+    async def route(self, question: str) -> Optional[dict[str, Any]]:
+        """
+        Answer a question without the agent, if it matches a rule.
+
+        Args:
+            question (str): The user question.
+        Returns:
+            Optional[dict]: A response shaped like the agent's (input, output,
+            intermediate_steps), or None to use the agent.
+        """
+        try:
+            index = await asyncio.to_thread(self._names.get)
+        except Exception as e:
+            LOGGER.warning(f"Hospital names unavailable, using the agent: {e}")
+            index = None
+        route = self.match(question, index) if index is not None else None
+
+        answer = None
+        if route is not None:
+            if route.tool == "Waits":
+                observation = await aget_current_wait_times(route.tool_input)
+                answer = self._wait_answer(route.tool_input, observation)
+            else:
+                observation = await aget_most_available_hospital(None)
+                answer = self._availability_answer(index, observation)
+
+        with self._lock:
+            if answer is None:
+                self._fallbacks += 1
+                return None
+            self._routed[route.tool] += 1
+
+        action = AgentAction(
+            tool=route.tool, tool_input=route.tool_input, log=FAST_PATH_LOG
+        )
+        return {
+            "input": question,
+            "output": answer,
+            "intermediate_steps": [(action, observation)],
+        }
+
+    @staticmethod
+    def _wait_answer(hospital: str, observation: str) -> Optional[str]:
+        # error messages are left for the agent to explain
+        if observation.startswith("Error") or "does not exist" in observation:
+            return None
+        return f"The current wait time at {hospital} is {observation}."
+
+    @staticmethod
+    def _availability_answer(
+        index: EntityNameIndex, observation: dict[str, Any]
+    ) -> Optional[str]:
+        if "error" in observation or len(observation) != 1:
+            return None
+        hospital, minutes = next(iter(observation.items()))
+        hospital = index.canonical(hospital) or hospital.title()
+        return (
+            f"{hospital} currently has the shortest wait time, at "
+            f"{format_wait_minutes(int(minutes))}."
+        )
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Report router counters.
+
+        Returns:
+            dict: Questions answered per tool, and questions left to the agent.
+        """
+        with self._lock:
+            return {"routed": dict(self._routed), "fallbacks": self._fallbacks}
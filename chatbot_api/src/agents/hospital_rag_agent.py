@@ -2,14 +2,31 @@
 Defines the agent for our RAG system
 """
 import os
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.agents import AgentExecutor, Tool
 from langchain.agents import initialize_agent, AgentType
 
-from chains.cypher_chain import hospital_cypher_chain
-from chains.review_chain import reviews_vector_chain
-from chains.file_retrieval import build_file_retrieval_tool
-from tools.wait_times import get_current_wait_times, get_most_available_hospital
+from chains.cypher_chain import (
+    aget_hospital_cypher_chain,
+    get_hospital_cypher_chain,
+    refresh_graph_schema,
+)
+from chains.review_chain import (
+    aget_reviews_vector_chain,
+    get_review_embeddings,
+    get_reviews_vector_chain,
+)
+from chains.file_retrieval import build_file_retrieval_chain, build_file_retrieval_tool
+from tools.wait_times import (
+    aget_current_wait_times,
+    aget_most_available_hospital,
+    get_current_wait_times,
+    get_most_available_hospital,
+)
+from utils.agent_stream import AGENT_LLM_TAG
+from utils.entity_index import hospital_names
+from utils.llm import make_chat_model
+from utils.neo4j_client import get_graph
+from utils.warmup import Lazy
 
 
 HOSPITAL_AGENT_MODEL = os.getenv("HOSPITAL_AGENT_MODEL")
@@ -17,10 +34,19 @@ HOSPITAL_AGENT_MODEL = os.getenv("HOSPITAL_AGENT_MODEL")
 # hospital_agent_prompt = hub.pull("hwchase17/openai-functions-agent")
 
 
+async def _aask_reviews(question: str):
+    return await (await aget_reviews_vector_chain()).ainvoke(question)
+
+
+async def _aask_graph(question: str):
+    return await (await aget_hospital_cypher_chain()).ainvoke(question)
+
+
 tools = [
     Tool(
         name="Experiences",
-        func=reviews_vector_chain.invoke,
+        func=lambda question: get_reviews_vector_chain().invoke(question),
+        coroutine=_aask_reviews,
         description="""Useful when you need to answer questions
         about patient experiences, feelings, or any other qualitative
         question that could be answered about a patient using semantic
@@ -33,7 +59,8 @@ tools = [
     ),
     Tool(
         name="Graph",
-        func=hospital_cypher_chain.invoke,
+        func=lambda question: get_hospital_cypher_chain().invoke(question),
+        coroutine=_aask_graph,
         description="""Useful for answering questions about patients,
         physicians, hospitals, insurance payers, patient review
         statistics, and hospital visit details. Use the entire prompt as
@@ -45,6 +72,7 @@ tools = [
     Tool(
         name="Waits",
         func=get_current_wait_times,
+        coroutine=aget_current_wait_times,
         description="""Use when asked about current wait times
         at a specific hospital. This tool can only get the current
         wait time at a hospital and does not have any information about
@@ -57,6 +85,7 @@ tools = [
     Tool(
         name="Availability",
         func=get_most_available_hospital,
+        coroutine=aget_most_available_hospital,
         description="""
         Use when you need to find out which hospital has the shortest
         wait time. This tool does not have any information about aggregate
@@ -65,18 +94,14 @@ tools = [
         """,
     ),
 ]
-tools.append(
-    build_file_retrieval_tool(
+
+hospital_docs_chain = Lazy(
+    lambda: build_file_retrieval_chain(
         docs_path = "kb_docs_retrievable", 
         qa_model_env="HOSPITAL_QA_MODEL"
     )
 )
-
-llm = ChatGoogleGenerativeAI(
-    model=HOSPITAL_AGENT_MODEL,
-)
-
-llm_with_tools = llm.bind_tools(tools)
+tools.append(build_file_retrieval_tool(hospital_docs_chain))
 
 # rag_agent = initialize_agent(
 #     tools=tools,
@@ -85,10 +110,47 @@ llm_with_tools = llm.bind_tools(tools)
 #     verbose=True,
 # )
 
-hospital_rag_agent_executor = initialize_agent(
-    tools=tools,
-    llm=llm,
-    agent=AgentType.CHAT_ZERO_SHOT_REACT_DESCRIPTION,
-    verbose=True,
-    return_intermediate_steps=True,
-)
\ No newline at end of file
+
+def _build_agent_executor() -> AgentExecutor:
+    llm = make_chat_model(HOSPITAL_AGENT_MODEL, tags=[AGENT_LLM_TAG])
+
+    return initialize_agent(
+        tools=tools,
+        llm=llm,
+        agent=AgentType.CHAT_ZERO_SHOT_REACT_DESCRIPTION,
+        verbose=True,
+        return_intermediate_steps=True,
+    )
+
+
+_hospital_rag_agent_executor = Lazy(_build_agent_executor)
+
+
+def get_hospital_rag_agent_executor() -> AgentExecutor:
+    """
+    The RAG agent, built on first use. Tools build their own chains lazily.
+    """
+    return _hospital_rag_agent_executor.get()
+
+
+async def aget_hospital_rag_agent_executor() -> AgentExecutor:
+    """
+    Async version of get_hospital_rag_agent_executor. Does not block the event
+    loop while the agent is being built.
+    """
+    return await _hospital_rag_agent_executor.aget()
+
+
+# Staged initialization, run in the background at startup. Each stage can also
+# be triggered on demand by the first request that needs it. The schema is
+# refreshed last, since the graph stage may have used the on-disk snapshot.
+WARMUP_STAGES = [
+    ("graph", get_graph),
+    ("hospital_names", hospital_names.get),
+    ("review_embeddings", get_review_embeddings),
+    ("graph_chain", get_hospital_cypher_chain),
+    ("experiences_chain", get_reviews_vector_chain),
+    ("hospital_docs_chain", hospital_docs_chain.get),
+    ("agent", get_hospital_rag_agent_executor),
+    ("graph_schema_refresh", refresh_graph_schema),
+]
\ No newline at end of file
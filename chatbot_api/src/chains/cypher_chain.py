@@ -1,12 +1,129 @@
+import logging
 import os
-from langchain_neo4j import Neo4jGraph, GraphCypherQAChain
-from langchain_google_genai import ChatGoogleGenerativeAI
+from typing import Any, Dict, List, Optional
+
+from langchain_neo4j import GraphCypherQAChain
+from langchain_neo4j.chains.graph_qa.cypher import construct_schema, extract_cypher
 from langchain.prompts import PromptTemplate
+from langchain.callbacks.manager import (
+    AsyncCallbackManagerForChainRun,
+    CallbackManagerForChainRun,
+)
 from langchain_community.chains.graph_qa.cypher_utils import CypherQueryCorrector
 
+from chains.review_chain import REVIEW_EMBEDDINGS_MODEL
+from utils.cypher_cache import CypherTranslationCache
+from utils.cypher_prompt import (
+    CypherExampleLibrary,
+    CypherPromptBuilder,
+    SchemaHint,
+    load_cypher_examples,
+)
+from utils.db_query_guard import CYPHER_GUARD_ENABLED, CypherQueryGuard
+from utils.embeddings import get_embeddings
+from utils.graph_version import DATA_VERSION_LABEL
+from utils.llm import make_chat_model
+from utils.neo4j_client import (
+    GRAPH_SCHEMA_SNAPSHOT_PATH,
+    aexplain,
+    aquery,
+    get_graph,
+    graph_version,
+    save_schema_snapshot,
+)
+from utils.result_cache import VersionedResultCache
+from utils.text import fingerprint
+from utils.warmup import Lazy
+
 
 HOSPITAL_QA_MODEL = os.getenv("HOSPITAL_QA_MODEL")
 HOSPITAL_CYPHER_MODEL = os.getenv("HOSPITAL_CYPHER_MODEL")
+CYPHER_CACHE_PATH = os.getenv("CYPHER_CACHE_PATH", "cache_data/cypher_cache.json")
+CYPHER_CACHE_MAX_SIZE = int(os.getenv("CYPHER_CACHE_MAX_SIZE", "5000"))
+CYPHER_RESULT_CACHE_MAX_SIZE = int(os.getenv("CYPHER_RESULT_CACHE_MAX_SIZE", "2000"))
+# question/Cypher example library, searched by question embedding
+CYPHER_EXAMPLES_PATH = os.getenv(
+    "CYPHER_EXAMPLES_PATH",
+    os.path.join(os.path.dirname(__file__), "cypher_examples.json"),
+)
+CYPHER_EXAMPLES_K = int(os.getenv("CYPHER_EXAMPLES_K", "4"))
+# send only the part of the schema the question needs
+CYPHER_SCHEMA_PRUNING = os.getenv("CYPHER_SCHEMA_PRUNING", "true").lower() == "true"
+
+# labels that exist for bookkeeping only and must not be shown to the Cypher LLM
+CYPHER_EXCLUDE_TYPES = [DATA_VERSION_LABEL]
+
+# string category values and conventions, sent with the schema slices that
+# contain their types
+CYPHER_SCHEMA_HINTS = [
+    SchemaHint(
+        "Test results are one of: 'Inconclusive', 'Normal', 'Abnormal'",
+        ("Visit",),
+        ("Inconclusive", "Normal", "Abnormal"),
+    ),
+    SchemaHint(
+        "Visit statuses are one of: 'OPEN', 'DISCHARGED'",
+        ("Visit",),
+        ("OPEN", "DISCHARGED"),
+    ),
+    SchemaHint(
+        "Admission Types are one of: 'Elective', 'Emergency', 'Urgent'",
+        ("Visit",),
+        ("Elective", "Emergency", "Urgent"),
+    ),
+    SchemaHint(
+        "Payer names are one of: 'Cigna', 'Blue Cross', 'UnitedHealthcare', "
+        "'Medicare', 'Aetna'",
+        ("Payer",),
+        ("Cigna", "Blue Cross", "UnitedHealthcare", "Medicare", "Aetna"),
+    ),
+    SchemaHint(
+        "A visit is considered open if its status is 'OPEN' and the discharge "
+        "date is missing.",
+        ("Visit",),
+    ),
+    SchemaHint(
+        'Use abbreviations when filtering on hospital states (e.g. "Texas" is '
+        '"TX", "Colorado" is "CO", "North Carolina" is "NC", "Florida" is "FL", '
+        '"Georgia" is "GA", etc.)',
+        ("Hospital",),
+        ("Texas", "Colorado", "North Carolina", "Florida", "Georgia"),
+    ),
+    # summary nodes precomputed by the ETL's rollup stage
+    SchemaHint(
+        "PayerYearSummary nodes hold the visit count, total billing and average "
+        "billing per payer name and admission year. Read them instead of "
+        "aggregating COVERED_BY billing amounts by payer or year.",
+        ("PayerYearSummary",),
+    ),
+    SchemaHint(
+        "AdmissionTypeSummary nodes hold, per admission type, the number of "
+        "visits, and the average stay in days of the discharged ones. Read "
+        "them instead of aggregating visit stays by admission type.",
+        ("AdmissionTypeSummary",),
+    ),
+    SchemaHint(
+        "StateYearSummary nodes hold the visit count per hospital state and "
+        "admission year. Read them instead of counting visits by state or year.",
+        ("StateYearSummary",),
+    ),
+    SchemaHint(
+        "PhysicianReviewSummary nodes hold the number of reviews of each "
+        "physician's visits. Read them instead of counting reviews per physician.",
+        ("PhysicianReviewSummary",),
+    ),
+]
+
+# words naming a label or relationship type in questions
+CYPHER_TYPE_SYNONYMS = {
+    "Physician": ("doctor",),
+    "Payer": ("insurance", "insurer"),
+    "Visit": ("admission", "admitted", "stay"),
+    "COVERED_BY": ("bill", "billed", "billing", "cost", "charged", "paid"),
+    "EMPLOYS": ("employ", "employed"),
+}
+
+LOGGER = logging.getLogger(__name__)
 
 class ReadOnlyCorrector(CypherQueryCorrector):
     """
@@ -23,14 +140,278 @@ class ReadOnlyCorrector(CypherQueryCorrector):
             if word in upper:
                 raise ValueError(f"Unsafe keyword '{word}' in Cypher: {query}")
         return query
-    
-graph = Neo4jGraph(
-    url=os.getenv("NEO4J_URI"),
-    username=os.getenv("NEO4J_USERNAME"),
-    password=os.getenv("NEO4J_PASSWORD"),
-)
 
-graph.refresh_schema()
+
+class HospitalCypherQAChain(GraphCypherQAChain):
+    """
+    GraphCypherQAChain that reuses previously generated Cypher. Statements are
+    cached per (normalized question, schema fingerprint) once they have been
+    validated and run successfully, so a cache hit only calls the QA LLM.
+    Query results are also cached for the current graph data version, so
+    repeated questions skip the database too. The Cypher prompt gets the
+    schema slice, examples and hints that prompt_builder picks for the
+    question, or the full schema without examples if there is no builder.
+    Statements that miss the result cache are checked by query_guard first.
+    """
+    translation_cache: Optional[CypherTranslationCache] = None
+    result_cache: Optional[VersionedResultCache] = None
+    prompt_builder: Optional[CypherPromptBuilder] = None
+    query_guard: Optional[CypherQueryGuard] = None
+
+    @property
+    def schema_fingerprint(self) -> str:
+        return fingerprint(self.graph_schema)
+
+    def prompt_inputs(self, question: str) -> Dict[str, str]:
+        """
+        The Cypher generation prompt inputs for a question.
+
+        Args:
+            question (str): The natural language question.
+        Returns:
+            Dict[str, str]: The "question", "schema", "examples" and "hints".
+        """
+        if self.prompt_builder is None:
+            inputs = {"schema": self.graph_schema, "examples": "", "hints": ""}
+        else:
+            inputs = self.prompt_builder.inputs(
+                question, self.graph, self.graph_schema
+            )
+        return {"question": question, **inputs}
+
+    async def aprompt_inputs(self, question: str) -> Dict[str, str]:
+        """
+        Async variant of prompt_inputs().
+        """
+        if self.prompt_builder is None:
+            return self.prompt_inputs(question)
+        inputs = await self.prompt_builder.ainputs(
+            question, self.graph, self.graph_schema
+        )
+        return {"question": question, **inputs}
+
+    def generate_cypher(
+        self,
+        question: str,
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> str:
+        """
+        Translate a question into a validated Cypher statement with the LLM.
+
+        Args:
+            question (str): The natural language question.
+            run_manager: Optional callback manager of the calling chain run.
+        Returns:
+            str: The generated Cypher statement.
+        """
+        callbacks = run_manager.get_child() if run_manager else None
+        generated_cypher = self.cypher_generation_chain.invoke(
+            self.prompt_inputs(question),
+            config={"callbacks": callbacks},
+        )
+        generated_cypher = extract_cypher(generated_cypher)
+        if self.cypher_query_corrector:
+            generated_cypher = self.cypher_query_corrector(generated_cypher)
+        return generated_cypher
+
+    async def agenerate_cypher(
+        self,
+        question: str,
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> str:
+        """
+        Async variant of generate_cypher().
+        """
+        callbacks = run_manager.get_child() if run_manager else None
+        generated_cypher = await self.cypher_generation_chain.ainvoke(
+            await self.aprompt_inputs(question),
+            config={"callbacks": callbacks},
+        )
+        generated_cypher = extract_cypher(generated_cypher)
+        if self.cypher_query_corrector:
+            generated_cypher = self.cypher_query_corrector(generated_cypher)
+        return generated_cypher
+
+    def _query(
+        self, cypher: str, params: Optional[dict] = None
+    ) -> List[Dict[str, Any]]:
+        if self.query_guard is None:
+            return self.graph.query(cypher, params or {})
+        return self.graph.query(
+            self.query_guard.guard(cypher, self.top_k),
+            params or {},
+            timeout=self.query_guard.timeout,
+            read_only=True,
+        )
+
+    async def _aquery(
+        self, cypher: str, params: Optional[dict] = None
+    ) -> List[Dict[str, Any]]:
+        if self.query_guard is None:
+            return await aquery(cypher, params)
+        return await aquery(
+            await self.query_guard.aguard(cypher, self.top_k),
+            params,
+            timeout=self.query_guard.timeout,
+            read_only=True,
+        )
+
+    def run_query(self, cypher: str) -> List[Dict[str, Any]]:
+        """
+        Run a Cypher statement, serving it from the result cache if possible.
+
+        Args:
+            cypher (str): The Cypher statement.
+        Returns:
+            List[Dict[str, Any]]: The query result.
+        Raises:
+            QueryRejectedError: If the query guard rejects the statement.
+        """
+        if self.result_cache is None:
+            return self._query(cypher)
+        return self.result_cache.query(self._query, cypher)
+
+    async def arun_query(self, cypher: str) -> List[Dict[str, Any]]:
+        """
+        Async variant of run_query(), using the async Neo4j driver.
+        """
+        if self.result_cache is None:
+            return await self._aquery(cypher)
+        return await self.result_cache.aquery(self._aquery, cypher)
+
+    def warm_cache(self, questions: List[str]) -> int:
+        """
+        Generate, run and cache the Cypher for questions not yet in the cache.
+        Failing questions are logged and skipped.
+
+        Args:
+            questions (List[str]): The questions to translate.
+        Returns:
+            int: The number of new translations cached.
+        """
+        if self.translation_cache is None:
+            return 0
+
+        warmed = 0
+        schema_fingerprint = self.schema_fingerprint
+        for question in questions:
+            if (question, schema_fingerprint) in self.translation_cache:
+                continue
+            try:
+                generated_cypher = self.generate_cypher(question)
+                if generated_cypher and self.run_query(generated_cypher):
+                    self.translation_cache.put(
+                        question, schema_fingerprint, generated_cypher
+                    )
+                    warmed += 1
+            except Exception as e:
+                LOGGER.warning(f"Cypher cache warmup failed for {question!r}: {e}")
+        return warmed
+
+    def _call(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> Dict[str, Any]:
+        _run_manager = run_manager or CallbackManagerForChainRun.get_noop_manager()
+        callbacks = _run_manager.get_child()
+        question = inputs[self.input_key]
+        schema_fingerprint = self.schema_fingerprint
+
+        generated_cypher = None
+        if self.translation_cache is not None:
+            generated_cypher = self.translation_cache.get(question, schema_fingerprint)
+        from_cache = generated_cypher is not None
+
+        if not from_cache:
+            generated_cypher = self.generate_cypher(question, _run_manager)
+
+        _run_manager.on_text(
+            "Cached Cypher:" if from_cache else "Generated Cypher:",
+            end="\n",
+            verbose=self.verbose,
+        )
+        _run_manager.on_text(
+            generated_cypher, color="green", end="\n", verbose=self.verbose
+        )
+
+        # Generated Cypher can be empty if the query corrector rejects it
+        if generated_cypher:
+            context = self.run_query(generated_cypher)[: self.top_k]
+        else:
+            context = []
+
+        # empty results are not cached: they are often a sign of a bad translation
+        if not from_cache and context and self.translation_cache is not None:
+            self.translation_cache.put(question, schema_fingerprint, generated_cypher)
+
+        _run_manager.on_text("Full Context:", end="\n", verbose=self.verbose)
+        _run_manager.on_text(str(context), color="green", end="\n", verbose=self.verbose)
+
+        final_result = self.qa_chain.invoke(
+            {"question": question, "context": context},
+            config={"callbacks": callbacks},
+        )
+
+        return self._chain_result(final_result, generated_cypher, context)
+
+    async def _acall(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> Dict[str, Any]:
+        _run_manager = run_manager or AsyncCallbackManagerForChainRun.get_noop_manager()
+        callbacks = _run_manager.get_child()
+        question = inputs[self.input_key]
+        schema_fingerprint = self.schema_fingerprint
+
+        generated_cypher = None
+        if self.translation_cache is not None:
+            generated_cypher = self.translation_cache.get(question, schema_fingerprint)
+        from_cache = generated_cypher is not None
+
+        if not from_cache:
+            generated_cypher = await self.agenerate_cypher(question, _run_manager)
+
+        await _run_manager.on_text(
+            "Cached Cypher:" if from_cache else "Generated Cypher:",
+            end="\n",
+            verbose=self.verbose,
+        )
+        await _run_manager.on_text(
+            generated_cypher, color="green", end="\n", verbose=self.verbose
+        )
+
+        if generated_cypher:
+            context = (await self.arun_query(generated_cypher))[: self.top_k]
+        else:
+            context = []
+
+        if not from_cache and context and self.translation_cache is not None:
+            self.translation_cache.put(question, schema_fingerprint, generated_cypher)
+
+        await _run_manager.on_text("Full Context:", end="\n", verbose=self.verbose)
+        await _run_manager.on_text(
+            str(context), color="green", end="\n", verbose=self.verbose
+        )
+
+        final_result = await self.qa_chain.ainvoke(
+            {"question": question, "context": context},
+            config={"callbacks": callbacks},
+        )
+        return self._chain_result(final_result, generated_cypher, context)
+
+    def _chain_result(
+        self, final_result: str, generated_cypher: str, context: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        chain_result: Dict[str, Any] = {self.output_key: final_result}
+        if self.return_intermediate_steps:
+            chain_result["intermediate_steps"] = [
+                {"query": generated_cypher},
+                {"context": context},
+            ]
+        return chain_result
+
 
 cypher_generation_template = """
 Task:
@@ -56,55 +437,9 @@ If you need to divide numbers, make sure to
 filter the denominator to be non zero.
 
 Examples:
-# Who is the oldest patient and how old are they?
-MATCH (p:Patient)
-RETURN p.name AS oldest_patient,
-       duration.between(date(p.dob), date()).years AS age
-ORDER BY age DESC
-LIMIT 1
-
-# Which physician has billed the least to Cigna
-MATCH (p:Payer)<-[c:COVERED_BY]-(v:Visit)-[t:TREATS]-(phy:Physician)
-WHERE p.name = 'Cigna'
-RETURN phy.name AS physician_name, SUM(c.billing_amount) AS total_billed
-ORDER BY total_billed
-LIMIT 1
-
-# Which state had the largest percent increase in Cigna visits
-# from 2022 to 2023?
-MATCH (h:Hospital)<-[:AT]-(v:Visit)-[:COVERED_BY]->(p:Payer)
-WHERE p.name = 'Cigna' AND v.admission_date >= '2022-01-01' AND
-v.admission_date < '2024-01-01'
-WITH h.state_name AS state, COUNT(v) AS visit_count,
-     SUM(CASE WHEN v.admission_date >= '2022-01-01' AND
-     v.admission_date < '2023-01-01' THEN 1 ELSE 0 END) AS count_2022,
-     SUM(CASE WHEN v.admission_date >= '2023-01-01' AND
-     v.admission_date < '2024-01-01' THEN 1 ELSE 0 END) AS count_2023
-WITH state, visit_count, count_2022, count_2023,
-     (toFloat(count_2023) - toFloat(count_2022)) / toFloat(count_2022) * 100
-     AS percent_increase
-RETURN state, percent_increase
-ORDER BY percent_increase DESC
-LIMIT 1
-
-# How many non-emergency patients in North Carolina have written reviews?
-MATCH (r:Review)<-[:WRITES]-(v:Visit)-[:AT]->(h:Hospital)
-WHERE h.state_name = 'NC' and v.admission_type <> 'Emergency'
-RETURN count(*)
-
-String category values:
-Test results are one of: 'Inconclusive', 'Normal', 'Abnormal'
-Visit statuses are one of: 'OPEN', 'DISCHARGED'
-Admission Types are one of: 'Elective', 'Emergency', 'Urgent'
-Payer names are one of: 'Cigna', 'Blue Cross', 'UnitedHealthcare', 'Medicare',
-'Aetna'
-
-A visit is considered open if its status is 'OPEN' and the discharge date is
-missing.
-Use abbreviations when
-filtering on hospital states (e.g. "Texas" is "TX",
-"Colorado" is "CO", "North Carolina" is "NC",
-"Florida" is "FL", "Georgia" is "GA", etc.)
+{examples}
+
+{hints}
 
 Make sure to use IS NULL or IS NOT NULL when analyzing missing properties.
 Never return embedding properties in your queries. You must never include the
@@ -119,7 +454,8 @@ The question is:
 """
 
 cypher_generation_prompt = PromptTemplate(
-    input_variables=["schema", "question"], template=cypher_generation_template
+    input_variables=["schema", "examples", "hints", "question"],
+    template=cypher_generation_template,
 )
 
 
@@ -173,19 +509,134 @@ qa_generation_prompt = PromptTemplate(
 #     We are going to inherit this class and override the __call__ method to raise an error if the query contains any dangerous keywords that could modify the database.
 # NOTE: The best/cleanest approach would be to use proper access control (credentials) on the database, but we don't have this in the free tier of AuraDB.
 
-hospital_cypher_chain = GraphCypherQAChain.from_llm(
-    cypher_llm=ChatGoogleGenerativeAI(model=HOSPITAL_CYPHER_MODEL),
-    qa_llm=ChatGoogleGenerativeAI(model=HOSPITAL_QA_MODEL),
-    graph=graph,
-    verbose=True,
-    qa_prompt=qa_generation_prompt,
-    cypher_prompt=cypher_generation_prompt,
-    validate_cypher=True,
-    top_k=25,
-    
-    allow_dangerous_requests=True,
-    # cypher_query_corrector=ReadOnlyCorrector([""])
+cypher_translation_cache = CypherTranslationCache(max_size=CYPHER_CACHE_MAX_SIZE)
+
+cypher_result_cache = VersionedResultCache(
+    version_fn=graph_version.check, max_size=CYPHER_RESULT_CACHE_MAX_SIZE
 )
 
-# probably a bit "dirty", but seems to work 
-hospital_cypher_chain.cypher_query_corrector = ReadOnlyCorrector([""])
\ No newline at end of file
+# plans every generated statement before it runs
+cypher_query_guard = CypherQueryGuard(
+    explain_fn=lambda cypher: get_graph().explain(cypher), aexplain_fn=aexplain
+)
+
+
+def _build_cypher_prompt_builder() -> CypherPromptBuilder:
+    """
+    Load the Cypher example library and index it, with the review embedding
+    model so no other model is loaded.
+    """
+    library = CypherExampleLibrary(
+        load_cypher_examples(CYPHER_EXAMPLES_PATH),
+        get_embeddings(REVIEW_EMBEDDINGS_MODEL),
+    )
+    library.index()
+    return CypherPromptBuilder(
+        library,
+        hints=CYPHER_SCHEMA_HINTS,
+        synonyms=CYPHER_TYPE_SYNONYMS,
+        k=CYPHER_EXAMPLES_K,
+        pruning=CYPHER_SCHEMA_PRUNING,
+        exclude_types=CYPHER_EXCLUDE_TYPES,
+    )
+
+
+def _build_hospital_cypher_chain() -> HospitalCypherQAChain:
+    """
+    Build the Graph tool chain and load the persisted Cypher translations for
+    the current schema.
+    """
+    hospital_cypher_chain = HospitalCypherQAChain.from_llm(
+        cypher_llm=make_chat_model(HOSPITAL_CYPHER_MODEL),
+        qa_llm=make_chat_model(HOSPITAL_QA_MODEL),
+        graph=get_graph(),
+        verbose=True,
+        qa_prompt=qa_generation_prompt,
+        cypher_prompt=cypher_generation_prompt,
+        validate_cypher=True,
+        top_k=25,
+        exclude_types=CYPHER_EXCLUDE_TYPES,
+        translation_cache=cypher_translation_cache,
+        result_cache=cypher_result_cache,
+        prompt_builder=_build_cypher_prompt_builder(),
+        query_guard=cypher_query_guard if CYPHER_GUARD_ENABLED else None,
+
+        allow_dangerous_requests=True,
+        # cypher_query_corrector=ReadOnlyCorrector([""])
+    )
+
+    # probably a bit "dirty", but seems to work 
+    hospital_cypher_chain.cypher_query_corrector = ReadOnlyCorrector([""])
+
+    cypher_translation_cache.load(
+        CYPHER_CACHE_PATH, schema_fingerprint=hospital_cypher_chain.schema_fingerprint
+    )
+    return hospital_cypher_chain
+
+
+_hospital_cypher_chain = Lazy(_build_hospital_cypher_chain)
+
+
+def get_hospital_cypher_chain() -> HospitalCypherQAChain:
+    """
+    The Graph tool chain, built on first use.
+    """
+    return _hospital_cypher_chain.get()
+
+
+async def aget_hospital_cypher_chain() -> HospitalCypherQAChain:
+    """
+    The Graph tool chain, built in a worker thread on first use.
+    """
+    return await _hospital_cypher_chain.aget()
+
+
+def cypher_prompt_stats() -> Dict[str, Any]:
+    """
+    Report the Cypher prompt builder counters, once the chain is built.
+
+    Returns:
+        dict: The builder stats, empty before the chain is built.
+    """
+    if not _hospital_cypher_chain.ready:
+        return {}
+    prompt_builder = _hospital_cypher_chain.get().prompt_builder
+    return prompt_builder.stats() if prompt_builder else {}
+
+
+def refresh_graph_schema() -> bool:
+    """
+    Re-read the graph schema and update the on-disk snapshot. If it changed, the
+    chain switches to the new schema and Cypher translations generated against
+    the old one are dropped. A chain that is not built yet is left alone; it
+    will be built from the refreshed schema.
+
+    Args:
+        None
+    Returns:
+        bool: Whether the schema changed.
+    """
+    graph = get_graph()
+    graph.refresh_schema()
+    save_schema_snapshot(graph, GRAPH_SCHEMA_SNAPSHOT_PATH)
+    if not _hospital_cypher_chain.ready:
+        return False
+
+    hospital_cypher_chain = get_hospital_cypher_chain()
+    schema = construct_schema(
+        graph.get_structured_schema, [], CYPHER_EXCLUDE_TYPES, graph._enhanced_schema
+    )
+    if schema == hospital_cypher_chain.graph_schema:
+        return False
+
+    hospital_cypher_chain.graph_schema = schema
+    dropped = cypher_translation_cache.invalidate(
+        keep_fingerprint=hospital_cypher_chain.schema_fingerprint
+    )
+    LOGGER.info(f"Graph schema changed, dropped {dropped} cached Cypher translations")
+    return True
+
+
+# a reload by the ETL may come with a new schema; refreshing it takes database
+# round trips, so it runs off the request that noticed the reload
+graph_version.on_change(lambda _: refresh_graph_schema(), background=True)
@@ -1,51 +1,219 @@
+import glob
+import logging
 import os
-from langchain_community.document_loaders import DirectoryLoader, TextLoader, PyPDFLoader
+from langchain_community.document_loaders import TextLoader, PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
 from langchain.chains.retrieval_qa.base import RetrievalQA
 from langchain.agents import Tool
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain import hub
 from langchain.chains.retrieval import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import Runnable
 
-def build_file_retrieval_tool(
+from utils.context_packing import EMBEDDING_METADATA_KEY, pack_retriever, retrieval_k
+from utils.doc_manifest import DocumentManifest, file_sha256, make_chunk_ids
+from utils.embeddings import get_embeddings
+from utils.llm import make_chat_model
+from utils.warmup import Lazy
+
+LOGGER = logging.getLogger(__name__)
+
+# pull the prompt from the LangChain hub instead of using the bundled copy
+FILE_RETRIEVAL_PROMPT_FROM_HUB = (
+    os.getenv("FILE_RETRIEVAL_PROMPT_FROM_HUB", "false").lower() == "true"
+)
+
+# bundled copy of the "langchain-ai/retrieval-qa-chat" hub prompt, so that
+# startup does not depend on network access to the hub
+RETRIEVAL_QA_CHAT_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            "Answer any use questions based solely on the context below:\n\n"
+            "<context>\n{context}\n</context>",
+        ),
+        MessagesPlaceholder("chat_history", optional=True),
+        ("human", "{input}"),
+    ]
+)
+
+# NOTE: currently .txt and .pdf files are supported
+LOADERS = {".txt": TextLoader, ".pdf": PyPDFLoader}
+
+MANIFEST_FILE = "manifest.json"
+
+
+def _list_docs(docs_path: str) -> list[str]:
+    """
+    List the supported files under docs_path.
+
+    Args:
+        docs_path (str): Directory to search recursively.
+    Returns:
+        list[str]: Paths of the .txt/.pdf files, sorted.
+    """
+    paths = []
+    for extension in LOADERS:
+        paths += glob.glob(os.path.join(docs_path, "**", f"*{extension}"), recursive=True)
+    return sorted(paths)
+
+
+def _sync_vectorstore(
+    vectorstore: Chroma,
+    docs_path: str,
+    splitter: RecursiveCharacterTextSplitter,
+    manifest_path: str,
+    settings: dict,
+) -> None:
+    """
+    Bring the persisted collection in line with the files under docs_path.
+    Only new or changed files are loaded, split and embedded; chunks of changed
+    and removed files are deleted. A missing manifest, or one written with other
+    settings, rebuilds the collection from scratch.
+
+    Args:
+        vectorstore (Chroma): The persisted collection.
+        docs_path (str): Directory with the documents to index.
+        splitter (RecursiveCharacterTextSplitter): Splits documents into chunks.
+        manifest_path (str): Where the manifest of indexed files is kept.
+        settings (dict): Chunking/embedding settings the index depends on.
+    Returns:
+        None
+    """
+    manifest = DocumentManifest.load(manifest_path)
+    if manifest is None or manifest.settings != settings:
+        LOGGER.info("No usable document manifest, rebuilding the vector store")
+        vectorstore.reset_collection()
+        manifest = DocumentManifest(settings=settings)
+
+    current_hashes = {path: file_sha256(path) for path in _list_docs(docs_path)}
+    plan = manifest.plan(current_hashes)
+    if plan.is_noop:
+        LOGGER.info(f"Vector store up to date ({len(plan.unchanged)} files)")
+        return
+
+    if plan.stale_chunk_ids:
+        vectorstore.delete(ids=plan.stale_chunk_ids)
+    for path in plan.removed:
+        manifest.forget(path)
+
+    for path in plan.to_index:
+        raw_docs = LOADERS[os.path.splitext(path)[1]](path).load()
+        chunks = splitter.split_documents(raw_docs)
+        chunk_ids = make_chunk_ids(path, current_hashes[path], len(chunks))
+        if chunks:
+            vectorstore.add_documents(documents=chunks, ids=chunk_ids)
+        manifest.record(path, current_hashes[path], chunk_ids)
+
+    manifest.save(manifest_path)
+    LOGGER.info(
+        f"Vector store synced: {len(plan.to_index)} files embedded, "
+        f"{len(plan.removed)} removed, {len(plan.unchanged)} unchanged"
+    )
+
+
+def _retrieval_qa_chat_prompt() -> ChatPromptTemplate:
+    """
+    The retrieval QA prompt, from the hub if configured, otherwise (or if the
+    hub cannot be reached) the bundled copy.
+    """
+    if FILE_RETRIEVAL_PROMPT_FROM_HUB:
+        try:
+            return hub.pull("langchain-ai/retrieval-qa-chat")
+        except Exception as e:
+            LOGGER.warning(f"Unable to pull retrieval prompt from hub, using bundled copy: {e}")
+    return RETRIEVAL_QA_CHAT_PROMPT
+
+
+class ChromaEmbeddingRetriever(BaseRetriever):
+    """
+    Similarity search over a Chroma store that also returns the stored
+    embedding of each chunk, so context packing does not embed it again.
+    """
+    vectorstore: Chroma
+    embeddings: Embeddings
+    k: int = 4
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        results = self.vectorstore._collection.query(
+            query_embeddings=[self.embeddings.embed_query(query)],
+            n_results=self.k,
+            include=["documents", "metadatas", "embeddings"],
+        )
+        return [
+            Document(
+                page_content=text,
+                metadata={
+                    **(metadata or {}),
+                    EMBEDDING_METADATA_KEY: [float(x) for x in embedding],
+                },
+            )
+            for text, metadata, embedding in zip(
+                results["documents"][0],
+                results["metadatas"][0],
+                results["embeddings"][0],
+            )
+        ]
+
+
+def build_file_retrieval_chain(
     docs_path: str,
     qa_model_env: str = "HOSPITAL_QA_MODEL",
     chunk_size: int = 1000,
     chunk_overlap: int = 200,
     k: int = 5,
     persist_directory: str = "vec_store_data/chroma_db"
-) -> Tool:
+) -> Runnable:
     """
-    Loads .txt/.pdf files under docs_path, builds a RetrievalQA chain,
-    and wraps it as a LangChain Tool.
+    Loads .txt/.pdf files under docs_path and builds a retrieval chain over
+    them. The persisted index is updated incrementally, so only new or
+    changed files are embedded.
     """
-    # load files for retrieval 
-    # NOTE: currently .txt and .pdf files are supported
-    txt_loader = DirectoryLoader(docs_path, glob="**/*.txt", loader_cls=TextLoader)
-    pdf_loader = DirectoryLoader(docs_path, glob="**/*.pdf", loader_cls=PyPDFLoader)
-    raw_docs = txt_loader.load() + pdf_loader.load()
-    
     # docs -> chunks
     splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size,chunk_overlap=chunk_overlap,)
-    docs = splitter.split_documents(raw_docs)
     
     # embedd/index
-    embeddings = HuggingFaceEmbeddings(model_name=os.getenv('FILE_RETRIEVAL_EMBEDDINGS'))
+    embeddings = get_embeddings(os.getenv('FILE_RETRIEVAL_EMBEDDINGS'))
     
-    vectorstore = Chroma.from_documents(
-        documents=docs, 
-        embedding=embeddings, 
+    vectorstore = Chroma(
+        embedding_function=embeddings,
         persist_directory=persist_directory
     )
+    _sync_vectorstore(
+        vectorstore,
+        docs_path,
+        splitter,
+        manifest_path=os.path.join(persist_directory, MANIFEST_FILE),
+        settings={
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "embeddings": embeddings.model_name,
+            "embedding_backend": embeddings.backend,
+        },
+    )
     
-    retriever = vectorstore.as_retriever(search_kwargs={"k": k})
+    qa_model = os.getenv('FILE_RETRIEVAL_MODEL')
+    retriever = pack_retriever(
+        "hospital_docs",
+        ChromaEmbeddingRetriever(
+            vectorstore=vectorstore, embeddings=embeddings, k=retrieval_k(k)
+        ),
+        embeddings,
+        qa_model,
+        k=k,
+    )
     
-    llm = ChatGoogleGenerativeAI(model = os.getenv('FILE_RETRIEVAL_MODEL'))
+    llm = make_chat_model(qa_model)
     
-    retrieval_qa_chat_prompt = hub.pull("langchain-ai/retrieval-qa-chat")
+    retrieval_qa_chat_prompt = _retrieval_qa_chat_prompt()
 
     stuff_chain = create_stuff_documents_chain(
         llm=llm,
@@ -56,13 +224,25 @@ def build_file_retrieval_tool(
         retriever=retriever,
         combine_docs_chain=stuff_chain
     )
-    
+    return rag_chain
+
+
+def build_file_retrieval_tool(rag_chain: Lazy[Runnable]) -> Tool:
+    """
+    Wraps a (lazily built) retrieval chain as a LangChain Tool, with a native
+    async path for the async agent.
+    """
+    async def _arun(question: str) -> str:
+        chain = await rag_chain.aget()
+        return (await chain.ainvoke({"input": question}))["answer"]
+
     return Tool(
         name="HospitalDocs",
-        func=lambda question: rag_chain.invoke({"input": question})["answer"],
+        func=lambda question: rag_chain.get().invoke({"input": question})["answer"],
+        coroutine=_arun,
         description=(
             "Use for hospital-specific info (hours, specialties, general info) "
             "from the .txt/.pdf files. Pass your question; this will retrieve "
             "and answer from the right document chunks."
         ),
-    )
\ No newline at end of file
+    )
@@ -2,11 +2,19 @@
 Chain for processing hospital reviews and answering questions about them.
 """
 
+import asyncio
+import logging
 import os
-from langchain_community.vectorstores import Neo4jVector
-from langchain_google_genai import ChatGoogleGenerativeAI
+from typing import Any
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
 from langchain.chains import RetrievalQA
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain.prompts import (
     PromptTemplate,
     SystemMessagePromptTemplate,
@@ -14,23 +22,185 @@ from langchain.prompts import (
     ChatPromptTemplate,
 )
 
+from utils.context_packing import (
+    EMBEDDING_METADATA_KEY,
+    pack_retriever,
+    retrieval_k,
+)
+from utils.embeddings import SharedEmbeddings, get_embeddings
+from utils.entity_index import GraphNameIndex, hospital_names, physician_names
+from utils.llm import make_chat_model
+from utils.neo4j_client import aquery, get_graph
+from utils.warmup import Lazy
+
+LOGGER = logging.getLogger(__name__)
+
 HOSPITAL_QA_MODEL = os.getenv("HOSPITAL_QA_MODEL")
+REVIEW_EMBEDDINGS_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+REVIEW_INDEX_NAME = "reviews"
+# reviews passed to the Experiences chain
+REVIEWS_TOP_K = int(os.getenv("REVIEWS_TOP_K", "7"))
+# search all reviews when a name filter matches none
+REVIEWS_FILTER_FALLBACK = os.getenv("REVIEWS_FILTER_FALLBACK", "true").lower() == "true"
+# must match REVIEW_TEXT_PROPERTIES in the ETL's review_embeddings.py
+REVIEW_TEXT_PROPERTIES = [
+    "physician_name",
+    "patient_name",
+    "text",
+    "hospital_name",
+]
 
-vector_index = Neo4jVector.from_existing_graph(
-    embedding=HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2"),
-    url=os.getenv("NEO4J_URI"),
-    username=os.getenv("NEO4J_USERNAME"),
-    password=os.getenv("NEO4J_PASSWORD"),
-    index_name="reviews",
-    node_label="Review",
-    text_node_properties=[
-        "physician_name",
-        "patient_name",
-        "text",
-        "hospital_name",
-    ],
-    embedding_node_property="embedding",
-)
+# same document text as Neo4jVector.from_existing_graph builds for these properties
+REVIEW_VECTOR_QUERY = """
+CALL db.index.vector.queryNodes($index_name, $k, $embedding) YIELD node, score
+RETURN reduce(str='', k IN $text_properties |
+              str + '\\n' + k + ': ' + coalesce(node[k], '')) AS text,
+       node {.id, .hospital_name, .physician_name} AS metadata,
+       node.embedding AS embedding,
+       score
+"""
+
+# exact ranking of the reviews matching the name filters, found through the
+# property indexes on Review.hospital_name and Review.physician_name
+REVIEW_FILTERED_VECTOR_QUERY = """
+MATCH (node:Review)
+WHERE {conditions} AND node.embedding IS NOT NULL
+WITH node, vector.similarity.cosine(node.embedding, $embedding) AS score
+ORDER BY score DESC
+LIMIT $k
+RETURN reduce(str='', k IN $text_properties |
+              str + '\\n' + k + ': ' + coalesce(node[k], '')) AS text,
+       node {{.id, .hospital_name, .physician_name}} AS metadata,
+       node.embedding AS embedding,
+       score
+"""
+
+def get_review_embeddings() -> SharedEmbeddings:
+    """
+    The review embedding model, loaded on first use and shared with the other
+    users of the same model.
+    """
+    return get_embeddings(REVIEW_EMBEDDINGS_MODEL)
+
+
+VECTOR_INDEX_QUERY = """
+SHOW INDEXES YIELD name, type, state
+WHERE name = $index_name AND type = 'VECTOR'
+RETURN state
+"""
+
+
+def _check_vector_index() -> None:
+    # the ETL embeds the reviews and creates the index; the API only uses it
+    rows = get_graph().query(VECTOR_INDEX_QUERY, {"index_name": REVIEW_INDEX_NAME})
+    if not rows:
+        LOGGER.warning(
+            f"Vector index {REVIEW_INDEX_NAME!r} not found, run the ETL to embed "
+            "the reviews"
+        )
+    elif rows[0]["state"] != "ONLINE":
+        LOGGER.warning(
+            f"Vector index {REVIEW_INDEX_NAME!r} is {rows[0]['state']}, review "
+            "search may be incomplete"
+        )
+
+
+class ReviewRetriever(BaseRetriever):
+    """
+    Vector search over Review nodes. Hospital and physician names found in the
+    question restrict the search to their reviews before ranking, so reviews
+    of other hospitals cannot crowd them out; if no review matches, all
+    reviews are searched. Each review carries its stored embedding, for
+    context packing. The async path awaits the search on the async Neo4j
+    driver instead of running the sync search in a worker thread; only the
+    (CPU-bound) query embedding is offloaded.
+    """
+    embeddings: Embeddings
+    index_name: str = REVIEW_INDEX_NAME
+    k: int = REVIEWS_TOP_K
+    # Review property -> names that can be filtered on
+    name_indexes: dict[str, GraphNameIndex] = {
+        "hospital_name": hospital_names,
+        "physician_name": physician_names,
+    }
+    fallback_to_unfiltered: bool = REVIEWS_FILTER_FALLBACK
+
+    def _params(self, embedding: list[float]) -> dict[str, Any]:
+        return {
+            "index_name": self.index_name,
+            "k": self.k,
+            "embedding": embedding,
+            "text_properties": REVIEW_TEXT_PROPERTIES,
+        }
+
+    def _filters(self, query: str) -> dict[str, list[str]]:
+        """
+        Find the names in the question to filter the reviews on.
+
+        Args:
+            query (str): The question.
+        Returns:
+            dict[str, list[str]]: Names by Review property, for the properties
+            with a name in the question.
+        """
+        filters = {}
+        for prop, index in self.name_indexes.items():
+            try:
+                names = index.get().find(query)
+            except Exception as e:
+                LOGGER.warning(f"Names for {prop} unavailable, not filtering: {e}")
+                continue
+            if names:
+                filters[prop] = names
+        return filters
+
+    def _filtered_search(
+        self, embedding: list[float], filters: dict[str, list[str]]
+    ) -> tuple[str, dict[str, Any]]:
+        conditions = " AND ".join(f"node.{prop} IN ${prop}" for prop in filters)
+        return (
+            REVIEW_FILTERED_VECTOR_QUERY.format(conditions=conditions),
+            {**self._params(embedding), **filters},
+        )
+
+    @staticmethod
+    def _to_documents(rows: list[dict[str, Any]]) -> list[Document]:
+        return [
+            Document(
+                page_content=row["text"],
+                metadata={
+                    **{k: v for k, v in row["metadata"].items() if v is not None},
+                    "score": row["score"],
+                    EMBEDDING_METADATA_KEY: row.get("embedding"),
+                },
+            )
+            for row in rows
+        ]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        embedding = self.embeddings.embed_query(query)
+        filters = self._filters(query)
+        rows = []
+        if filters:
+            rows = get_graph().query(*self._filtered_search(embedding, filters))
+        if not filters or (not rows and self.fallback_to_unfiltered):
+            rows = get_graph().query(REVIEW_VECTOR_QUERY, self._params(embedding))
+        return self._to_documents(rows)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        embedding = await self.embeddings.aembed_query(query)
+        # the name indexes load from the graph on first use
+        filters = await asyncio.to_thread(self._filters, query)
+        rows = []
+        if filters:
+            rows = await aquery(*self._filtered_search(embedding, filters))
+        if not filters or (not rows and self.fallback_to_unfiltered):
+            rows = await aquery(REVIEW_VECTOR_QUERY, self._params(embedding))
+        return self._to_documents(rows)
 
 review_template = """Your job is to use patient
 reviews to answer questions about their experience at a hospital. Use
@@ -55,11 +225,42 @@ review_prompt = ChatPromptTemplate(
     messages=messages
 )
 
-reviews_vector_chain = RetrievalQA.from_chain_type(
-    llm=ChatGoogleGenerativeAI(model=HOSPITAL_QA_MODEL),
-    chain_type="stuff", 
-    retriever=vector_index.as_retriever(k=7),
-)
 
-reviews_vector_chain.combine_documents_chain.llm_chain.prompt = review_prompt
+def _build_reviews_vector_chain() -> RetrievalQA:
+    _check_vector_index()
+
+    reviews_vector_chain = RetrievalQA.from_chain_type(
+        llm=make_chat_model(HOSPITAL_QA_MODEL),
+        chain_type="stuff", 
+        retriever=pack_retriever(
+            "experiences",
+            ReviewRetriever(
+                embeddings=get_review_embeddings(), k=retrieval_k(REVIEWS_TOP_K)
+            ),
+            get_review_embeddings(),
+            HOSPITAL_QA_MODEL,
+            k=REVIEWS_TOP_K,
+        ),
+    )
+
+    reviews_vector_chain.combine_documents_chain.llm_chain.prompt = review_prompt
+    return reviews_vector_chain
+
+
+_reviews_vector_chain = Lazy(_build_reviews_vector_chain)
+
+
+def get_reviews_vector_chain() -> RetrievalQA:
+    """
+    The Experiences tool chain, built on first use. The reviews are embedded
+    by the ETL.
+    """
+    return _reviews_vector_chain.get()
+
+
+async def aget_reviews_vector_chain() -> RetrievalQA:
+    """
+    The Experiences tool chain, built in a worker thread on first use.
+    """
+    return await _reviews_vector_chain.aget()
 
@@ -1,29 +1,146 @@
-from agents.hospital_rag_agent import hospital_rag_agent_executor
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import numpy as np
+
+from agents.fast_path_router import FastPathRouter
+from agents.hospital_rag_agent import WARMUP_STAGES, aget_hospital_rag_agent_executor
+from chains.cypher_chain import (
+    CYPHER_CACHE_PATH,
+    cypher_prompt_stats,
+    cypher_query_guard,
+    cypher_result_cache,
+    cypher_translation_cache,
+    get_hospital_cypher_chain,
+)
+from chains.review_chain import get_review_embeddings
 from fastapi import FastAPI
-from models.hospital_rag_query import HospitalQueryInput, HospitalQueryOutput
-from utils.async_utils import async_retry
+from fastapi.responses import JSONResponse, StreamingResponse
+from models.hospital_rag_query import (
+    HospitalBatchItemOutput,
+    HospitalQueryInput,
+    HospitalQueryOutput,
+    HospitalQueryStreamEvent,
+)
+from utils.agent_stream import stream_agent_events
+from utils.admission import AdmissionController, QueueFullError
+from utils.answer_cache import SemanticAnswerCache, tools_used
+from utils.context_packing import context_packing_stats
+from utils.embeddings import embeddings_stats
+from utils.neo4j_client import close_async_driver, graph_version, pool_metrics
+from utils.rate_limit import rate_limit_stats
+from utils.retry import REQUEST_RETRY_BUDGET, retry_budget, retry_stats
+from utils.single_flight import SingleFlight
+from utils.text import normalize_question
+from utils.warmup import Warmup
 from fastapi import HTTPException
 
+LOGGER = logging.getLogger(__name__)
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_MAX_SIZE = int(os.getenv("ANSWER_CACHE_MAX_SIZE", "1000"))
+# optional text file with one question per line, translated to Cypher at startup
+CYPHER_CACHE_WARMUP_PATH = os.getenv("CYPHER_CACHE_WARMUP_PATH")
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+# agent runs in flight at once for the batch endpoint, across all batches
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "100"))
+# agent runs executing at once, and runs allowed to wait for a slot before
+# new ones are rejected with 429
+AGENT_MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", "8"))
+AGENT_MAX_QUEUE = int(os.getenv("AGENT_MAX_QUEUE", "32"))
+# answer plain wait-time questions without the agent LLM
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"
+
+# reuses the review embedding model, so the cache does not load another one
+answer_cache = SemanticAnswerCache(
+    embed_fn=lambda question: get_review_embeddings().embed_query(question),
+    similarity_threshold=ANSWER_CACHE_SIMILARITY,
+    ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+    max_size=ANSWER_CACHE_MAX_SIZE,
+)
+
+# cached answers are only valid for the data they were computed from
+graph_version.on_change(answer_cache.clear)
+
+
+def _warm_cypher_cache():
+    """
+    Translate the warmup questions, so the first users asking them skip the
+    Cypher generation LLM.
+    """
+    # a missing file is a configuration problem that retrying cannot fix, and
+    # must not keep the API unready
+    if not os.path.exists(CYPHER_CACHE_WARMUP_PATH):
+        LOGGER.warning(
+            f"Cypher cache warmup file {CYPHER_CACHE_WARMUP_PATH} not found, skipped"
+        )
+        return
+    with open(CYPHER_CACHE_WARMUP_PATH, encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+    get_hospital_cypher_chain().warm_cache(questions)
+
+
+batch_semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+agent_flight = SingleFlight()
+
+fast_path_router = FastPathRouter()
+
+admission = AdmissionController(
+    max_concurrency=AGENT_MAX_CONCURRENCY, max_queue=AGENT_MAX_QUEUE
+)
+
+warmup = Warmup()
+for stage_name, stage_fn in WARMUP_STAGES:
+    warmup.add_stage(stage_name, stage_fn)
+if CYPHER_CACHE_WARMUP_PATH:
+    warmup.add_stage("cypher_cache", _warm_cypher_cache)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    On startup, initialize the agent and its tools in the background, so the
+    server accepts connections (and readiness probes) right away. On shutdown,
+    persist the Cypher translations so a restarted pod starts with them; an
+    empty cache (e.g. the Graph chain was never built) keeps the previous file.
+    """
+    if WARMUP_ON_STARTUP:
+        warmup.start()
+    yield
+    if cypher_translation_cache.stats()["size"]:
+        cypher_translation_cache.dump(CYPHER_CACHE_PATH)
+    await close_async_driver()
+
+
 app = FastAPI(
     title="Sanitas - Hospital Chatbot",
     description="Endpoints for a hospital system RAG chatbot",
+    lifespan=lifespan,
 )
 
 
-@async_retry(max_retries=3, delay=1)
 async def invoke_agent_with_retry(query: str):
     """
-    Retry the agent if a tool fails to run. Asynchronous invocation is used.
-    
+    Run the agent. Asynchronous invocation is used. Failed LLM and Neo4j calls
+    are retried individually (see utils.retry), within a per-request retry
+    budget, so a transient error does not restart the whole run and discard
+    the tool calls that already succeeded.
+
     Args:
         query (str): The query to send to the RAG agent.
     Returns:
         dict: The response from the RAG agent.
     """
-    try:
-        return await hospital_rag_agent_executor.ainvoke({"input": query})
-    except ValueError as e:
-        raise
+    with retry_budget(REQUEST_RETRY_BUDGET):
+        agent_executor = await aget_hospital_rag_agent_executor()
+        return await agent_executor.ainvoke({"input": query})
 
 
 @app.get("/")
@@ -31,18 +148,243 @@ async def get_status():
     return {"status": "running"}
 
 
+@app.get("/ready")
+async def get_readiness():
+    status = {
+        "status": "ready" if warmup.ready else "warming_up",
+        "stages": warmup.status(),
+    }
+    return JSONResponse(status, status_code=200 if warmup.ready else 503)
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return {
+        "answer_cache": answer_cache.stats(),
+        "cypher_cache": cypher_translation_cache.stats(),
+        "cypher_result_cache": cypher_result_cache.stats(),
+        "cypher_prompt": cypher_prompt_stats(),
+        "cypher_guard": cypher_query_guard.stats(),
+        "neo4j": pool_metrics(),
+        "single_flight": agent_flight.stats(),
+        "fast_path": fast_path_router.stats(),
+        "admission": admission.stats(),
+        "llm_rate_limits": rate_limit_stats(),
+        "retries": retry_stats(),
+        "embeddings": embeddings_stats(),
+        "context_packing": context_packing_stats(),
+    }
+
+
+async def _lookup_cached_answer(
+    text: str,
+) -> tuple[Optional[np.ndarray], Optional[dict]]:
+    """
+    Look a question up in the answer cache.
+
+    Args:
+        text (str): The user question.
+    Returns:
+        tuple: The question embedding (None if the cache is disabled) and the
+        cached response (None on a miss).
+    """
+    if not ANSWER_CACHE_ENABLED:
+        return None, None
+
+    await asyncio.to_thread(graph_version.check)
+    embedding = await asyncio.to_thread(answer_cache.embed, text)
+    cached_response = answer_cache.lookup(embedding)
+    if cached_response is not None:
+        cached_response["input"] = text
+    return embedding, cached_response
+
+
+def _finish_response(
+    text: str, embedding: Optional[np.ndarray], query_response: dict
+) -> dict:
+    """
+    Make an agent response serializable and store it in the answer cache.
+
+    Args:
+        text (str): The user question.
+        embedding (Optional[np.ndarray]): The question embedding, if cached.
+        query_response (dict): The agent response.
+    Returns:
+        dict: The response, with the intermediate steps as strings.
+    """
+    tools = tools_used(query_response["intermediate_steps"])
+    query_response["intermediate_steps"] = [
+        str(s) for s in query_response["intermediate_steps"]
+    ]
+
+    if embedding is not None:
+        answer_cache.store(text, embedding, query_response, tools=tools)
+
+    return query_response
+
+
+def _overloaded(error: QueueFullError) -> HTTPException:
+    """
+    429 Too Many Requests, telling the client when to retry.
+    """
+    return HTTPException(
+        status_code=429,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+
+async def _answer_question(text: str) -> dict:
+    """
+    Answer a question with the fast-path router, from the answer cache, or by
+    running the agent.
+
+    Args:
+        text (str): The user question.
+    Returns:
+        dict: The agent response.
+    Raises:
+        ValueError: If the question asks for something unsafe.
+        QueueFullError: If the service is overloaded.
+    """
+    if FAST_PATH_ENABLED:
+        routed_response = await fast_path_router.route(text)
+        if routed_response is not None:
+            return _finish_response(text, None, routed_response)
+
+    embedding, cached_response = await _lookup_cached_answer(text)
+    if cached_response is not None:
+        return cached_response
+
+    async def run_agent() -> dict:
+        async with admission.admit():
+            query_response = await invoke_agent_with_retry(text)
+        return _finish_response(text, embedding, query_response)
+
+    # concurrent identical questions share one agent run
+    query_response = await agent_flight.do(normalize_question(text), run_agent)
+
+    return {**query_response, "input": text}
+
+
 @app.post("/hospital-rag-agent")
 async def query_hospital_agent(
     query: HospitalQueryInput,
 ) -> HospitalQueryOutput:
     try:
-        query_response = await invoke_agent_with_retry(query.text)
+        return await _answer_question(query.text)
     except ValueError as e:
         # 400 Bad Request: user asked for something unsafe
         raise HTTPException(status_code=400, detail=str(e))
+    except QueueFullError as e:
+        raise _overloaded(e)
 
-    query_response["intermediate_steps"] = [
-        str(s) for s in query_response["intermediate_steps"]
+
+@app.post("/hospital-rag-agent/batch")
+async def query_hospital_agent_batch(
+    queries: list[HospitalQueryInput],
+) -> list[HospitalBatchItemOutput]:
+    """
+    Answer a list of questions. Duplicate questions (after normalization) are
+    answered once, and at most BATCH_MAX_CONCURRENCY agent runs are in flight
+    across all batch requests. Results are returned in the order of the input,
+    each with either a response or an error.
+    """
+    if len(queries) > BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"A batch can contain at most {BATCH_MAX_SIZE} questions.",
+        )
+
+    async def answer(text: str) -> HospitalBatchItemOutput:
+        async with batch_semaphore:
+            try:
+                response = await _answer_question(text)
+            except ValueError as e:
+                return HospitalBatchItemOutput(
+                    input=text, status_code=400, error=str(e)
+                )
+            except QueueFullError as e:
+                return HospitalBatchItemOutput(
+                    input=text, status_code=429, error=str(e)
+                )
+            except Exception as e:
+                return HospitalBatchItemOutput(
+                    input=text, status_code=500, error=str(e)
+                )
+        return HospitalBatchItemOutput(input=text, response=response)
+
+    unique_questions = {}
+    for query in queries:
+        unique_questions.setdefault(normalize_question(query.text), query.text)
+
+    keys = list(unique_questions)
+    results = await asyncio.gather(*(answer(unique_questions[k]) for k in keys))
+    answers = dict(zip(keys, results))
+
+    return [
+        answers[normalize_question(query.text)].model_copy(
+            update={"input": query.text}
+        )
+        for query in queries
     ]
-    return query_response
 
+
+@app.post("/hospital-rag-agent/stream")
+async def stream_hospital_agent(query: HospitalQueryInput) -> StreamingResponse:
+    """
+    Same as /hospital-rag-agent, but streamed as NDJSON (one
+    HospitalQueryStreamEvent per line): tool calls and observations as they
+    happen, then the tokens of the final answer, then the complete response.
+    Like every run, failed LLM and Neo4j calls are retried individually, but a
+    failed run is not restarted; errors are reported as a last "error" event.
+    """
+    routed_response = None
+    if FAST_PATH_ENABLED:
+        routed_response = await fast_path_router.route(query.text)
+
+    embedding, cached_response = None, None
+    if routed_response is None:
+        embedding, cached_response = await _lookup_cached_answer(query.text)
+    if routed_response is None and cached_response is None:
+        # reject before the 200 status line has been sent
+        try:
+            admission.check()
+        except QueueFullError as e:
+            raise _overloaded(e)
+
+    def line(**event) -> str:
+        stream_event = HospitalQueryStreamEvent(**event)
+        return stream_event.model_dump_json(exclude_none=True) + "\n"
+
+    async def events():
+        if routed_response is not None:
+            for action, observation in routed_response["intermediate_steps"]:
+                yield line(
+                    event="tool_start", tool=action.tool, input=action.tool_input
+                )
+                yield line(event="tool_end", tool=action.tool, output=str(observation))
+            response = _finish_response(query.text, None, routed_response)
+            yield line(event="final", response=response)
+            return
+
+        if cached_response is not None:
+            yield line(event="final", response=cached_response)
+            return
+
+        try:
+            async with admission.admit():
+                with retry_budget(REQUEST_RETRY_BUDGET):
+                    agent_executor = await aget_hospital_rag_agent_executor()
+                    async for event in stream_agent_events(
+                        agent_executor, query.text
+                    ):
+                        if event["event"] == "final":
+                            event["response"] = _finish_response(
+                                query.text, embedding, event["response"]
+                            )
+                        yield line(**event)
+        except Exception as e:
+            yield line(event="error", detail=str(e))
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
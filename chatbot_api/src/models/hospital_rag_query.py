@@ -1,6 +1,8 @@
 """
 Models for input and output of the RAG system agent
 """
+from typing import Literal, Optional
+
 from pydantic import BaseModel
 
 
@@ -12,3 +14,33 @@ class HospitalQueryOutput(BaseModel):
     input: str
     output: str
     intermediate_steps: list[str]
+
+
+class HospitalQueryStreamEvent(BaseModel):
+    """
+    One line of the streaming endpoint's NDJSON response. Only the fields of
+    the given event type are set:
+    - tool_start: tool, input
+    - tool_end: tool, output
+    - token: token (a piece of the final answer)
+    - final: response (the same payload as the non-streaming endpoint)
+    - error: detail
+    """
+    event: Literal["tool_start", "tool_end", "token", "final", "error"]
+    tool: Optional[str] = None
+    input: Optional[str] = None
+    output: Optional[str] = None
+    token: Optional[str] = None
+    response: Optional[HospitalQueryOutput] = None
+    detail: Optional[str] = None
+
+
+class HospitalBatchItemOutput(BaseModel):
+    """
+    Result of one question of a batch: the response, or the error (with the
+    status code the single-question endpoint would have returned).
+    """
+    input: str
+    status_code: int = 200
+    response: Optional[HospitalQueryOutput] = None
+    error: Optional[str] = None
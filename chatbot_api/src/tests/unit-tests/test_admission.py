@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from utils.admission import AdmissionController, QueueFullError
+
+
+@pytest.mark.asyncio
+async def test_rejects_when_slots_and_queue_are_full():
+    admission = AdmissionController(max_concurrency=1, max_queue=1)
+    release = asyncio.Event()
+
+    async def run():
+        async with admission.admit():
+            await release.wait()
+
+    running = asyncio.ensure_future(run())
+    queued = asyncio.ensure_future(run())
+    await asyncio.sleep(0)
+    assert admission.stats()["running"] == 1
+    assert admission.stats()["queued"] == 1
+
+    with pytest.raises(QueueFullError) as e:
+        async with admission.admit():
+            pass
+    assert e.value.retry_after >= 1
+
+    release.set()
+    await asyncio.gather(running, queued)
+    stats = admission.stats()
+    assert (stats["admitted"], stats["rejected"], stats["running"]) == (2, 1, 0)
+
+
+@pytest.mark.asyncio
+async def test_slot_is_released_on_error():
+    admission = AdmissionController(max_concurrency=1, max_queue=0)
+    with pytest.raises(RuntimeError):
+        async with admission.admit():
+            raise RuntimeError("tool failed")
+    async with admission.admit():
+        pass
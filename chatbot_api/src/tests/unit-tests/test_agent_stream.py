@@ -0,0 +1,27 @@
+from utils.agent_stream import FinalAnswerStreamer
+
+
+def stream(tokens):
+    streamer = FinalAnswerStreamer()
+    return [streamer.feed(t) for t in tokens], streamer
+
+
+def test_only_final_answer_is_streamed():
+    emitted, streamer = stream(
+        ["Thought: I know it\n", "Final Answer: ", "There are ", "30 hospitals."]
+    )
+    assert "".join(emitted) == "There are 30 hospitals."
+    assert streamer.text == "There are 30 hospitals."
+
+
+def test_marker_split_across_tokens():
+    emitted, _ = stream(["Thought: done\nFin", "al Ans", "wer:", " Yes", "."])
+    assert emitted == ["", "", "", "Yes", "."]
+
+
+def test_tool_call_output_is_not_streamed():
+    emitted, streamer = stream(
+        ['Action:\n```\n{"action": "Graph", ', '"action_input": "q"}\n```']
+    )
+    assert emitted == ["", ""]
+    assert streamer.text == ""
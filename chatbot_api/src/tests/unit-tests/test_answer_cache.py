@@ -0,0 +1,75 @@
+from utils.answer_cache import SemanticAnswerCache, tools_used
+
+# tiny fake embedding space: paraphrases map to (almost) the same vector
+VECTORS = {
+    "how many visits?": [1.0, 0.0, 0.0],
+    "how many visits are there?": [0.99, 0.05, 0.0],
+    "who is the oldest patient?": [0.0, 1.0, 0.0],
+    "which payer billed the most?": [0.0, 0.0, 1.0],
+}
+
+class Clock:
+    def __init__(self): self.now = 0.0
+    def __call__(self): return self.now
+
+class FakeAction:
+    def __init__(self, tool): self.tool = tool
+
+def make_cache(**kwargs):
+    return SemanticAnswerCache(embed_fn=lambda q: VECTORS[q], **kwargs)
+
+def response(q, a="ok"):
+    return {"input": q, "output": a, "intermediate_steps": []}
+
+def test_hit_on_paraphrase():
+    cache = make_cache(similarity_threshold=0.95)
+    q = "how many visits?"
+    cache.store(q, cache.embed(q), response(q, "42"))
+    hit = cache.lookup(cache.embed("how many visits are there?"))
+    assert hit["output"] == "42"
+    assert cache.stats()["hits"] == 1
+
+def test_miss_below_threshold():
+    cache = make_cache()
+    q = "how many visits?"
+    cache.store(q, cache.embed(q), response(q))
+    assert cache.lookup(cache.embed("who is the oldest patient?")) is None
+    assert cache.stats()["misses"] == 1
+
+def test_ttl_expiry():
+    clock = Clock()
+    cache = make_cache(ttl_seconds=10, clock=clock)
+    q = "how many visits?"
+    cache.store(q, cache.embed(q), response(q))
+    clock.now = 11
+    assert cache.lookup(cache.embed(q)) is None
+    assert cache.stats()["expirations"] == 1
+
+def test_lru_eviction_keeps_recently_used():
+    cache = make_cache(max_size=2)
+    a, b, c = "how many visits?", "who is the oldest patient?", "which payer billed the most?"
+    cache.store(a, cache.embed(a), response(a))
+    cache.store(b, cache.embed(b), response(b))
+    assert cache.lookup(cache.embed(a)) is not None  # a is now most recent
+    cache.store(c, cache.embed(c), response(c))
+    assert cache.lookup(cache.embed(b)) is None
+    assert cache.lookup(cache.embed(a)) is not None
+    assert cache.stats()["evictions"] == 1
+
+def test_volatile_tools_not_cached():
+    cache = make_cache()
+    q = "how many visits?"
+    assert not cache.store(q, cache.embed(q), response(q), tools=["Graph", "Waits"])
+    assert cache.stats()["size"] == 0
+    assert cache.stats()["skipped_volatile"] == 1
+
+def test_clear():
+    cache = make_cache()
+    q = "how many visits?"
+    cache.store(q, cache.embed(q), response(q))
+    cache.clear("new-version")
+    assert cache.lookup(cache.embed(q)) is None
+
+def test_tools_used():
+    steps = [(FakeAction("Graph"), "[]"), (FakeAction("Waits"), "5 minutes")]
+    assert tools_used(steps) == ["Graph", "Waits"]
@@ -1,5 +1,13 @@
+import asyncio
+import json
+import os
 from fastapi.testclient import TestClient
 import pytest
+
+# the answer cache would load an embedding model on the first request
+os.environ["ANSWER_CACHE_ENABLED"] = "false"
+# the fast-path router would load hospital names from Neo4j
+os.environ["FAST_PATH_ENABLED"] = "false"
 import main
 
 # replace the real agent call with a dummy
@@ -14,6 +22,11 @@ def test_get_status():
     assert r.status_code == 200
     assert r.json() == {"status": "running"}
 
+def test_ready_while_warming_up():
+    r = client.get("/ready")
+    assert r.status_code == 503
+    assert r.json()["status"] == "warming_up"
+
 def test_post_agent():
     body = {"text": "ping"}
     r = client.post("/hospital-rag-agent", json=body)
@@ -21,3 +34,89 @@ def test_post_agent():
     j = r.json()
     assert set(j.keys()) == {"input", "output", "intermediate_steps"}
     assert j["output"] == "ok"
+
+def test_stream_agent(monkeypatch):
+    async def fake_stream(agent_executor, q):
+        yield {"event": "tool_start", "tool": "Graph", "input": q}
+        yield {"event": "tool_end", "tool": "Graph", "output": "[]"}
+        yield {"event": "token", "token": "o"}
+        yield {"event": "token", "token": "k"}
+        yield {
+            "event": "final",
+            "response": {"input": q, "output": "ok", "intermediate_steps": []},
+        }
+
+    async def fake_executor():
+        return None
+
+    monkeypatch.setattr(main, "stream_agent_events", fake_stream)
+    monkeypatch.setattr(main, "aget_hospital_rag_agent_executor", fake_executor)
+
+    r = client.post("/hospital-rag-agent/stream", json={"text": "ping"})
+    assert r.status_code == 200
+    events = [json.loads(line) for line in r.text.splitlines()]
+    assert [e["event"] for e in events] == [
+        "tool_start", "tool_end", "token", "token", "final"
+    ]
+    assert events[-1]["response"] == {
+        "input": "ping", "output": "ok", "intermediate_steps": []
+    }
+
+def test_batch_agent_dedupes_and_keeps_order():
+    calls = []
+
+    async def counting_agent(q):
+        calls.append(q)
+        if q == "unsafe":
+            raise ValueError("write queries are not allowed")
+        return {"input": q, "output": q.upper(), "intermediate_steps": []}
+
+    main.invoke_agent_with_retry = counting_agent
+    try:
+        body = [{"text": "ping"}, {"text": "unsafe"}, {"text": "Ping?"}, {"text": "pong"}]
+        r = client.post("/hospital-rag-agent/batch", json=body)
+    finally:
+        main.invoke_agent_with_retry = fake_agent
+
+    assert r.status_code == 200
+    items = r.json()
+    assert [i["input"] for i in items] == ["ping", "unsafe", "Ping?", "pong"]
+    assert sorted(calls) == ["ping", "pong", "unsafe"]
+    assert items[0]["response"]["output"] == "PING"
+    assert items[2]["response"]["output"] == "PING"
+    assert items[1]["status_code"] == 400
+    assert items[1]["response"] is None
+
+@pytest.mark.asyncio
+async def test_identical_questions_share_one_run():
+    calls = []
+
+    async def slow_agent(q):
+        calls.append(q)
+        await asyncio.sleep(0.01)
+        return {"input": q, "output": "ok", "intermediate_steps": []}
+
+    main.invoke_agent_with_retry = slow_agent
+    try:
+        results = await asyncio.gather(
+            main._answer_question("Which hospitals?"),
+            main._answer_question("which hospitals"),
+        )
+    finally:
+        main.invoke_agent_with_retry = fake_agent
+
+    assert len(calls) == 1
+    assert [r["input"] for r in results] == ["Which hospitals?", "which hospitals"]
+
+def test_overload_returns_429_with_retry_after():
+    async def overloaded_agent(q):
+        raise main.QueueFullError(retry_after=7)
+
+    main.invoke_agent_with_retry = overloaded_agent
+    try:
+        r = client.post("/hospital-rag-agent", json={"text": "ping"})
+    finally:
+        main.invoke_agent_with_retry = fake_agent
+
+    assert r.status_code == 429
+    assert r.headers["Retry-After"] == "7"
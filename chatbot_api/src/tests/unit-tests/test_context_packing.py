@@ -0,0 +1,141 @@
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+from utils.context_packing import (
+    ContextPacker,
+    PackedRetriever,
+    estimate_tokens,
+    trim_overlap,
+)
+
+
+class TableEmbeddings(Embeddings):
+    """Vectors looked up by the first word of the text found in the table."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def embed_documents(self, texts):
+        return [
+            self.table[next(w for w in t.split() if w in self.table)] for t in texts
+        ]
+
+    def embed_query(self, text):
+        return self.table["query"]
+
+
+TABLE = {
+    "query": [1.0, 0.0, 0.0],
+    "billing": [0.9, 0.1, 0.0],
+    "billing2": [0.9, 0.11, 0.0],  # near-duplicate of "billing"
+    "nurses": [0.6, 0.0, 0.8],
+    "parking": [0.0, 1.0, 0.0],
+}
+
+
+def doc(text, **metadata):
+    return Document(page_content=text, metadata=metadata)
+
+
+def test_trim_overlap():
+    shared = "x" * 60
+    assert trim_overlap("start " + shared, shared + " end") == "start"
+    assert trim_overlap(shared + " end", "start " + shared) == "end"
+    # short shared text is not chunk overlap
+    assert trim_overlap("abc def", "xyz abc") == "abc def"
+
+
+def test_drops_duplicates_and_orders_by_mmr():
+    packer = ContextPacker(TableEmbeddings(TABLE), token_budget=1000, mmr_lambda=0.5)
+    docs = [doc("billing issues"), doc("billing2 issues"), doc("nurses kind"),
+            doc("parking lot")]
+
+    packed = packer.pack("question", docs)
+
+    assert [d.page_content for d in packed] == [
+        "billing issues", "nurses kind", "parking lot"
+    ]
+    stats = packer.stats()
+    assert stats["duplicates"] == 1
+    assert stats["passages_in"] == 4 and stats["passages_out"] == 3
+
+
+def test_trims_overlapping_chunks_of_the_same_source():
+    shared = "shared text between the two neighbouring chunks of the file"
+    docs = [
+        doc("billing first chunk " + shared, source="a.txt"),
+        doc(shared + " nurses second chunk", source="a.txt"),
+        doc(shared + " parking", source="b.txt"),
+    ]
+    packer = ContextPacker(TableEmbeddings(TABLE), token_budget=1000)
+
+    packed = packer.pack("question", docs)
+
+    texts = [d.page_content for d in packed]
+    assert "nurses second chunk" in texts
+    # other documents keep their text
+    assert shared + " parking" in texts
+    assert packer.stats()["tokens_out"] < packer.stats()["tokens_in"]
+
+
+def test_packs_up_to_the_token_budget():
+    docs = [doc("billing " + "a" * 400), doc("nurses " + "b" * 40),
+            doc("parking " + "c" * 40)]
+    budget = estimate_tokens(docs[1].page_content) + estimate_tokens(
+        docs[2].page_content
+    )
+    packer = ContextPacker(TableEmbeddings(TABLE), token_budget=budget)
+
+    packed = packer.pack("question", docs)
+
+    # the long passage does not fit, the two short ones still do
+    assert [d.page_content[:6] for d in packed] == ["nurses", "parkin"]
+    stats = packer.stats()
+    assert stats["over_budget"] == 1
+    assert stats["tokens_out"] <= budget < stats["tokens_in"]
+
+
+class ListRetriever(BaseRetriever):
+    documents: list
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        return self.documents
+
+
+@pytest.mark.asyncio
+async def test_packed_retriever():
+    packer = ContextPacker(TableEmbeddings(TABLE), token_budget=1000)
+    retriever = PackedRetriever(
+        base=ListRetriever(documents=[doc("billing x"), doc("billing2 x")]),
+        packer=packer,
+    )
+
+    assert [d.page_content for d in retriever.invoke("q")] == ["billing x"]
+    assert [d.page_content for d in await retriever.ainvoke("q")] == ["billing x"]
+    assert packer.stats()["calls"] == 2
+
+
+def test_uses_stored_embeddings_and_stops_at_max_passages():
+    embedded = []
+
+    class CountingEmbeddings(TableEmbeddings):
+        def embed_documents(self, texts):
+            embedded.extend(texts)
+            return super().embed_documents(texts)
+
+    embeddings = CountingEmbeddings(TABLE)
+    packer = ContextPacker(embeddings, token_budget=1000, max_passages=2)
+    docs = [
+        doc("billing issues", embedding=TABLE["billing"]),
+        doc("nurses kind", embedding=TABLE["nurses"]),
+        doc("parking lot"),
+    ]
+
+    packed = packer.pack("question", docs)
+
+    assert embedded == ["parking lot"]
+    assert [d.page_content for d in packed] == ["billing issues", "nurses kind"]
+    assert all("embedding" not in d.metadata for d in packed)
+    assert packer.stats()["embedded"] == 1
@@ -0,0 +1,47 @@
+from utils.cypher_cache import CypherTranslationCache
+from utils.text import normalize_question
+
+CYPHER = "MATCH (v:Visit) RETURN count(v)"
+
+def test_normalized_question_hits():
+    cache = CypherTranslationCache()
+    cache.put("How many visits are there?", "s1", CYPHER)
+    assert cache.get("  how many   visits are there ", "s1") == CYPHER
+    assert cache.stats()["hits"] == 1
+
+def test_other_schema_misses():
+    cache = CypherTranslationCache()
+    cache.put("How many visits?", "s1", CYPHER)
+    assert cache.get("How many visits?", "s2") is None
+
+def test_invalidate_keeps_current_schema():
+    cache = CypherTranslationCache()
+    cache.put("How many visits?", "s1", CYPHER)
+    cache.put("How many payers?", "s2", "MATCH (p:Payer) RETURN count(p)")
+    assert cache.invalidate(keep_fingerprint="s2") == 1
+    assert cache.get("How many visits?", "s1") is None
+    assert cache.get("How many payers?", "s2") is not None
+
+def test_lru_bound():
+    cache = CypherTranslationCache(max_size=1)
+    cache.put("a", "s1", CYPHER)
+    cache.put("b", "s1", CYPHER)
+    assert cache.stats()["size"] == 1
+    assert cache.get("a", "s1") is None
+
+def test_dump_and_load(tmp_path):
+    path = str(tmp_path / "cache" / "cypher.json")
+    cache = CypherTranslationCache()
+    cache.put("How many visits?", "s1", CYPHER)
+    cache.put("How many payers?", "old", "MATCH (p:Payer) RETURN count(p)")
+    assert cache.dump(path) == 2
+
+    restored = CypherTranslationCache()
+    assert restored.load(path, schema_fingerprint="s1") == 1
+    assert restored.get("how many visits", "s1") == CYPHER
+
+def test_load_missing_file(tmp_path):
+    assert CypherTranslationCache().load(str(tmp_path / "nope.json")) == 0
+
+def test_normalize_question():
+    assert normalize_question(" Which  Payer?? ") == "which payer"
@@ -0,0 +1,169 @@
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from chains.cypher_chain import (
+    CYPHER_EXAMPLES_PATH,
+    CYPHER_SCHEMA_HINTS,
+    CYPHER_TYPE_SYNONYMS,
+)
+from utils.cypher_prompt import (
+    CypherExample,
+    CypherExampleLibrary,
+    CypherPromptBuilder,
+    load_cypher_examples,
+    relevant_types,
+)
+
+
+def props(*names):
+    return [{"property": name, "type": "STRING"} for name in names]
+
+
+SCHEMA = {
+    "node_props": {
+        "Hospital": props("id", "name", "state_name"),
+        "Payer": props("id", "name"),
+        "Physician": props("id", "name", "dob", "grad_year", "school", "salary"),
+        "Patient": props("id", "name", "sex", "dob", "blood_type"),
+        "Visit": props("id", "admission_type", "admission_date", "status"),
+        "Review": props("id", "text", "hospital_name"),
+        "DataVersion": props("id", "version"),
+        "PayerYearSummary": props(
+            "payer_name", "year", "visit_count", "total_billing", "average_billing"
+        ),
+        "AdmissionTypeSummary": props(
+            "admission_type", "visit_count", "average_stay_days"
+        ),
+        "StateYearSummary": props("state_name", "year", "visit_count"),
+        "PhysicianReviewSummary": props(
+            "physician_id", "physician_name", "review_count"
+        ),
+    },
+    "rel_props": {"COVERED_BY": props("service_date", "billing_amount")},
+    "relationships": [
+        {"start": "Visit", "type": "AT", "end": "Hospital"},
+        {"start": "Physician", "type": "TREATS", "end": "Visit"},
+        {"start": "Visit", "type": "COVERED_BY", "end": "Payer"},
+        {"start": "Patient", "type": "HAS", "end": "Visit"},
+        {"start": "Hospital", "type": "EMPLOYS", "end": "Physician"},
+        {"start": "Visit", "type": "WRITES", "end": "Review"},
+    ],
+    "metadata": {"constraint": [], "index": []},
+}
+
+
+class FakeGraph:
+    get_structured_schema = SCHEMA
+    _enhanced_schema = False
+
+
+class WordEmbeddings(Embeddings):
+    """One dimension per vocabulary word, counting its occurrences."""
+
+    VOCABULARY = ["oldest", "salary", "billed", "payer", "reviews"]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        words = text.lower().replace("?", "").split()
+        return [float(words.count(w)) for w in self.VOCABULARY] + [0.1]
+
+
+def test_picks_named_labels_and_connects_them():
+    types = relevant_types(
+        SCHEMA, "Which patients were treated by physicians from Texas?",
+        hints=CYPHER_SCHEMA_HINTS, synonyms=CYPHER_TYPE_SYNONYMS,
+    )
+    # Visit links patients and physicians, Texas is a Hospital state
+    assert types == sorted(
+        ["Patient", "Physician", "Visit", "Hospital", "HAS", "TREATS", "AT",
+         "EMPLOYS"]
+    )
+
+
+def test_properties_values_and_synonyms_pick_types():
+    assert relevant_types(SCHEMA, "What is the highest salary?") == ["Physician"]
+    assert relevant_types(
+        SCHEMA, "How much was billed to Aetna?",
+        hints=CYPHER_SCHEMA_HINTS, synonyms=CYPHER_TYPE_SYNONYMS,
+    ) == ["COVERED_BY", "Payer", "Visit"]
+
+
+def test_summary_nodes_are_picked_by_their_own_properties():
+    # "payer" names the Payer label, not PayerYearSummary.payer_name
+    assert relevant_types(SCHEMA, "Which payer is the largest?") == ["Payer"]
+    assert "PayerYearSummary" in relevant_types(SCHEMA, "Total billing per year?")
+
+
+def test_examples_pick_the_types_they_use():
+    example = CypherExample("q", "MATCH (r:Review)<-[:WRITES]-(v:Visit) RETURN r")
+    types = relevant_types(SCHEMA, "Anything new?", examples=[example])
+    assert types == ["Review", "Visit", "WRITES"]
+
+
+def test_nothing_relevant_and_excluded_types():
+    assert relevant_types(SCHEMA, "Hello there") == []
+    assert relevant_types(
+        SCHEMA, "What is the data version?", exclude_types=["DataVersion"]
+    ) == []
+
+
+def test_library_selects_most_similar_examples():
+    library = CypherExampleLibrary(
+        [
+            CypherExample("Who is the oldest patient?", "MATCH (p:Patient) RETURN p"),
+            CypherExample("Highest salary?", "MATCH (p:Physician) RETURN p"),
+            CypherExample("Which payer billed most?", "MATCH (p:Payer) RETURN p"),
+        ],
+        WordEmbeddings(),
+    )
+    selected = library.select("Which physician has the lowest salary?", k=1)
+    assert [e.question for e in selected] == ["Highest salary?"]
+
+    library.add(CypherExample("Salary of every physician", "MATCH (p) RETURN p"))
+    selected = library.select("salary salary", k=2)
+    assert {e.question for e in selected} == {
+        "Highest salary?", "Salary of every physician"
+    }
+
+
+@pytest.mark.asyncio
+async def test_builder_sends_the_schema_slice():
+    library = CypherExampleLibrary(
+        [
+            CypherExample("Who is the oldest patient?", "MATCH (p:Patient) RETURN p"),
+            CypherExample(
+                "Which payer billed most?",
+                "MATCH (v:Visit)-[c:COVERED_BY]->(p:Payer) RETURN p",
+            ),
+        ],
+        WordEmbeddings(),
+    )
+    builder = CypherPromptBuilder(
+        library, hints=CYPHER_SCHEMA_HINTS, synonyms=CYPHER_TYPE_SYNONYMS, k=1,
+        exclude_types=["DataVersion"],
+    )
+
+    inputs = await builder.ainputs("Which payer billed Cigna?", FakeGraph(), "FULL")
+
+    assert "Payer" in inputs["schema"] and "Physician" not in inputs["schema"]
+    assert inputs["examples"].startswith("# Which payer billed most?")
+    assert "Payer names" in inputs["hints"]
+    assert "hospital states" not in inputs["hints"]
+
+    stats = builder.stats()
+    assert stats["calls"] == 1 and stats["pruned"] == 1
+
+    # nothing to prune on: the full schema goes out
+    builder = CypherPromptBuilder(library, k=0)
+    assert builder.inputs("Hello", FakeGraph(), "FULL")["schema"] == "FULL"
+
+
+def test_example_library_matches_the_schema():
+    examples = load_cypher_examples(CYPHER_EXAMPLES_PATH)
+    assert len(examples) >= 4
+    known = set(SCHEMA["node_props"]) | {r["type"] for r in SCHEMA["relationships"]}
+    for example in examples:
+        types = relevant_types(SCHEMA, "", examples=[example])
+        assert types and set(types) <= known, example.question
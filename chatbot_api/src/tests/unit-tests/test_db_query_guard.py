@@ -0,0 +1,132 @@
+import pytest
+from neo4j.exceptions import ServiceUnavailable
+
+import utils.neo4j_client as neo4j_client
+from utils.db_query_guard import CypherQueryGuard, QueryRejectedError, push_down_limit
+
+
+def op(name, rows, details="", children=()):
+    return {
+        "operatorType": f"{name}@neo4j",
+        "args": {"EstimatedRows": rows, "Details": details},
+        "identifiers": [],
+        "children": list(children),
+    }
+
+
+CHEAP_PLAN = op("ProduceResults", 25, children=[
+    op("Limit", 25, children=[op("NodeByLabelScan", 9999, "v:Visit")])
+])
+
+CARTESIAN_PLAN = op("ProduceResults", 25, children=[
+    op("CartesianProduct", 9.9e7, children=[
+        op("NodeByLabelScan", 9999, "v:Visit"),
+        op("NodeByLabelScan", 9999, "p:Patient"),
+    ])
+])
+
+
+def test_push_down_limit():
+    assert push_down_limit("MATCH (v:Visit) RETURN v;", 25) == (
+        "MATCH (v:Visit) RETURN v\nLIMIT 25"
+    )
+    assert push_down_limit("MATCH (v) RETURN v LIMIT 5", 25).endswith("LIMIT 5")
+    assert push_down_limit("MATCH (v) RETURN v limit 500", 25).endswith("LIMIT 25")
+    union = "MATCH (a:A) RETURN a.x AS x UNION MATCH (b:B) RETURN b.x AS x"
+    assert push_down_limit(union, 25) == union
+    # a LIMIT before the final RETURN does not bound the result
+    assert push_down_limit("MATCH (v) WITH v LIMIT 5 RETURN v", 25).endswith(
+        "RETURN v\nLIMIT 25"
+    )
+
+
+def test_push_down_limit_caps_parameter_limits():
+    assert push_down_limit("MATCH (v) RETURN v LIMIT $n", 25) == (
+        "MATCH (v) RETURN v LIMIT CASE WHEN ($n) < 25 THEN ($n) ELSE 25 END"
+    )
+    commented = "MATCH (v) RETURN v LIMIT $n // top n"
+    assert push_down_limit(commented, 25) == commented
+
+
+def test_accepts_cheap_plans_with_a_limit():
+    explained = []
+
+    def explain(cypher):
+        explained.append(cypher)
+        return CHEAP_PLAN
+
+    guard = CypherQueryGuard(explain)
+
+    assert guard.guard("MATCH (v:Visit) RETURN v", 25).endswith("LIMIT 25")
+    # the plan checked is the plan of the statement that runs
+    assert explained == ["MATCH (v:Visit) RETURN v\nLIMIT 25"]
+    assert guard.stats() == {"checked": 1, "limited": 1, "rejected": {}}
+
+
+def test_rejects_cartesian_products():
+    guard = CypherQueryGuard(lambda cypher: CARTESIAN_PLAN, max_rows=1e9)
+
+    with pytest.raises(QueryRejectedError, match="cartesian product"):
+        guard.guard("MATCH (v:Visit), (p:Patient) RETURN count(*)", 25)
+    assert guard.stats()["rejected"] == {"cartesian_product": 1}
+
+
+def test_rejects_large_scans_rows_and_writes():
+    guard = CypherQueryGuard(
+        lambda cypher: CHEAP_PLAN, max_scan_rows=1000, max_rows=1e6
+    )
+    with pytest.raises(QueryRejectedError, match="v:Visit"):
+        guard.guard("MATCH (v:Visit) RETURN v", 25)
+
+    assert [reason for reason, _ in guard.problems(op("Expand(All)", 5e6))] == [
+        "estimated_rows"
+    ]
+    assert [reason for reason, _ in guard.problems(op("SetProperty", 1))] == [
+        "write"
+    ]
+
+
+def test_rejects_procedure_calls():
+    guard = CypherQueryGuard(lambda cypher: CHEAP_PLAN)
+    plan = op("ProduceResults", 1, children=[
+        op("ProcedureCall", 1, "apoc.create.node(['Visit'], {})")
+    ])
+
+    assert guard.problems(plan) == [
+        ("procedure_call", "a call to apoc.create.node(['Visit'], {})")
+    ]
+
+
+@pytest.mark.asyncio
+async def test_async_guard_uses_async_explain():
+    async def aexplain(cypher):
+        return CARTESIAN_PLAN
+
+    guard = CypherQueryGuard(lambda cypher: CHEAP_PLAN, aexplain_fn=aexplain)
+
+    # a rejection is a ValueError, like the other unsafe Cypher errors
+    with pytest.raises(ValueError):
+        await guard.aguard("MATCH (v:Visit), (p:Patient) RETURN v, p", 25)
+
+
+@pytest.mark.asyncio
+async def test_async_explain_retries_transient_errors(monkeypatch):
+    class Summary:
+        plan = CHEAP_PLAN
+
+    class Driver:
+        calls = 0
+
+        async def execute_query(self, query, **kwargs):
+            self.calls += 1
+            if self.calls == 1:
+                raise ServiceUnavailable("connection dropped")
+            return [], Summary(), []
+
+    driver = Driver()
+    monkeypatch.setattr(neo4j_client, "get_async_driver", lambda: driver)
+    before = neo4j_client.query_metrics.snapshot()["queries"]
+
+    assert await neo4j_client.aexplain("MATCH (v:Visit) RETURN v") == CHEAP_PLAN
+    assert driver.calls == 2
+    assert neo4j_client.query_metrics.snapshot()["queries"] == before + 1
@@ -0,0 +1,40 @@
+from utils.doc_manifest import DocumentManifest, file_sha256, make_chunk_ids
+
+SETTINGS = {"chunk_size": 1000, "chunk_overlap": 200, "embeddings": "m"}
+
+def make_manifest():
+    manifest = DocumentManifest(settings=SETTINGS)
+    manifest.record("a.txt", "h1", ["a-0", "a-1"])
+    manifest.record("b.txt", "h2", ["b-0"])
+    return manifest
+
+def test_unchanged_corpus_is_noop():
+    plan = make_manifest().plan({"a.txt": "h1", "b.txt": "h2"})
+    assert plan.is_noop
+    assert plan.unchanged == ["a.txt", "b.txt"]
+
+def test_changed_new_and_removed_files():
+    plan = make_manifest().plan({"a.txt": "h1-new", "c.txt": "h3"})
+    assert plan.to_index == ["a.txt", "c.txt"]
+    assert plan.removed == ["b.txt"]
+    assert sorted(plan.stale_chunk_ids) == ["a-0", "a-1", "b-0"]
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "store" / "manifest.json")
+    make_manifest().save(path)
+    loaded = DocumentManifest.load(path)
+    assert loaded.settings == SETTINGS
+    assert loaded.files["a.txt"]["chunk_ids"] == ["a-0", "a-1"]
+
+def test_load_missing(tmp_path):
+    assert DocumentManifest.load(str(tmp_path / "manifest.json")) is None
+
+def test_chunk_ids_depend_on_content(tmp_path):
+    doc = tmp_path / "doc.txt"
+    doc.write_text("v1")
+    h1 = file_sha256(str(doc))
+    doc.write_text("v2")
+    h2 = file_sha256(str(doc))
+    assert h1 != h2
+    assert make_chunk_ids("doc.txt", h1, 2) != make_chunk_ids("doc.txt", h2, 2)
+    assert make_chunk_ids("doc.txt", h1, 2) == make_chunk_ids("doc.txt", h1, 2)
@@ -0,0 +1,142 @@
+import asyncio
+import threading
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+import utils.embeddings as embeddings
+from utils.embeddings import (
+    MicroBatcher,
+    SharedEmbeddings,
+    export_quantized_onnx,
+    get_embeddings,
+    load_embedding_model,
+)
+
+
+class CountingModel(Embeddings):
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self.lock:
+            self.calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def shared(model, **kwargs):
+    kwargs.setdefault("window_seconds", 0.05)
+    return SharedEmbeddings("fake", model, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_queries_share_one_batch():
+    model = CountingModel()
+    embeddings = shared(model)
+
+    vectors = await asyncio.gather(
+        *(embeddings.aembed_query(q) for q in ["a", "bb", "ccc", "bb"])
+    )
+
+    assert vectors == [[1.0, 1.0], [2.0, 1.0], [3.0, 1.0], [2.0, 1.0]]
+    # one forward pass, duplicates encoded once
+    assert model.calls == [["a", "bb", "ccc"]]
+
+
+def test_batches_are_bounded():
+    model = CountingModel()
+    embeddings = shared(model, max_batch=2)
+
+    threads = [
+        threading.Thread(target=embeddings.embed_query, args=(str(i),))
+        for i in range(5)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert all(len(call) <= 2 for call in model.calls)
+    assert sorted(t for call in model.calls for t in call) == list("01234")
+
+
+def test_query_cache_is_an_lru():
+    model = CountingModel()
+    embeddings = shared(model, cache_size=2, window_seconds=0)
+
+    embeddings.embed_query("a")
+    embeddings.embed_query("b")
+    embeddings.embed_query("a")  # hit, "b" is now the oldest
+    embeddings.embed_query("c")  # evicts "b"
+    embeddings.embed_query("a")
+    embeddings.embed_query("b")
+
+    assert model.calls == [["a"], ["b"], ["c"], ["b"]]
+    stats = embeddings.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 4
+    assert stats["cache_size"] == 2
+
+
+def test_cached_vectors_are_copies():
+    embeddings = shared(CountingModel(), window_seconds=0)
+    embeddings.embed_query("a").append(99.0)
+    assert embeddings.embed_query("a") == [1.0, 1.0]
+
+
+def test_encoding_errors_reach_every_caller():
+    def fail(texts):
+        raise RuntimeError("model crashed")
+
+    batcher = MicroBatcher(fail, window_seconds=0.05)
+    futures = [batcher.submit("a"), batcher.submit("b")]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+    # the batcher keeps serving after a failure
+    with pytest.raises(RuntimeError):
+        batcher.submit("c").result(timeout=5)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        load_embedding_model("some/model", backend="tensorrt")
+
+
+def test_quantized_export_is_reused(tmp_path):
+    exported = tmp_path / "org__model__qint8_avx2" / "onnx"
+    exported.mkdir(parents=True)
+    (exported / "model_qint8_avx2.onnx").write_bytes(b"")
+
+    path, file_name = export_quantized_onnx("org/model", "avx2", str(tmp_path))
+
+    assert path == str(tmp_path / "org__model__qint8_avx2")
+    assert file_name == "onnx/model_qint8_avx2.onnx"
+
+
+def test_cold_load_does_not_block_other_models(monkeypatch):
+    started, release, loads = threading.Event(), threading.Event(), []
+
+    def load(model_name, backend):
+        loads.append(model_name)
+        if model_name == "slow":
+            started.set()
+            release.wait(5)
+        return CountingModel()
+
+    monkeypatch.setattr(embeddings, "_models", {})
+    monkeypatch.setattr(embeddings, "load_embedding_model", load)
+    slow = threading.Thread(target=get_embeddings, args=("slow",))
+    slow.start()
+    assert started.wait(5)
+
+    fast = get_embeddings("fast")
+
+    assert fast.model_name == "fast" and slow.is_alive()
+    release.set()
+    slow.join()
+    assert get_embeddings("slow") is get_embeddings("slow")
+    assert loads == ["slow", "fast"]
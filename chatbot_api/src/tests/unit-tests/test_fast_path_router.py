@@ -0,0 +1,82 @@
+import pytest
+
+import agents.fast_path_router as router_module
+from agents.fast_path_router import FastPathRouter, Route
+from utils.entity_index import EntityNameIndex
+
+HOSPITALS = [
+    "Wallace-Hamilton", "Jordan Inc", "Brown Inc", "Brown-Golden",
+    "Burke, Griffin and Cooper", "Walton LLC", "Cunningham and Sons",
+]
+INDEX = EntityNameIndex(HOSPITALS)
+
+
+class Names:
+    def get(self): return INDEX
+
+
+router = FastPathRouter(Names())
+
+
+def test_name_index_variants():
+    assert INDEX.find("wait time at wallace hamilton hospital?") == ["Wallace-Hamilton"]
+    assert INDEX.find("How busy is Jordan right now") == ["Jordan Inc"]
+    assert INDEX.find("burke griffin and cooper") == ["Burke, Griffin and Cooper"]
+    # the longer name wins over the short variant of another one
+    assert INDEX.find("wait at Brown-Golden") == ["Brown-Golden"]
+    assert INDEX.find("wait at Brown") == ["Brown Inc"]
+    assert INDEX.find("Tell me about Smith hospital") == []
+
+
+@pytest.mark.parametrize(
+    "question, route",
+    [
+        ("What is the current wait time at wallace-hamilton hospital?",
+         Route("Waits", "Wallace-Hamilton")),
+        ("How long is the wait at Jordan Inc right now", Route("Waits", "Jordan Inc")),
+        ("Which hospital has the shortest wait time?", Route("Availability", "")),
+        ("Which hospital is least busy?", Route("Availability", "")),
+        # aggregate or historical questions belong to the Graph tool
+        ("What is the average wait time at Jordan Inc?", None),
+        # several hospitals, or other subjects, need the agent
+        ("Compare the wait at Jordan Inc and Walton LLC", None),
+        ("What is the wait at Jordan Inc and what do patients say about it?", None),
+        ("Which physician has treated the most patients?", None),
+        ("What is the current wait time at Smith hospital?", None),
+        # location-scoped questions: the tools only know every hospital's wait
+        ("Which hospital in Texas has the shortest wait?", None),
+        ("Which hospital near Dallas has the shortest wait?", None),
+        ("Which hospital in texas has the shortest wait?", None),
+        ("What is the wait at Jordan Inc in Dallas?", None),
+        # past waits are not current waits
+        ("What was the wait at Wallace-Hamilton in 2019?", None),
+        ("How long was the wait at Jordan Inc for my mother?", None),
+    ],
+)
+def test_match(question, route):
+    assert router.match(question, INDEX) == route
+
+
+@pytest.mark.asyncio
+async def test_route_answers_from_the_tool(monkeypatch):
+    async def fake_waits(hospital): return "1 hours 5 minutes"
+    async def fake_available(_): return {"walton llc": 12}
+    monkeypatch.setattr(router_module, "aget_current_wait_times", fake_waits)
+    monkeypatch.setattr(router_module, "aget_most_available_hospital", fake_available)
+
+    r = await router.route("What is the wait time at Jordan Inc?")
+    assert r["output"] == "The current wait time at Jordan Inc is 1 hours 5 minutes."
+    assert r["intermediate_steps"][0][0].tool == "Waits"
+
+    r = await router.route("Which hospital has the shortest wait?")
+    assert r["output"] == "Walton LLC currently has the shortest wait time, at 12 minutes."
+
+    assert await router.route("How many visits were there in 2023?") is None
+
+
+@pytest.mark.asyncio
+async def test_tool_errors_fall_back_to_the_agent(monkeypatch):
+    async def failing_waits(hospital):
+        return f"Error: Unable to fetch wait time for '{hospital}'."
+    monkeypatch.setattr(router_module, "aget_current_wait_times", failing_waits)
+    assert await router.route("What is the wait time at Jordan Inc?") is None
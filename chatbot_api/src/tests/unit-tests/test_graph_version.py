@@ -0,0 +1,77 @@
+import threading
+import time
+
+from utils.graph_version import GraphVersionWatcher
+
+class FakeGraph:
+    def __init__(self): self.version, self.calls = "v1", 0
+    def query(self, _):
+        self.calls += 1
+        return [{"version": self.version}]
+
+class Clock:
+    def __init__(self): self.now = 0.0
+    def __call__(self): return self.now
+
+def test_first_version_is_not_a_change():
+    changes = []
+    watcher = GraphVersionWatcher(FakeGraph().query, clock=Clock())
+    watcher.on_change(changes.append)
+    assert watcher.check() == "v1"
+    assert changes == []
+
+def test_change_notifies_callbacks():
+    graph, clock, changes = FakeGraph(), Clock(), []
+    watcher = GraphVersionWatcher(graph.query, check_interval=30, clock=clock)
+    watcher.on_change(changes.append)
+    watcher.check()
+    graph.version = "v2"
+    clock.now = 31
+    assert watcher.check() == "v2"
+    assert changes == ["v2"]
+
+def test_checks_are_throttled():
+    graph, clock = FakeGraph(), Clock()
+    watcher = GraphVersionWatcher(graph.query, check_interval=30, clock=clock)
+    watcher.check()
+    clock.now = 5
+    watcher.check()
+    assert graph.calls == 1
+
+def test_failing_callback_does_not_stop_the_others():
+    graph, clock, changes = FakeGraph(), Clock(), []
+    watcher = GraphVersionWatcher(graph.query, check_interval=30, clock=clock)
+
+    def fail(_):
+        raise RuntimeError("boom")
+
+    watcher.on_change(fail)
+    watcher.on_change(changes.append)
+    watcher.check()
+    graph.version = "v2"
+    clock.now = 31
+    assert watcher.check() == "v2"
+    assert changes == ["v2"]
+
+def test_background_callbacks_run_off_the_caller():
+    graph, clock = FakeGraph(), Clock()
+    watcher = GraphVersionWatcher(graph.query, check_interval=30, clock=clock)
+    started, release, done = threading.Event(), threading.Event(), []
+
+    def slow(version):
+        started.set()
+        release.wait(5)
+        done.append(version)
+
+    watcher.on_change(slow, background=True)
+    watcher.check()
+    graph.version = "v2"
+    clock.now = 31
+    assert watcher.check() == "v2"
+    assert started.wait(5) and done == []
+    release.set()
+    for _ in range(100):
+        if done:
+            break
+        time.sleep(0.01)
+    assert done == ["v2"]
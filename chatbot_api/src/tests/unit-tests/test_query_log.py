@@ -0,0 +1,54 @@
+import json
+
+from utils.query_log import QueryLog
+
+
+def read_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_records_queries_as_json_lines(tmp_path):
+    path = tmp_path / "logs" / "queries.jsonl"
+    log = QueryLog(str(path))
+
+    log.record("MATCH (p:Payer)\n  WHERE p.name = 'Cigna'\nRETURN p", 0.0123, 1, False)
+    log.record("MATCH (v:Visit) RETURN v", 30.0, None, True)
+    log.close()
+
+    first, second = read_lines(path)
+    assert first["query"] == "MATCH (p:Payer) WHERE p.name = 'Cigna' RETURN p"
+    assert first["ms"] == 12.3 and first["rows"] == 1 and not first["failed"]
+    assert second["failed"] and second["rows"] is None
+
+
+def test_rotates_at_max_bytes(tmp_path):
+    path = tmp_path / "queries.jsonl"
+    log = QueryLog(str(path), max_bytes=300, backups=1)
+    for i in range(10):
+        log.record(f"MATCH (n:Label{i}) RETURN n", 0.001, 0, False)
+    log.close()
+
+    assert (tmp_path / "queries.jsonl.1").exists()
+    assert path.stat().st_size <= 300
+
+
+def test_disabled_log_writes_nothing(tmp_path):
+    path = tmp_path / "queries.jsonl"
+    QueryLog(str(path), enabled=False).record("RETURN 1", 0.001, 1, False)
+    assert not path.exists()
+
+
+def test_logs_small_parameters_only(tmp_path):
+    path = tmp_path / "queries.jsonl"
+    log = QueryLog(str(path), max_params_chars=100)
+    query = "MATCH (r:Review) WHERE r.hospital_name IN $names RETURN r"
+    log.record(query, 0.01, 3, False, params={"names": ["Jordan Inc"]})
+    log.record(query, 0.01, 3, False, params={"embedding": [0.1] * 100})
+    log.record("MATCH (v:Visit) RETURN count(v)", 0.01, 1, False)
+    log.close()
+
+    small, large, none = read_lines(path)
+    assert small["params"] == {"names": ["Jordan Inc"]}
+    assert "params" not in large
+    assert none["params"] == {}
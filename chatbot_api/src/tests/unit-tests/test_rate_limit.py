@@ -0,0 +1,47 @@
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from utils.rate_limit import ModelRateLimiter, TokenBucket, TokenUsageCallback
+
+
+class Clock:
+    def __init__(self): self.now = 0.0
+    def __call__(self): return self.now
+
+
+def test_bucket_refills_over_time():
+    clock = Clock()
+    bucket = TokenBucket(capacity=2, refill_per_second=1, clock=clock)
+    bucket.charge(2)
+    assert bucket.wait_time(1) == 1
+    clock.now = 0.5
+    assert bucket.wait_time(1) == 0.5
+    clock.now = 10
+    assert bucket.tokens == 2  # never above capacity
+
+
+def test_requests_per_minute():
+    clock = Clock()
+    limiter = ModelRateLimiter(requests_per_minute=2, tokens_per_minute=1000, clock=clock)
+    assert limiter.acquire(blocking=False)
+    assert limiter.acquire(blocking=False)
+    assert not limiter.acquire(blocking=False)
+    clock.now = 30  # one request refilled
+    assert limiter.acquire(blocking=False)
+    assert limiter.stats()["throttled"] == 1
+
+
+def test_token_debt_blocks_until_repaid():
+    clock = Clock()
+    limiter = ModelRateLimiter(requests_per_minute=100, tokens_per_minute=600, clock=clock)
+    callback = TokenUsageCallback(limiter)
+    message = AIMessage(
+        content="ok",
+        usage_metadata={"input_tokens": 500, "output_tokens": 200, "total_tokens": 700},
+    )
+    callback.on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]]))
+
+    assert limiter.stats()["tokens_used"] == 700
+    assert not limiter.acquire(blocking=False)
+    clock.now = 11  # 10 tokens/second repay the 100 token debt
+    assert limiter.acquire(blocking=False)
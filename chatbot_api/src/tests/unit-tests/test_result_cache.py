@@ -0,0 +1,51 @@
+from utils.result_cache import VersionedResultCache
+
+class Version:
+    def __init__(self, v): self.v = v
+    def __call__(self): return self.v
+
+class FakeGraph:
+    def __init__(self): self.calls = 0
+    def query(self, cypher, params):
+        self.calls += 1
+        return [{"payer": "Cigna", "total": 100.0}]
+
+QUERY = """MATCH (p:Payer)<-[c:COVERED_BY]-(v:Visit)
+RETURN p.name AS payer, SUM(c.billing_amount) AS total"""
+
+def test_repeated_query_skips_database():
+    graph, cache = FakeGraph(), VersionedResultCache(Version("v1"))
+    first = cache.query(graph.query, QUERY)
+    second = cache.query(graph.query, "  " + QUERY.replace("\n", " "))
+    assert first == second
+    assert graph.calls == 1
+    assert cache.stats()["hits"] == 1
+
+def test_params_are_part_of_the_key():
+    graph, cache = FakeGraph(), VersionedResultCache(Version("v1"))
+    cache.query(graph.query, QUERY, {"year": 2023})
+    cache.query(graph.query, QUERY, {"year": 2022})
+    assert graph.calls == 2
+
+def test_version_change_drops_entries():
+    version = Version("v1")
+    graph, cache = FakeGraph(), VersionedResultCache(version)
+    cache.query(graph.query, QUERY)
+    version.v = "v2"
+    cache.query(graph.query, QUERY)
+    assert graph.calls == 2
+
+def test_unknown_version_is_not_cached():
+    graph, cache = FakeGraph(), VersionedResultCache(Version(None))
+    cache.query(graph.query, QUERY)
+    cache.query(graph.query, QUERY)
+    assert graph.calls == 2
+    assert cache.stats()["size"] == 0
+
+def test_version_is_read_outside_the_lock():
+    graph = FakeGraph()
+    # a version check may run change callbacks that touch the cache itself
+    cache = VersionedResultCache(lambda: cache.stats() and "v1")
+    cache.query(graph.query, QUERY)
+    cache.query(graph.query, QUERY)
+    assert graph.calls == 1
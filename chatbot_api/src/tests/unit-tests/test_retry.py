@@ -0,0 +1,73 @@
+import pytest
+from google.api_core.exceptions import InvalidArgument, ResourceExhausted
+from neo4j.exceptions import CypherSyntaxError, ServiceUnavailable
+
+from utils.retry import RetryPolicy, is_retryable, retry_budget, retry_call
+
+NO_WAIT = RetryPolicy(max_attempts=3, base_delay=0, max_delay=0)
+
+
+class Flaky:
+    def __init__(self, errors): self.errors, self.calls = list(errors), 0
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def test_classification():
+    assert is_retryable(ServiceUnavailable("connection lost"))
+    assert is_retryable(ResourceExhausted("quota"))
+    assert is_retryable(TimeoutError())
+    assert not is_retryable(ValueError("Only read queries are allowed"))
+    assert not is_retryable(CypherSyntaxError("bad cypher"))
+    assert not is_retryable(InvalidArgument("bad request"))
+
+
+def test_wrapped_transient_error_is_retryable():
+    try:
+        try:
+            raise ServiceUnavailable("connection lost")
+        except ServiceUnavailable as e:
+            raise RuntimeError("tool failed") from e
+    except RuntimeError as wrapped:
+        assert is_retryable(wrapped)
+
+
+def test_transient_errors_are_retried():
+    call = Flaky([ServiceUnavailable("down"), ResourceExhausted("quota")])
+    assert retry_call(call, NO_WAIT) == "ok"
+    assert call.calls == 3
+
+
+def test_permanent_errors_are_not_retried():
+    call = Flaky([ValueError("Only read queries are allowed")])
+    with pytest.raises(ValueError):
+        retry_call(call, NO_WAIT)
+    assert call.calls == 1
+
+
+def test_last_error_is_raised_after_max_attempts():
+    call = Flaky([ServiceUnavailable("down")] * 5)
+    with pytest.raises(ServiceUnavailable):
+        retry_call(call, NO_WAIT)
+    assert call.calls == 3
+
+
+def test_budget_is_shared_by_the_calls_of_a_request():
+    first = Flaky([ServiceUnavailable("down")])
+    second = Flaky([ServiceUnavailable("down")])
+    with retry_budget(1) as budget:
+        assert retry_call(first, NO_WAIT) == "ok"
+        with pytest.raises(ServiceUnavailable):
+            retry_call(second, NO_WAIT)
+    assert budget.remaining == 0
+    assert second.calls == 1
+
+
+def test_backoff_is_capped_and_jittered():
+    policy = RetryPolicy(max_attempts=10, base_delay=1, max_delay=4)
+    delays = [policy.backoff(6) for _ in range(50)]
+    assert all(0 <= d <= 4 for d in delays)
+    assert len(set(delays)) > 1
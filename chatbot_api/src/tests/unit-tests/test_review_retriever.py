@@ -0,0 +1,129 @@
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import chains.review_chain as review_chain
+from chains.review_chain import REVIEW_VECTOR_QUERY, ReviewRetriever
+from utils.entity_index import GraphNameIndex
+
+
+def names(*values):
+    return GraphNameIndex("", query_fn=lambda _: [{"name": v} for v in values])
+
+
+def no_graph(_):
+    raise RuntimeError("no graph")
+
+
+def row(review_id, hospital):
+    return {
+        "text": f"\ntext: review {review_id}",
+        "metadata": {"id": review_id, "hospital_name": hospital, "physician_name": None},
+        "score": 0.9,
+    }
+
+
+class FakeGraph:
+    def __init__(self, filtered_rows):
+        self.filtered_rows = filtered_rows
+        self.calls = []
+
+    def query(self, query, params):
+        self.calls.append((query, params))
+        if query == REVIEW_VECTOR_QUERY:
+            return [row(1, "Jordan Inc"), row(2, "Walton LLC")]
+        return self.filtered_rows
+
+
+def make_retriever(**kwargs):
+    return ReviewRetriever(
+        embeddings=DeterministicFakeEmbedding(size=4),
+        name_indexes={
+            "hospital_name": names("Castaneda-Hardy", "Jordan Inc"),
+            "physician_name": names("Joshua Walker"),
+        },
+        **kwargs,
+    )
+
+
+def test_filters_on_names_in_the_question(monkeypatch):
+    graph = FakeGraph([row(3, "Castaneda-Hardy")])
+    monkeypatch.setattr(review_chain, "get_graph", lambda: graph)
+
+    docs = make_retriever(k=3).invoke(
+        "What are patients saying about the nursing staff at Castaneda-Hardy?"
+    )
+
+    assert [d.metadata["id"] for d in docs] == [3]
+    [(query, params)] = graph.calls
+    assert "node.hospital_name IN $hospital_name" in query
+    assert "physician_name IN" not in query
+    assert params["hospital_name"] == ["Castaneda-Hardy"]
+    assert params["k"] == 3
+
+
+def test_no_names_searches_all_reviews(monkeypatch):
+    graph = FakeGraph([])
+    monkeypatch.setattr(review_chain, "get_graph", lambda: graph)
+
+    docs = make_retriever().invoke("What do patients say about the food?")
+
+    assert len(docs) == 2
+    assert [q for q, _ in graph.calls] == [REVIEW_VECTOR_QUERY]
+
+
+def test_falls_back_when_the_filter_matches_nothing(monkeypatch):
+    graph = FakeGraph([])
+    monkeypatch.setattr(review_chain, "get_graph", lambda: graph)
+
+    docs = make_retriever().invoke("Reviews of Joshua Walker at Jordan Inc?")
+    assert len(docs) == 2
+    assert len(graph.calls) == 2
+    assert graph.calls[0][1]["physician_name"] == ["Joshua Walker"]
+
+    graph.calls.clear()
+    docs = make_retriever(fallback_to_unfiltered=False).invoke(
+        "Reviews of Joshua Walker at Jordan Inc?"
+    )
+    assert docs == []
+    assert len(graph.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_async_search_ignores_unavailable_names(monkeypatch):
+    calls = []
+
+    async def fake_aquery(query, params):
+        calls.append(query)
+        return [row(1, "Jordan Inc")]
+
+    monkeypatch.setattr(review_chain, "aquery", fake_aquery)
+    retriever = make_retriever()
+    retriever.name_indexes = {"hospital_name": GraphNameIndex("", query_fn=no_graph)}
+
+    docs = await retriever.ainvoke("What do patients say about Jordan Inc?")
+
+    assert len(docs) == 1
+    assert calls == [REVIEW_VECTOR_QUERY]
+
+
+@pytest.mark.parametrize(
+    "rows, warning",
+    [
+        ([], "not found"),
+        ([{"state": "POPULATING"}], "is POPULATING"),
+        ([{"state": "ONLINE"}], None),
+    ],
+)
+def test_check_vector_index(monkeypatch, caplog, rows, warning):
+    graph = FakeGraph(rows)
+    monkeypatch.setattr(review_chain, "get_graph", lambda: graph)
+
+    review_chain._check_vector_index()
+
+    [(query, params)] = graph.calls
+    assert query == review_chain.VECTOR_INDEX_QUERY
+    assert params == {"index_name": review_chain.REVIEW_INDEX_NAME}
+    if warning:
+        assert warning in caplog.text
+    else:
+        assert not caplog.records
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from utils.single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flight, runs = SingleFlight(), []
+
+    async def run_agent():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return {"output": "ok"}
+
+    results = await asyncio.gather(*(flight.do("q", run_agent) for _ in range(5)))
+    assert len(runs) == 1
+    assert all(r == {"output": "ok"} for r in results)
+    stats = flight.stats()
+    assert stats["executions"] == 1
+    assert stats["coalesced"] == 4
+    assert stats["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_sequential_calls_run_again():
+    flight, runs = SingleFlight(), []
+
+    async def run_agent():
+        runs.append(1)
+        return "ok"
+
+    await flight.do("q", run_agent)
+    await flight.do("q", run_agent)
+    assert len(runs) == 2
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_caller():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("unsafe")
+
+    results = await asyncio.gather(
+        flight.do("q", fail), flight.do("q", fail), return_exceptions=True
+    )
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_others():
+    flight = SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    first = asyncio.ensure_future(flight.do("q", slow))
+    second = asyncio.ensure_future(flight.do("q", slow))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    assert await second == "ok"
@@ -0,0 +1,55 @@
+import threading
+from utils.warmup import Lazy, Warmup
+
+def test_lazy_builds_once_under_concurrency():
+    calls = []
+    lazy = Lazy(lambda: calls.append(1) or "value")
+    threads = [threading.Thread(target=lazy.get) for _ in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert lazy.get() == "value"
+    assert calls == [1]
+    assert lazy.ready
+
+def test_lazy_retries_after_failure():
+    attempts = []
+    def factory():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("graph down")
+        return "value"
+    lazy = Lazy(factory)
+    try:
+        lazy.get()
+    except RuntimeError:
+        pass
+    assert not lazy.ready
+    assert lazy.get() == "value"
+
+def test_warmup_reports_stages():
+    warmup = Warmup()
+    warmup.add_stage("ok", lambda: None)
+    warmup.add_stage("broken", lambda: 1 / 0)
+    warmup.add_stage("after", lambda: None)
+    assert not warmup.ready
+    warmup.run()
+    status = warmup.status()
+    assert status["ok"]["state"] == "ready"
+    assert status["broken"]["state"] == "failed"
+    assert status["after"]["state"] == "ready"
+    assert not warmup.ready
+
+def test_warmup_retries_failed_stages_with_backoff():
+    attempts, delays = [], []
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RuntimeError("graph down")
+    warmup = Warmup(retry_delay=1, max_retry_delay=1.5, sleep=delays.append)
+    warmup.add_stage("ok", lambda: None)
+    warmup.add_stage("flaky", flaky)
+    warmup.run_until_ready()
+    assert warmup.ready
+    assert delays == [1, 1.5]
+    assert warmup.status()["flaky"]["attempts"] == 3
+    assert warmup.status()["ok"]["attempts"] == 1
@@ -2,11 +2,16 @@
 Note: this code is meant to demonstrate in rought lines how a tool that fetches specific data in a RAG agent could work. if we had an actual hospital system and etc, 
 this could be, for instance, an API call to the system or another way of communication with it. 
 """
-import os
-from typing import Any
+from typing import Any, Optional
 
 import numpy as np
-from langchain_neo4j import Neo4jGraph
+
+from utils.neo4j_client import aquery, get_graph
+
+CURRENT_HOSPITALS_QUERY = """
+MATCH (h:Hospital)
+RETURN h.name AS hospital_name
+"""
 
 
 def _get_current_hospitals() -> list[str]:
@@ -18,35 +23,43 @@ def _get_current_hospitals() -> list[str]:
     Returns:
         list[str]: A list of hospital names in lowercase.
     """
-    graph = Neo4jGraph(
-        url=os.getenv("NEO4J_URI"),
-        username=os.getenv("NEO4J_USERNAME"),
-        password=os.getenv("NEO4J_PASSWORD"),
-    )
-
-    current_hospitals = graph.query(
-        """
-        MATCH (h:Hospital)
-        RETURN h.name AS hospital_name
-        """
-    )
+    current_hospitals = get_graph().query(CURRENT_HOSPITALS_QUERY)
 
     current_hospitals = [d["hospital_name"].lower() for d in current_hospitals]
 
     return current_hospitals
 
 
-def _get_current_wait_time_minutes(hospital: str) -> int:
+async def _aget_current_hospitals() -> list[str]:
+    """
+    Async version of _get_current_hospitals, run on the async Neo4j driver.
+
+    Args:
+        None
+    Returns:
+        list[str]: A list of hospital names in lowercase.
+    """
+    current_hospitals = await aquery(CURRENT_HOSPITALS_QUERY)
+
+    return [d["hospital_name"].lower() for d in current_hospitals]
+
+
+def _get_current_wait_time_minutes(
+    hospital: str, current_hospitals: Optional[list[str]] = None
+) -> int:
     """
     Get the current wait time at a hospital in minutes.
     
     Args:
         hospital (str): The name of the hospital.
+        current_hospitals (Optional[list[str]]): Lowercase hospital names, if
+            already fetched. Fetched from the database otherwise.
     Returns:
         int: The wait time in minutes, or -1 if the hospital does not exist.
     """
 
-    current_hospitals = _get_current_hospitals()
+    if current_hospitals is None:
+        current_hospitals = _get_current_hospitals()
 
     if hospital.lower() not in current_hospitals:
         return -1
@@ -68,9 +81,53 @@ def get_current_wait_times(hospital: str) -> str:
     except Exception:
         return f"Error: Unable to fetch wait time for '{hospital}'."
 
+    return _format_wait_time(hospital, wait_time_in_minutes)
+
+
+async def aget_current_wait_times(hospital: str) -> str:
+    """
+    Async version of get_current_wait_times.
+
+    Args:
+        hospital (str): The name of the hospital.
+    Returns:
+        str: The wait time formatted as "X hours Y minutes" or "Y minutes".
+    """
+    try:
+        current_hospitals = await _aget_current_hospitals()
+    except Exception:
+        return f"Error: Unable to fetch wait time for '{hospital}'."
+
+    wait_time_in_minutes = _get_current_wait_time_minutes(hospital, current_hospitals)
+
+    return _format_wait_time(hospital, wait_time_in_minutes)
+
+
+def _format_wait_time(hospital: str, wait_time_in_minutes: int) -> str:
+    """
+    Format a wait time in minutes as "X hours Y minutes" or "Y minutes".
+
+    Args:
+        hospital (str): The name of the hospital.
+        wait_time_in_minutes (int): The wait time, or -1 for unknown hospitals.
+    Returns:
+        str: The formatted wait time, or an error message.
+    """
     if wait_time_in_minutes == -1:
         return f"Hospital '{hospital}' does not exist."
 
+    return format_wait_minutes(wait_time_in_minutes)
+
+
+def format_wait_minutes(wait_time_in_minutes: int) -> str:
+    """
+    Format a number of minutes as "X hours Y minutes" or "Y minutes".
+
+    Args:
+        wait_time_in_minutes (int): The wait time in minutes.
+    Returns:
+        str: The formatted wait time.
+    """
     hours, minutes = divmod(wait_time_in_minutes, 60)
 
     if hours > 0:
@@ -96,12 +153,42 @@ def get_most_available_hospital(_: Any) -> dict[str, float]:
     except Exception:
         return {"error": "Unable to fetch hospital list from database."}
 
+    return _pick_most_available(current_hospitals)
+
+
+async def aget_most_available_hospital(_: Any) -> dict[str, float]:
+    """
+    Async version of get_most_available_hospital.
+
+    Args:
+        _: Unused parameter, can be any type.
+    Returns:
+        dict[str, float]: A dictionary with the hospital name as the key and the wait time in minutes as the value.
+    """
+    try:
+        current_hospitals = await _aget_current_hospitals()
+    except Exception:
+        return {"error": "Unable to fetch hospital list from database."}
+
+    return _pick_most_available(current_hospitals)
+
+
+def _pick_most_available(current_hospitals: list[str]) -> dict[str, float]:
+    """
+    Choose the hospital with the shortest current wait.
+
+    Args:
+        current_hospitals (list[str]): Lowercase hospital names.
+    Returns:
+        dict[str, float]: The hospital name and its wait time in minutes, or an error.
+    """
     # no hospitals to choose
     if not current_hospitals:
         return {"error": "No hospitals found in database."}
 
+    # the hospital list is fetched once, not once per hospital
     current_wait_times = [
-        _get_current_wait_time_minutes(h) for h in current_hospitals
+        _get_current_wait_time_minutes(h, current_hospitals) for h in current_hospitals
     ]
 
     # choose the shortest wait
@@ -0,0 +1,120 @@
+"""
+Admission control for agent runs: a fixed number of runs execute at once, a
+bounded number wait for a slot, and the rest are turned away immediately
+"""
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable
+
+
+class QueueFullError(Exception):
+    """
+    Raised when a run cannot even be queued. retry_after is a rough estimate,
+    in seconds, of when a slot is likely to free up.
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__("The service is overloaded, please retry later.")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Lets max_concurrency runs through at a time and queues up to max_queue
+    more; a run arriving at a full queue is rejected with QueueFullError
+    instead of waiting behind work it cannot finish in time for.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: int,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._clock = clock
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._running = 0
+        self._waiting = 0
+        # moving average of run durations, for the Retry-After estimate
+        self._avg_run_seconds = 0.0
+
+        self._admitted = 0
+        self._rejected = 0
+
+    @property
+    def full(self) -> bool:
+        """Whether a new run would be rejected."""
+        return self._running >= self.max_concurrency and self._waiting >= self.max_queue
+
+    def retry_after(self) -> int:
+        """
+        Estimate the seconds until the queue has room again.
+
+        Returns:
+            int: The estimate, at least 1 second.
+        """
+        batches = (self._waiting + 1) / self.max_concurrency
+        return max(1, math.ceil(batches * self._avg_run_seconds))
+
+    def check(self) -> None:
+        """
+        Fail fast if a new run would be rejected.
+
+        Raises:
+            QueueFullError: If all slots are busy and the queue is full.
+        """
+        if self.full:
+            self._rejected += 1
+            raise QueueFullError(self.retry_after())
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """
+        Wait for a run slot, queueing if needed.
+
+        Raises:
+            QueueFullError: If all slots are busy and the queue is full.
+        """
+        self.check()
+
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        self._running += 1
+        self._admitted += 1
+        started_at = self._clock()
+        try:
+            yield
+        finally:
+            duration = self._clock() - started_at
+            self._avg_run_seconds = (
+                duration
+                if self._avg_run_seconds == 0
+                else 0.8 * self._avg_run_seconds + 0.2 * duration
+            )
+            self._running -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Report admission counters.
+
+        Returns:
+            dict: Limits, current running/queued runs and admit/reject counts.
+        """
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "running": self._running,
+            "queued": self._waiting,
+            "admitted": self._admitted,
+            "rejected": self._rejected,
+            "avg_run_seconds": round(self._avg_run_seconds, 3),
+        }
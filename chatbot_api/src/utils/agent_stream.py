@@ -0,0 +1,124 @@
+"""
+Turns the event stream of an agent run into the events sent to clients of the
+streaming endpoint: tool calls, tool observations, final-answer tokens and the
+final response.
+"""
+from typing import Any, AsyncIterator
+
+from langchain.agents import AgentExecutor
+
+# tag of the agent's own LLM, so its tokens can be told apart from the tokens of
+# the LLMs running inside the tools
+AGENT_LLM_TAG = "hospital_agent_llm"
+
+FINAL_ANSWER_MARKER = "Final Answer:"
+
+
+class FinalAnswerStreamer:
+    """
+    Incrementally scans the output of one agent LLM call and yields only the
+    text that follows the ReAct "Final Answer:" marker. The marker may be split
+    across several tokens.
+    """
+
+    def __init__(self, marker: str = FINAL_ANSWER_MARKER):
+        self.marker = marker
+        self._text = ""
+        self._emitted = 0
+
+    def feed(self, token: str) -> str:
+        """
+        Add a token of LLM output.
+
+        Args:
+            token (str): The next chunk of text produced by the LLM.
+        Returns:
+            str: The part of the final answer not returned before, possibly empty.
+        """
+        self._text += token
+        answer = self.text
+        new_text = answer[self._emitted :]
+        self._emitted = len(answer)
+        return new_text
+
+    @property
+    def text(self) -> str:
+        """The final answer text seen so far."""
+        idx = self._text.find(self.marker)
+        if idx == -1:
+            return ""
+        return self._text[idx + len(self.marker) :].lstrip()
+
+
+def _chunk_text(chunk: Any) -> str:
+    content = getattr(chunk, "content", chunk)
+    if isinstance(content, list):
+        # some chat models return a list of content parts
+        return "".join(
+            part.get("text", "") if isinstance(part, dict) else str(part)
+            for part in content
+        )
+    return content if isinstance(content, str) else ""
+
+
+async def stream_agent_events(
+    agent_executor: AgentExecutor, query: str
+) -> AsyncIterator[dict[str, Any]]:
+    """
+    Run the agent and yield client events as soon as they are produced.
+
+    Args:
+        agent_executor (AgentExecutor): The agent to run.
+        query (str): The user question.
+    Returns:
+        AsyncIterator[dict]: Events of type "tool_start", "tool_end", "token"
+        and, last, "final" with the same fields as the non-streaming response.
+    """
+    streamers: dict[str, FinalAnswerStreamer] = {}
+
+    async for event in agent_executor.astream_events(
+        {"input": query}, version="v2"
+    ):
+        kind = event["event"]
+        tags = event.get("tags") or []
+
+        if kind == "on_chat_model_start" and AGENT_LLM_TAG in tags:
+            streamers[event["run_id"]] = FinalAnswerStreamer()
+
+        elif kind == "on_chat_model_stream" and event["run_id"] in streamers:
+            token = streamers[event["run_id"]].feed(
+                _chunk_text(event["data"].get("chunk"))
+            )
+            if token:
+                yield {"event": "token", "token": token}
+
+        elif kind == "on_chat_model_end":
+            streamers.pop(event["run_id"], None)
+
+        elif kind == "on_chain_stream" and not event.get("parent_ids"):
+            # the root run announces each tool call before running it (actions)
+            # and reports its observation after (steps)
+            chunk = event["data"]["chunk"]
+            for action in chunk.get("actions", []):
+                yield {
+                    "event": "tool_start",
+                    "tool": action.tool,
+                    "input": str(action.tool_input),
+                }
+            for step in chunk.get("steps", []):
+                yield {
+                    "event": "tool_end",
+                    "tool": step.action.tool,
+                    "output": str(step.observation),
+                }
+
+        elif kind == "on_chain_end" and not event.get("parent_ids"):
+            output = event["data"]["output"]
+            yield {
+                "event": "final",
+                "response": {
+                    "input": query,
+                    "output": output["output"],
+                    "intermediate_steps": output.get("intermediate_steps", []),
+                },
+            }
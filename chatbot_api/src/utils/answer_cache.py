@@ -0,0 +1,210 @@
+"""
+Semantic cache for agent answers. Questions are matched by embedding
+similarity, so paraphrases of a recently answered question are served
+without running the agent again.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Optional
+
+import numpy as np
+
+# tools whose answers go stale within seconds and must never be cached
+VOLATILE_TOOLS = frozenset({"Waits", "Availability"})
+
+
+@dataclass
+class _CacheEntry:
+    question: str
+    embedding: np.ndarray
+    response: dict[str, Any]
+    created_at: float
+
+
+def tools_used(intermediate_steps: Iterable[Any]) -> list[str]:
+    """
+    Extract the names of the tools called during an agent run.
+
+    Args:
+        intermediate_steps: The (AgentAction, observation) pairs of the run.
+    Returns:
+        list[str]: The tool names, in call order.
+    """
+    names = []
+    for step in intermediate_steps:
+        action = step[0] if isinstance(step, (tuple, list)) else step
+        tool = getattr(action, "tool", None)
+        if tool:
+            names.append(tool)
+    return names
+
+
+class SemanticAnswerCache:
+    """
+    Size-bounded LRU cache of agent responses. A lookup hits when a cached
+    question has cosine similarity >= similarity_threshold with the incoming
+    question and the entry is younger than ttl_seconds.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[str], list[float]],
+        similarity_threshold: float = 0.95,
+        ttl_seconds: float = 3600,
+        max_size: int = 1000,
+        volatile_tools: Iterable[str] = VOLATILE_TOOLS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.volatile_tools = frozenset(volatile_tools)
+        self._clock = clock
+
+        self._entries: OrderedDict[int, _CacheEntry] = OrderedDict()
+        self._next_key = 0
+        # stacked embeddings of all entries, rebuilt lazily after writes
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: list[int] = []
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._skipped = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._clears = 0
+
+    def embed(self, question: str) -> np.ndarray:
+        """
+        Embed a question into a unit-length vector.
+
+        Args:
+            question (str): The user question.
+        Returns:
+            np.ndarray: The normalized question embedding.
+        """
+        vector = np.asarray(self._embed_fn(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, embedding: np.ndarray) -> Optional[dict[str, Any]]:
+        """
+        Find a cached response for a question embedding.
+
+        Args:
+            embedding (np.ndarray): The embedding returned by embed().
+        Returns:
+            Optional[dict]: A copy of the cached response, or None on a miss.
+        """
+        with self._lock:
+            self._evict_expired()
+            if not self._entries:
+                self._misses += 1
+                return None
+
+            if self._matrix is None:
+                self._matrix_keys = list(self._entries.keys())
+                self._matrix = np.stack(
+                    [self._entries[k].embedding for k in self._matrix_keys]
+                )
+
+            similarities = self._matrix @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                self._misses += 1
+                return None
+
+            key = self._matrix_keys[best]
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return dict(self._entries[key].response)
+
+    def store(
+        self,
+        question: str,
+        embedding: np.ndarray,
+        response: dict[str, Any],
+        tools: Iterable[str] = (),
+    ) -> bool:
+        """
+        Cache a response, unless it relied on a volatile tool.
+
+        Args:
+            question (str): The user question.
+            embedding (np.ndarray): The embedding returned by embed().
+            response (dict): The response to cache.
+            tools (Iterable[str]): Names of the tools used to build the response.
+        Returns:
+            bool: Whether the response was cached.
+        """
+        with self._lock:
+            if self.volatile_tools.intersection(tools):
+                self._skipped += 1
+                return False
+
+            self._entries[self._next_key] = _CacheEntry(
+                question=question,
+                embedding=embedding,
+                response=dict(response),
+                created_at=self._clock(),
+            )
+            self._next_key += 1
+            self._stores += 1
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+            self._matrix = None
+            return True
+
+    def clear(self, *_: Any) -> None:
+        """
+        Drop every cached response. Accepts (and ignores) arguments so it can be
+        registered directly as a change callback.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self._clears += 1
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Report cache counters.
+
+        Returns:
+            dict: Size, hit/miss counts and hit rate of the cache.
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "stores": self._stores,
+                "skipped_volatile": self._skipped,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "clears": self._clears,
+            }
+
+    def _evict_expired(self) -> None:
+        # entries are kept in LRU order, not insertion order, so scan them all
+        now = self._clock()
+        expired = [
+            key
+            for key, entry in self._entries.items()
+            if now - entry.created_at >= self.ttl_seconds
+        ]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._expirations += len(expired)
+            self._matrix = None
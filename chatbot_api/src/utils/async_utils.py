@@ -1,18 +1,29 @@
-import asyncio
+from typing import Callable
 
+from utils.retry import RetryPolicy, aretry_call
+
+
+def async_retry(
+    max_retries: int = 3,
+    delay: float = 1,
+    max_delay: float = 30,
+    retry_on: Callable[[BaseException], bool] = lambda e: True,
+):
+    """
+    Retry an async function with exponential backoff and jitter.
+
+    Args:
+        max_retries (int): Attempts in total.
+        delay (float): Backoff cap after the first failure, doubled after each one.
+        max_delay (float): Upper bound of the backoff.
+        retry_on: Which errors to retry (every error by default); see
+            utils.retry.is_retryable. The last error is raised when giving up.
+    """
+    policy = RetryPolicy(max_attempts=max_retries, base_delay=delay, max_delay=max_delay)
 
-def async_retry(max_retries: int = 3, delay: int = 1):
     def decorator(func):
         async def wrapper(*args, **kwargs):
-            for attempt in range(1, max_retries + 1):
-                try:
-                    result = await func(*args, **kwargs)
-                    return result
-                except Exception as e:
-                    print(f"Attempt {attempt} failed: {str(e)}")
-                    await asyncio.sleep(delay)
-
-            raise ValueError(f"Failed after {max_retries} attempts")
+            return await aretry_call(lambda: func(*args, **kwargs), policy, retry_on)
 
         return wrapper
 
@@ -0,0 +1,373 @@
+"""
+Token-budgeted assembly of the passages a retrieval chain stuffs into its
+prompt: text repeated between overlapping chunks and near-duplicate passages
+are dropped, the rest is ordered by maximal marginal relevance (MMR) and
+packed until the model's token budget is spent. Retrievers fetch more
+candidates than are packed, so MMR has passages to choose between, and pass
+the embeddings they already store so passages are not embedded again.
+"""
+import json
+import logging
+import math
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import numpy as np
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+LOGGER = logging.getLogger(__name__)
+
+CONTEXT_PACKING_ENABLED = os.getenv("CONTEXT_PACKING_ENABLED", "true").lower() == "true"
+# prompt tokens left for retrieved passages
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+# per-model overrides, e.g. '{"gemini-2.0-flash": 3000}'
+CONTEXT_TOKEN_BUDGETS = json.loads(os.getenv("CONTEXT_TOKEN_BUDGETS", "{}"))
+# 1 ranks by relevance only, 0 by diversity only
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+# passages at least this similar to an already packed one are dropped
+CONTEXT_DUPLICATE_SIMILARITY = float(os.getenv("CONTEXT_DUPLICATE_SIMILARITY", "0.95"))
+# candidates retrieved per packed passage, so MMR can diversify
+CONTEXT_FETCH_FACTOR = int(os.getenv("CONTEXT_FETCH_FACTOR", "3"))
+
+# metadata key under which retrievers pass a passage's stored embedding
+EMBEDDING_METADATA_KEY = "embedding"
+
+# shortest text shared by two chunks that counts as chunk overlap
+_MIN_OVERLAP_CHARS = 50
+# rough average for English text; exact counts would cost an API call
+_CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of LLM tokens of a text.
+
+    Args:
+        text (str): The text.
+    Returns:
+        int: About one token per 4 characters.
+    """
+    return math.ceil(len(text) / _CHARS_PER_TOKEN)
+
+
+def context_token_budget(model: Optional[str]) -> int:
+    """
+    The token budget for the retrieved passages of a model's prompts.
+
+    Args:
+        model (Optional[str]): The model name.
+    Returns:
+        int: CONTEXT_TOKEN_BUDGETS[model], or CONTEXT_TOKEN_BUDGET.
+    """
+    return int(CONTEXT_TOKEN_BUDGETS.get(model or "default", CONTEXT_TOKEN_BUDGET))
+
+
+def retrieval_k(k: int) -> int:
+    """
+    The number of candidates a retriever should fetch for k packed passages.
+
+    Args:
+        k (int): Passages put in the prompt.
+    Returns:
+        int: k * CONTEXT_FETCH_FACTOR with packing on, else k.
+    """
+    return k * max(1, CONTEXT_FETCH_FACTOR) if CONTEXT_PACKING_ENABLED else k
+
+
+def trim_overlap(text: str, other: str, min_chars: int = _MIN_OVERLAP_CHARS) -> str:
+    """
+    Remove from text what it shares with another chunk of the same document:
+    a beginning that repeats the end of other, or an end that repeats the
+    beginning of other.
+
+    Args:
+        text (str): The chunk to trim.
+        other (str): A chunk already in the context.
+        min_chars (int): Shorter shared text is left alone.
+    Returns:
+        str: The trimmed text.
+    """
+    for k in range(min(len(text), len(other)), min_chars - 1, -1):
+        if other.endswith(text[:k]):
+            text = text[k:].lstrip()
+            break
+    for k in range(min(len(text), len(other)), min_chars - 1, -1):
+        if other.startswith(text[-k:]):
+            text = text[:-k].rstrip()
+            break
+    return text
+
+
+@dataclass
+class PackReport:
+    """What packing did to one set of passages."""
+    passages_in: int = 0
+    passages_out: int = 0
+    tokens_in: int = 0
+    tokens_out: int = 0
+    duplicates: int = 0
+    overlaps: int = 0
+    over_budget: int = 0
+    # passages without a stored embedding, embedded while packing
+    embedded: int = 0
+
+
+class ContextPacker:
+    """
+    Selects and trims retrieved passages for a prompt. Passages are picked in
+    MMR order (relevance to the question, minus similarity to the passages
+    already picked); a pick is dropped if it nearly duplicates a previous one,
+    trimmed of the text it shares with previous chunks of the same source
+    document, and skipped if it no longer fits the token budget. Packing
+    stops after max_passages passages. Passages carrying their embedding under
+    EMBEDDING_METADATA_KEY are not embedded again.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        token_budget: int = CONTEXT_TOKEN_BUDGET,
+        mmr_lambda: float = CONTEXT_MMR_LAMBDA,
+        duplicate_similarity: float = CONTEXT_DUPLICATE_SIMILARITY,
+        source_key: str = "source",
+        max_passages: Optional[int] = None,
+    ):
+        self.embeddings = embeddings
+        self.token_budget = token_budget
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_similarity = duplicate_similarity
+        self.source_key = source_key
+        self.max_passages = max_passages
+        self._lock = threading.Lock()
+        self._totals = PackReport()
+        self._calls = 0
+
+    def _select(
+        self,
+        documents: list[Document],
+        vectors: list[list[float]],
+        query_vector: list[float],
+        embedded: int = 0,
+    ) -> tuple[list[Document], PackReport]:
+        report = PackReport(
+            passages_in=len(documents),
+            tokens_in=sum(estimate_tokens(d.page_content) for d in documents),
+            embedded=embedded,
+        )
+        matrix = np.array(vectors, dtype=float)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+        query = np.array(query_vector, dtype=float)
+        relevance = matrix @ (query / (np.linalg.norm(query) + 1e-12))
+
+        remaining = list(range(len(documents)))
+        picked: list[int] = []
+        packed: list[Document] = []
+        budget = self.token_budget
+        while remaining and (
+            self.max_passages is None or len(packed) < self.max_passages
+        ):
+            if picked:
+                redundancy = (matrix[remaining] @ matrix[picked].T).max(axis=1)
+            else:
+                redundancy = np.zeros(len(remaining))
+            scores = (
+                self.mmr_lambda * relevance[remaining]
+                - (1 - self.mmr_lambda) * redundancy
+            )
+            best = int(np.argmax(scores))
+            i = remaining.pop(best)
+            if redundancy[best] >= self.duplicate_similarity:
+                report.duplicates += 1
+                continue
+
+            document = documents[i]
+            text = document.page_content
+            source = document.metadata.get(self.source_key)
+            if source is not None:
+                for previous in packed:
+                    if previous.metadata.get(self.source_key) == source:
+                        text = trim_overlap(text, previous.page_content)
+            if not text:
+                report.overlaps += 1
+                continue
+
+            tokens = estimate_tokens(text)
+            if tokens > budget:
+                report.over_budget += 1
+                continue
+            budget -= tokens
+            picked.append(i)
+            metadata = {
+                k: v
+                for k, v in document.metadata.items()
+                if k != EMBEDDING_METADATA_KEY
+            }
+            packed.append(Document(page_content=text, metadata=metadata))
+
+        report.passages_out = len(packed)
+        report.tokens_out = sum(estimate_tokens(d.page_content) for d in packed)
+        self._record(report)
+        return packed, report
+
+    def _record(self, report: PackReport) -> None:
+        LOGGER.debug(
+            f"Packed {report.passages_out}/{report.passages_in} passages, "
+            f"{report.tokens_in} -> {report.tokens_out} tokens"
+        )
+        with self._lock:
+            self._calls += 1
+            for field in vars(report):
+                setattr(
+                    self._totals,
+                    field,
+                    getattr(self._totals, field) + getattr(report, field),
+                )
+
+    @staticmethod
+    def _missing(documents: list[Document]) -> list[int]:
+        return [
+            i
+            for i, d in enumerate(documents)
+            if d.metadata.get(EMBEDDING_METADATA_KEY) is None
+        ]
+
+    @staticmethod
+    def _vectors(
+        documents: list[Document], missing: list[int], embedded: list[list[float]]
+    ) -> list[list[float]]:
+        vectors = [d.metadata.get(EMBEDDING_METADATA_KEY) for d in documents]
+        for i, vector in zip(missing, embedded):
+            vectors[i] = vector
+        return vectors
+
+    def pack(self, query: str, documents: list[Document]) -> list[Document]:
+        """
+        Select the passages to put in the prompt.
+
+        Args:
+            query (str): The question.
+            documents (list[Document]): The retrieved passages, best first.
+        Returns:
+            list[Document]: The packed passages, in MMR order.
+        """
+        if not documents:
+            return []
+        missing = self._missing(documents)
+        embedded = (
+            self.embeddings.embed_documents(
+                [documents[i].page_content for i in missing]
+            )
+            if missing
+            else []
+        )
+        vectors = self._vectors(documents, missing, embedded)
+        query_vector = self.embeddings.embed_query(query)
+        return self._select(documents, vectors, query_vector, len(missing))[0]
+
+    async def apack(self, query: str, documents: list[Document]) -> list[Document]:
+        """
+        Async version of pack().
+        """
+        if not documents:
+            return []
+        missing = self._missing(documents)
+        embedded = (
+            await self.embeddings.aembed_documents(
+                [documents[i].page_content for i in missing]
+            )
+            if missing
+            else []
+        )
+        vectors = self._vectors(documents, missing, embedded)
+        query_vector = await self.embeddings.aembed_query(query)
+        return self._select(documents, vectors, query_vector, len(missing))[0]
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Report packing counters.
+
+        Returns:
+            dict: Calls, passages and estimated prompt tokens before and after
+            packing, passages dropped by reason, and passages embedded because
+            the retriever had no stored embedding.
+        """
+        with self._lock:
+            return {"calls": self._calls, **vars(self._totals)}
+
+
+class PackedRetriever(BaseRetriever):
+    """
+    Retriever returning the passages of another retriever after packing.
+    """
+    base: BaseRetriever
+    packer: Any
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        documents = self.base.invoke(
+            query, config={"callbacks": run_manager.get_child()}
+        )
+        return self.packer.pack(query, documents)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        documents = await self.base.ainvoke(
+            query, config={"callbacks": run_manager.get_child()}
+        )
+        return await self.packer.apack(query, documents)
+
+
+_packers: dict[str, ContextPacker] = {}
+_packers_lock = threading.Lock()
+
+
+def pack_retriever(
+    name: str,
+    retriever: BaseRetriever,
+    embeddings: Embeddings,
+    model: Optional[str],
+    k: Optional[int] = None,
+) -> BaseRetriever:
+    """
+    Put context packing in front of a chain's retriever, unless disabled.
+
+    Args:
+        name (str): The chain name, under which stats are reported.
+        retriever (BaseRetriever): The chain's retriever, fetching
+            retrieval_k(k) candidates.
+        embeddings (Embeddings): Embeddings of the retrieved passages.
+        model (Optional[str]): The chain's LLM, for its token budget.
+        k (Optional[int]): Passages packed at most.
+    Returns:
+        BaseRetriever: The packing retriever, or retriever if packing is off.
+    """
+    if not CONTEXT_PACKING_ENABLED:
+        return retriever
+    packer = ContextPacker(
+        embeddings, token_budget=context_token_budget(model), max_passages=k
+    )
+    with _packers_lock:
+        _packers[name] = packer
+    return PackedRetriever(base=retriever, packer=packer)
+
+
+def context_packing_stats() -> dict[str, Any]:
+    """
+    Report the counters of every chain's packer.
+
+    Returns:
+        dict: Packer stats by chain name.
+    """
+    with _packers_lock:
+        packers = dict(_packers)
+    return {name: packer.stats() for name, packer in packers.items()}
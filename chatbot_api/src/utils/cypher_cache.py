@@ -0,0 +1,170 @@
+"""
+Cache of LLM-generated Cypher, keyed by normalized question and the
+fingerprint of the schema the statement was generated against
+"""
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+from utils.text import normalize_question
+
+LOGGER = logging.getLogger(__name__)
+
+CACHE_FILE_VERSION = 1
+
+
+class CypherTranslationCache:
+    """
+    Size-bounded LRU cache of question -> Cypher translations. Only statements
+    that were validated and ran successfully should be stored, so a hit can skip
+    the Cypher generation LLM entirely.
+    """
+
+    def __init__(self, max_size: int = 5000):
+        self.max_size = max_size
+        self._entries: OrderedDict[tuple[str, str], str] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._invalidations = 0
+
+    def get(self, question: str, schema_fingerprint: str) -> Optional[str]:
+        """
+        Look up the Cypher translation of a question.
+
+        Args:
+            question (str): The natural language question.
+            schema_fingerprint (str): Fingerprint of the current graph schema.
+        Returns:
+            Optional[str]: The cached Cypher statement, or None on a miss.
+        """
+        key = (schema_fingerprint, normalize_question(question))
+        with self._lock:
+            cypher = self._entries.get(key)
+            if cypher is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return cypher
+
+    def put(self, question: str, schema_fingerprint: str, cypher: str) -> None:
+        """
+        Store a validated Cypher translation.
+
+        Args:
+            question (str): The natural language question.
+            schema_fingerprint (str): Fingerprint of the schema used to generate it.
+            cypher (str): The Cypher statement.
+        Returns:
+            None
+        """
+        key = (schema_fingerprint, normalize_question(question))
+        with self._lock:
+            self._entries[key] = cypher
+            self._entries.move_to_end(key)
+            self._stores += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keep_fingerprint: Optional[str] = None) -> int:
+        """
+        Drop translations generated against any schema other than keep_fingerprint.
+
+        Args:
+            keep_fingerprint (Optional[str]): Schema whose entries stay valid.
+                If None, every entry is dropped.
+        Returns:
+            int: The number of entries removed.
+        """
+        with self._lock:
+            stale = [k for k in self._entries if k[0] != keep_fingerprint]
+            for key in stale:
+                del self._entries[key]
+            if stale:
+                self._invalidations += 1
+            return len(stale)
+
+    def dump(self, path: str) -> int:
+        """
+        Write the cache to a JSON file.
+
+        Args:
+            path (str): Destination file.
+        Returns:
+            int: The number of entries written.
+        """
+        with self._lock:
+            entries = [
+                {"schema": fp, "question": question, "cypher": cypher}
+                for (fp, question), cypher in self._entries.items()
+            ]
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_FILE_VERSION, "entries": entries}, f)
+        os.replace(tmp_path, path)
+        return len(entries)
+
+    def load(self, path: str, schema_fingerprint: Optional[str] = None) -> int:
+        """
+        Populate the cache from a file written by dump(). Missing or unreadable
+        files are ignored.
+
+        Args:
+            path (str): Source file.
+            schema_fingerprint (Optional[str]): If given, only entries generated
+                against this schema are loaded.
+        Returns:
+            int: The number of entries loaded.
+        """
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            LOGGER.warning(f"Ignoring unreadable Cypher cache file {path}: {e}")
+            return 0
+
+        if data.get("version") != CACHE_FILE_VERSION:
+            return 0
+
+        loaded = 0
+        for entry in data.get("entries", []):
+            if schema_fingerprint and entry["schema"] != schema_fingerprint:
+                continue
+            self.put(entry["question"], entry["schema"], entry["cypher"])
+            loaded += 1
+        return loaded
+
+    def __contains__(self, key: tuple[str, str]) -> bool:
+        question, schema_fingerprint = key
+        with self._lock:
+            return (schema_fingerprint, normalize_question(question)) in self._entries
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Report cache counters.
+
+        Returns:
+            dict: Size and hit/miss counts of the cache.
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "stores": self._stores,
+                "invalidations": self._invalidations,
+            }
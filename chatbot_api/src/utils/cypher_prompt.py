@@ -0,0 +1,347 @@
+"""
+Question-specific inputs for the Cypher generation prompt: the slice of the
+graph schema the question needs, the most similar examples from an
+embedding-indexed example library, and the value hints of the schema slice
+"""
+import asyncio
+import json
+import re
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_neo4j.chains.graph_qa.cypher import construct_schema
+
+from utils.context_packing import estimate_tokens
+
+# property name parts too common to tell labels apart
+_GENERIC_PROPERTY_WORDS = {"id", "name", "date", "type", "number", "by"}
+# ":Label" and "[:TYPE" in a Cypher statement, plus stray map keys, which
+# never match a schema type
+_CYPHER_TYPE = re.compile(r":\s*`?([A-Za-z_][A-Za-z0-9_]*)")
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+@dataclass(frozen=True)
+class CypherExample:
+    """A question and the Cypher statement that answers it."""
+    question: str
+    cypher: str
+
+
+@dataclass(frozen=True)
+class SchemaHint:
+    """
+    A note on the values of some schema types, e.g. the payer names. It is
+    sent when one of its types is in the schema slice, and a question that
+    mentions one of its values pulls those types into the slice.
+    """
+    text: str
+    types: tuple[str, ...]
+    values: tuple[str, ...] = ()
+
+
+def load_cypher_examples(path: str) -> list[CypherExample]:
+    """
+    Read an example library file.
+
+    Args:
+        path (str): JSON file with a list of {"question", "cypher"} objects.
+    Returns:
+        list[CypherExample]: The examples.
+    """
+    with open(path, encoding="utf-8") as f:
+        return [CypherExample(e["question"], e["cypher"].strip()) for e in json.load(f)]
+
+
+def _words(text: str) -> set[str]:
+    words = set(_WORD.findall(text.lower()))
+    # crude singular forms, so "physicians" matches Physician
+    return words | {w[:-1] for w in words if len(w) > 3 and w.endswith("s")}
+
+
+def _mentions(text: str, phrase: str) -> bool:
+    return re.search(rf"\b{re.escape(phrase.lower())}\b", text.lower()) is not None
+
+
+class CypherExampleLibrary:
+    """
+    Question-to-Cypher examples, indexed by the embedding of their question.
+    The index is built on first use and rebuilt after examples are added.
+    """
+
+    def __init__(self, examples: list[CypherExample], embeddings: Embeddings):
+        self.embeddings = embeddings
+        self._examples = list(examples)
+        self._matrix: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._examples)
+
+    def add(self, example: CypherExample) -> None:
+        """
+        Add an example to the library.
+
+        Args:
+            example (CypherExample): The example.
+        """
+        with self._lock:
+            self._examples.append(example)
+            self._matrix = None
+
+    def index(self) -> np.ndarray:
+        """
+        Embed the example questions, unless already done.
+
+        Returns:
+            np.ndarray: One normalized vector per example.
+        """
+        with self._lock:
+            if self._matrix is None and self._examples:
+                matrix = np.array(
+                    self.embeddings.embed_documents(
+                        [e.question for e in self._examples]
+                    ),
+                    dtype=float,
+                )
+                matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+                self._matrix = matrix
+            return self._matrix
+
+    def _top_k(self, matrix: np.ndarray, query_vector: list[float], k: int):
+        with self._lock:
+            examples = self._examples[: len(matrix)]
+        similarity = matrix @ np.array(query_vector, dtype=float)
+        return [examples[i] for i in np.argsort(-similarity)[:k]]
+
+    def select(self, question: str, k: int) -> list[CypherExample]:
+        """
+        Find the examples whose question is most similar to a question.
+
+        Args:
+            question (str): The question.
+            k (int): How many examples to return.
+        Returns:
+            list[CypherExample]: Up to k examples, most similar first.
+        """
+        if k <= 0 or not self._examples:
+            return []
+        matrix = self.index()
+        return self._top_k(matrix, self.embeddings.embed_query(question), k)
+
+    async def aselect(self, question: str, k: int) -> list[CypherExample]:
+        """
+        Async version of select().
+        """
+        if k <= 0 or not self._examples:
+            return []
+        matrix = self._matrix
+        if matrix is None:
+            matrix = await asyncio.to_thread(self.index)
+        query_vector = await self.embeddings.aembed_query(question)
+        return self._top_k(matrix, query_vector, k)
+
+
+def relevant_types(
+    structured_schema: dict[str, Any],
+    question: str,
+    examples: list[CypherExample] = (),
+    hints: list[SchemaHint] = (),
+    synonyms: Optional[dict[str, tuple[str, ...]]] = None,
+    exclude_types: list[str] = (),
+) -> list[str]:
+    """
+    Pick the node labels and relationship types a question needs. A type is
+    picked if the question names it, one of its synonyms, a distinctive word of
+    one of its properties, or a value from one of its hints, or if one of the
+    selected examples uses it. Labels on the shortest paths between the picked
+    labels are added so the slice stays connected, and so are all the
+    relationships between the resulting labels.
+
+    Args:
+        structured_schema (dict): The graph's structured schema.
+        question (str): The question.
+        examples (list[CypherExample]): The examples sent with the question.
+        hints (list[SchemaHint]): The value hints.
+        synonyms (dict): Extra words naming a label or relationship type.
+        exclude_types (list[str]): Types never shown to the LLM.
+    Returns:
+        list[str]: The labels and relationship types, sorted, or an empty list
+        if nothing in the question points at the schema.
+    """
+    labels = set(structured_schema.get("node_props", {})) - set(exclude_types)
+    relationships = [
+        r
+        for r in structured_schema.get("relationships", [])
+        if r["start"] in labels and r["end"] in labels
+    ]
+    rel_types = {r["type"] for r in relationships}
+    words = _words(question)
+
+    picked: set[str] = set()
+    for name in labels | rel_types:
+        if name.lower() in words or words & set((synonyms or {}).get(name, ())):
+            picked.add(name)
+    # a property part naming a label (Review.hospital_name) refers to that
+    # label, not to the property's owner
+    ignored = _GENERIC_PROPERTY_WORDS | {label.lower() for label in labels}
+    for props_key in ("node_props", "rel_props"):
+        for name, properties in structured_schema.get(props_key, {}).items():
+            if name not in labels | rel_types:
+                continue
+            for prop in properties:
+                parts = set(prop["property"].lower().split("_"))
+                if words & (parts - ignored):
+                    picked.add(name)
+    for hint in hints:
+        if any(_mentions(question, value) for value in hint.values):
+            picked.update(hint.types)
+    for example in examples:
+        picked.update(_CYPHER_TYPE.findall(example.cypher))
+
+    picked_labels = picked & labels
+    for r in relationships:
+        if r["type"] in picked:
+            picked_labels.update((r["start"], r["end"]))
+    if not picked_labels:
+        return []
+
+    # grow a tree from one picked label, adding the shortest path to each
+    # picked label it does not reach yet
+    neighbours: dict[str, set[str]] = {label: set() for label in labels}
+    for r in relationships:
+        neighbours[r["start"]].add(r["end"])
+        neighbours[r["end"]].add(r["start"])
+    ordered = sorted(picked_labels)
+    tree = {ordered[0]}
+    for target in ordered[1:]:
+        if target in tree:
+            continue
+        parents: dict[str, Optional[str]] = {label: None for label in tree}
+        frontier = deque(tree)
+        while frontier and target not in parents:
+            label = frontier.popleft()
+            for neighbour in neighbours[label]:
+                if neighbour not in parents:
+                    parents[neighbour] = label
+                    frontier.append(neighbour)
+        node: Optional[str] = target if target in parents else None
+        if node is None:
+            # not connected to the tree, shown on its own
+            tree.add(target)
+        while node is not None:
+            tree.add(node)
+            node = parents[node]
+
+    types = tree | {
+        r["type"] for r in relationships if r["start"] in tree and r["end"] in tree
+    }
+    return sorted(types)
+
+
+class CypherPromptBuilder:
+    """
+    Builds the question-specific inputs of the Cypher generation prompt: the
+    schema slice, the k examples closest to the question and the hints of the
+    slice. With pruning off, the full schema and every hint are sent.
+    """
+
+    def __init__(
+        self,
+        library: CypherExampleLibrary,
+        hints: list[SchemaHint] = (),
+        synonyms: Optional[dict[str, tuple[str, ...]]] = None,
+        k: int = 4,
+        pruning: bool = True,
+        exclude_types: list[str] = (),
+    ):
+        self.library = library
+        self.hints = list(hints)
+        self.synonyms = synonyms or {}
+        self.k = k
+        self.pruning = pruning
+        self.exclude_types = list(exclude_types)
+        self._lock = threading.Lock()
+        self._totals = {
+            "calls": 0,
+            "pruned": 0,
+            "schema_tokens_full": 0,
+            "schema_tokens_sent": 0,
+            "examples": 0,
+            "hints": 0,
+        }
+
+    def _inputs(
+        self,
+        question: str,
+        graph: Any,
+        full_schema: str,
+        examples: list[CypherExample],
+    ) -> dict[str, str]:
+        schema, hints = full_schema, self.hints
+        if self.pruning:
+            types = relevant_types(
+                graph.get_structured_schema,
+                question,
+                examples,
+                self.hints,
+                self.synonyms,
+                self.exclude_types,
+            )
+            if types:
+                schema = construct_schema(
+                    graph.get_structured_schema, types, [], graph._enhanced_schema
+                )
+                hints = [h for h in self.hints if set(h.types) & set(types)]
+
+        with self._lock:
+            self._totals["calls"] += 1
+            self._totals["pruned"] += schema is not full_schema
+            self._totals["schema_tokens_full"] += estimate_tokens(full_schema)
+            self._totals["schema_tokens_sent"] += estimate_tokens(schema)
+            self._totals["examples"] += len(examples)
+            self._totals["hints"] += len(hints)
+
+        return {
+            "schema": schema,
+            "examples": "\n\n".join(f"# {e.question}\n{e.cypher}" for e in examples),
+            "hints": "\n".join(h.text for h in hints),
+        }
+
+    def inputs(self, question: str, graph: Any, full_schema: str) -> dict[str, str]:
+        """
+        Build the prompt inputs for a question.
+
+        Args:
+            question (str): The question.
+            graph: The Neo4jGraph, for its structured schema.
+            full_schema (str): The schema text sent without pruning.
+        Returns:
+            dict[str, str]: The "schema", "examples" and "hints" inputs.
+        """
+        examples = self.library.select(question, self.k)
+        return self._inputs(question, graph, full_schema, examples)
+
+    async def ainputs(
+        self, question: str, graph: Any, full_schema: str
+    ) -> dict[str, str]:
+        """
+        Async version of inputs().
+        """
+        examples = await self.library.aselect(question, self.k)
+        return self._inputs(question, graph, full_schema, examples)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Report prompt building counters.
+
+        Returns:
+            dict: Calls, calls sent a schema slice, estimated schema tokens
+            with and without pruning, and examples and hints sent.
+        """
+        with self._lock:
+            return dict(self._totals)
@@ -0,0 +1,226 @@
+"""
+Cost-based guard for LLM-generated Cypher. Before a statement runs, its plan
+is fetched with EXPLAIN (which runs nothing) and checked against row and
+operator thresholds; statements that would be too expensive, or that write,
+are rejected. Accepted statements get a LIMIT pushed down and run in a read
+transaction with a short server-side timeout, so one bad query cannot stall
+(or change) the database.
+"""
+import os
+import re
+import threading
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+CYPHER_GUARD_ENABLED = os.getenv("CYPHER_GUARD_ENABLED", "true").lower() == "true"
+# the largest row estimate allowed for any operator of the plan
+CYPHER_GUARD_MAX_ROWS = float(os.getenv("CYPHER_GUARD_MAX_ROWS", "1000000"))
+# the largest row estimate allowed for a cartesian product
+CYPHER_GUARD_MAX_CARTESIAN_ROWS = float(
+    os.getenv("CYPHER_GUARD_MAX_CARTESIAN_ROWS", "100000")
+)
+# full scans of a label (or of all nodes) with more nodes than this are rejected
+CYPHER_GUARD_MAX_SCAN_ROWS = float(os.getenv("CYPHER_GUARD_MAX_SCAN_ROWS", "500000"))
+# server-side transaction timeout, in seconds, for generated queries
+CYPHER_GUARD_TIMEOUT = float(os.getenv("CYPHER_GUARD_TIMEOUT", "10"))
+
+# operators that change the graph or read outside of it
+_WRITE_OPERATORS = (
+    "Create",
+    "Merge",
+    "Delete",
+    "DetachDelete",
+    "Set",
+    "Remove",
+    "Foreach",
+    "LoadCSV",
+)
+# procedures can write or reach outside the graph (e.g. apoc.create.*,
+# apoc.load.*), and their plan does not say which ones do
+_PROCEDURE_OPERATORS = ("ProcedureCall",)
+_SCAN_OPERATORS = ("AllNodesScan", "NodeByLabelScan")
+_RETURN = re.compile(r"\bRETURN\b", re.IGNORECASE)
+_LIMIT = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+
+Plan = dict[str, Any]
+
+
+class QueryRejectedError(ValueError):
+    """
+    Raised for a generated Cypher statement whose plan exceeds the guard's
+    thresholds. A ValueError, like the other unsafe Cypher errors, so it is
+    never retried and is reported to the user as a bad request.
+    """
+
+
+def plan_operators(plan: Plan) -> Iterator[tuple[str, float, str]]:
+    """
+    Walk an EXPLAIN plan.
+
+    Args:
+        plan (dict): The plan, as reported in the result summary.
+    Returns:
+        Iterator[tuple[str, float, str]]: The operator name (without the
+        "@neo4j" suffix), its estimated rows and its details, for every
+        operator of the plan.
+    """
+    stack = [plan]
+    while stack:
+        operator = stack.pop()
+        # Bolt reports the arguments as "args"
+        args = operator.get("args") or operator.get("arguments") or {}
+        name = operator.get("operatorType", "").split("@")[0]
+        yield name, float(args.get("EstimatedRows", 0)), str(args.get("Details", ""))
+        stack.extend(operator.get("children", []))
+
+
+def push_down_limit(cypher: str, limit: int) -> str:
+    """
+    Make a statement return at most limit rows. A trailing LIMIT is kept if it
+    is smaller, lowered otherwise, and added if missing; a parameter or
+    expression LIMIT is capped at limit. UNION statements, statements without
+    RETURN and trailing LIMITs followed by a comment are left alone.
+
+    Args:
+        cypher (str): The Cypher statement.
+        limit (int): The most rows the caller uses.
+    Returns:
+        str: The statement with its LIMIT.
+    """
+    cypher = cypher.strip().rstrip(";").rstrip()
+    returns = list(_RETURN.finditer(cypher))
+    if re.search(r"\bUNION\b", cypher, re.IGNORECASE) or not returns:
+        return cypher
+    limits = list(_LIMIT.finditer(cypher, returns[-1].end()))
+    if not limits:
+        # on its own line, in case the statement ends with a comment
+        return f"{cypher}\nLIMIT {limit}"
+    match = limits[-1]
+    expression = cypher[match.end() :].strip()
+    if "//" in expression or "/*" in expression:
+        return cypher
+    if expression.isdigit():
+        if int(expression) <= limit:
+            return cypher
+        return f"{cypher[: match.start()]}LIMIT {limit}"
+    # e.g. LIMIT $n: its value is only known to the server
+    return (
+        f"{cypher[: match.start()]}LIMIT CASE WHEN ({expression}) < {limit} "
+        f"THEN ({expression}) ELSE {limit} END"
+    )
+
+
+class CypherQueryGuard:
+    """
+    Checks the EXPLAIN plan of generated statements before they run. A plan is
+    rejected if it writes, if it calls a procedure, if any operator is estimated to produce more than
+    max_rows rows, if a cartesian product exceeds max_cartesian_rows, or if a
+    full label or all-nodes scan exceeds max_scan_rows.
+    """
+
+    def __init__(
+        self,
+        explain_fn: Callable[[str], Plan],
+        aexplain_fn: Optional[Callable[[str], Awaitable[Plan]]] = None,
+        max_rows: float = CYPHER_GUARD_MAX_ROWS,
+        max_cartesian_rows: float = CYPHER_GUARD_MAX_CARTESIAN_ROWS,
+        max_scan_rows: float = CYPHER_GUARD_MAX_SCAN_ROWS,
+        timeout: float = CYPHER_GUARD_TIMEOUT,
+    ):
+        self._explain_fn = explain_fn
+        self._aexplain_fn = aexplain_fn
+        self.max_rows = max_rows
+        self.max_cartesian_rows = max_cartesian_rows
+        self.max_scan_rows = max_scan_rows
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._checked = 0
+        self._limited = 0
+        self._rejected: dict[str, int] = {}
+
+    def problems(self, plan: Plan) -> list[tuple[str, str]]:
+        """
+        Find what makes a plan too expensive or unsafe.
+
+        Args:
+            plan (dict): The EXPLAIN plan.
+        Returns:
+            list[tuple[str, str]]: A (reason, description) pair per problem;
+            empty if the plan is acceptable.
+        """
+        found = []
+        for name, rows, details in plan_operators(plan):
+            if name.startswith(_WRITE_OPERATORS):
+                found.append(("write", f"{name} would modify the database"))
+            elif name.startswith(_PROCEDURE_OPERATORS):
+                found.append(
+                    ("procedure_call", f"a call to {details or 'a procedure'}")
+                )
+            elif name == "CartesianProduct" and rows > self.max_cartesian_rows:
+                found.append(
+                    ("cartesian_product", f"a cartesian product of ~{rows:,.0f} rows")
+                )
+            elif name in _SCAN_OPERATORS and rows > self.max_scan_rows:
+                found.append(
+                    ("full_scan", f"a full scan of {details or 'all nodes'} "
+                     f"(~{rows:,.0f} nodes)")
+                )
+            elif rows > self.max_rows:
+                found.append(("estimated_rows", f"{name} producing ~{rows:,.0f} rows"))
+        return found
+
+    def _check(self, cypher: str, limited: str, plan: Plan) -> str:
+        found = self.problems(plan)
+        with self._lock:
+            self._checked += 1
+            self._limited += limited != cypher.strip().rstrip(";").rstrip()
+            for reason in {reason for reason, _ in found}:
+                self._rejected[reason] = self._rejected.get(reason, 0) + 1
+        if found:
+            raise QueryRejectedError(
+                "The generated query is too expensive to run ("
+                + "; ".join(description for _, description in found)
+                + "). Try a more specific question. Query: "
+                + cypher
+            )
+        return limited
+
+    def guard(self, cypher: str, limit: int) -> str:
+        """
+        Check a statement and push down its LIMIT.
+
+        Args:
+            cypher (str): The generated Cypher statement.
+            limit (int): The most rows the caller uses.
+        Returns:
+            str: The statement to run.
+        Raises:
+            QueryRejectedError: If the plan exceeds the thresholds.
+        """
+        limited = push_down_limit(cypher, limit)
+        return self._check(cypher, limited, self._explain_fn(limited))
+
+    async def aguard(self, cypher: str, limit: int) -> str:
+        """
+        Async version of guard(), using aexplain_fn if given.
+        """
+        limited = push_down_limit(cypher, limit)
+        if self._aexplain_fn is None:
+            plan = self._explain_fn(limited)
+        else:
+            plan = await self._aexplain_fn(limited)
+        return self._check(cypher, limited, plan)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Report guard counters.
+
+        Returns:
+            dict: Statements checked, statements given a lower LIMIT, and
+            rejections by reason.
+        """
+        with self._lock:
+            return {
+                "checked": self._checked,
+                "limited": self._limited,
+                "rejected": dict(self._rejected),
+            }
@@ -0,0 +1,134 @@
+"""
+Manifest of the files indexed into a vector store, used to re-embed only the
+files that changed since the last run
+"""
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """
+    Hash the content of a file.
+
+    Args:
+        path (str): The file to hash.
+        block_size (int): Bytes read at a time.
+    Returns:
+        str: The hex SHA-256 digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_chunk_ids(path: str, file_hash: str, n_chunks: int) -> list[str]:
+    """
+    Deterministic IDs for the chunks of a file version.
+
+    Args:
+        path (str): The file the chunks come from.
+        file_hash (str): The content hash of the file.
+        n_chunks (int): The number of chunks.
+    Returns:
+        list[str]: One ID per chunk.
+    """
+    prefix = hashlib.sha256(f"{path}:{file_hash}".encode("utf-8")).hexdigest()[:24]
+    return [f"{prefix}-{i}" for i in range(n_chunks)]
+
+
+@dataclass
+class IndexPlan:
+    """Files to (re-)embed and chunk IDs to delete to bring an index up to date."""
+    to_index: list[str] = field(default_factory=list)
+    stale_chunk_ids: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    unchanged: list[str] = field(default_factory=list)
+
+    @property
+    def is_noop(self) -> bool:
+        return not self.to_index and not self.stale_chunk_ids
+
+
+class DocumentManifest:
+    """
+    Maps each indexed file to its content hash and the IDs of its chunks in the
+    vector store, along with the settings the index was built with.
+    """
+
+    def __init__(
+        self,
+        settings: dict[str, Any],
+        files: Optional[dict[str, dict[str, Any]]] = None,
+    ):
+        self.settings = settings
+        self.files = files or {}
+
+    @classmethod
+    def load(cls, path: str) -> Optional["DocumentManifest"]:
+        """
+        Read a manifest written by save().
+
+        Args:
+            path (str): The manifest file.
+        Returns:
+            DocumentManifest: The manifest, or None if the file does not exist or
+            cannot be read.
+        """
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            return cls(settings=data["settings"], files=data["files"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, path: str) -> None:
+        """
+        Write the manifest atomically.
+
+        Args:
+            path (str): The manifest file.
+        Returns:
+            None
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"settings": self.settings, "files": self.files}, f, indent=1)
+        os.replace(tmp_path, path)
+
+    def plan(self, current_hashes: dict[str, str]) -> IndexPlan:
+        """
+        Compare the manifest with the files currently on disk.
+
+        Args:
+            current_hashes (dict[str, str]): Content hash of every file to index.
+        Returns:
+            IndexPlan: What needs to be embedded and deleted.
+        """
+        plan = IndexPlan()
+        for path, file_hash in sorted(current_hashes.items()):
+            entry = self.files.get(path)
+            if entry and entry["sha256"] == file_hash:
+                plan.unchanged.append(path)
+                continue
+            plan.to_index.append(path)
+            if entry:
+                plan.stale_chunk_ids.extend(entry["chunk_ids"])
+
+        for path in sorted(set(self.files) - set(current_hashes)):
+            plan.removed.append(path)
+            plan.stale_chunk_ids.extend(self.files[path]["chunk_ids"])
+        return plan
+
+    def record(self, path: str, file_hash: str, chunk_ids: list[str]) -> None:
+        self.files[path] = {"sha256": file_hash, "chunk_ids": chunk_ids}
+
+    def forget(self, path: str) -> None:
+        self.files.pop(path, None)
@@ -0,0 +1,319 @@
+"""
+One embedding component per process: every embedding model is loaded once and
+shared by all its users (review search, file retrieval, answer cache). Query
+embeddings are cached, and concurrent embed_query calls are grouped into a
+single forward pass. Models run on PyTorch, or on onnxruntime, optionally
+quantized to int8.
+"""
+import asyncio
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from utils.warmup import Lazy
+
+# how long the first query of a batch waits for others to join it
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "32"))
+# query embeddings kept per model
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+# "torch" (full precision), "onnx", or "onnx-int8" (dynamically quantized,
+# exported on first use); the ONNX backends need optimum[onnxruntime]
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+# instruction set the int8 weights are quantized for: arm64, avx2, avx512 or
+# avx512_vnni
+EMBEDDING_QUANTIZATION = os.getenv("EMBEDDING_QUANTIZATION", "avx2")
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "vec_store_data/onnx_models")
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+Vector = list[float]
+
+
+class MicroBatcher:
+    """
+    Groups texts submitted from any thread into batches, encoded by a single
+    background thread: a batch is encoded when it is full or when its first
+    text has waited window_seconds.
+    """
+
+    def __init__(
+        self,
+        encode_fn: Callable[[list[str]], list[Vector]],
+        max_batch: int = EMBEDDING_MAX_BATCH,
+        window_seconds: float = EMBEDDING_BATCH_WINDOW_MS / 1000,
+    ):
+        self._encode_fn = encode_fn
+        self._max_batch = max_batch
+        self._window = window_seconds
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.texts = 0
+
+    def submit(self, text: str) -> Future:
+        """
+        Queue a text for encoding.
+
+        Args:
+            text (str): The text.
+        Returns:
+            Future: Resolves to the text's embedding.
+        """
+        future: Future = Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._queue.put((text, future))
+        return future
+
+    def _next_batch(self) -> list[tuple[str, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self._window
+        while len(batch) < self._max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            # identical texts in a batch are encoded once
+            unique = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = dict(zip(unique, self._encode_fn(unique)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            with self._lock:
+                self.batches += 1
+                self.texts += len(unique)
+            for text, future in batch:
+                future.set_result(vectors[text])
+
+
+class SharedEmbeddings(Embeddings):
+    """
+    LangChain Embeddings in front of a model shared by the whole process.
+    Documents are encoded directly, in the model's own batches. Queries go
+    through a bounded LRU cache, then through the micro-batcher, so queries
+    arriving together from different requests share one forward pass.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        model: Embeddings,
+        backend: str = "torch",
+        cache_size: int = EMBEDDING_CACHE_SIZE,
+        max_batch: int = EMBEDDING_MAX_BATCH,
+        window_seconds: float = EMBEDDING_BATCH_WINDOW_MS / 1000,
+    ):
+        self.model_name = model_name
+        self.model = model
+        self.backend = backend
+        self._cache_size = cache_size
+        self._cache: OrderedDict[str, Vector] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        # queries are plain texts for these models, so a batch of queries is
+        # encoded like a batch of documents
+        self._batcher = MicroBatcher(model.embed_documents, max_batch, window_seconds)
+
+    def _cached(self, text: str) -> Optional[Vector]:
+        with self._lock:
+            vector = self._cache.get(text)
+            if vector is None:
+                self._misses += 1
+                return None
+            self._cache.move_to_end(text)
+            self._hits += 1
+            return list(vector)
+
+    def _store(self, text: str, vector: Vector) -> Vector:
+        with self._lock:
+            self._cache[text] = vector
+            self._cache.move_to_end(text)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return list(vector)
+
+    def embed_documents(self, texts: list[str]) -> list[Vector]:
+        return self.model.embed_documents(texts)
+
+    def embed_query(self, text: str) -> Vector:
+        vector = self._cached(text)
+        if vector is not None:
+            return vector
+        return self._store(text, self._batcher.submit(text).result())
+
+    async def aembed_documents(self, texts: list[str]) -> list[Vector]:
+        return await asyncio.to_thread(self.model.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> Vector:
+        vector = self._cached(text)
+        if vector is not None:
+            return vector
+        vector = await asyncio.wrap_future(self._batcher.submit(text))
+        return self._store(text, vector)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Report cache and batching counters.
+
+        Returns:
+            dict: Cache size, hits and misses, and queries encoded per batch.
+        """
+        with self._lock:
+            stats = {
+                "cache_size": len(self._cache),
+                "hits": self._hits,
+                "misses": self._misses,
+            }
+        batches = self._batcher.batches
+        stats["batches"] = batches
+        stats["avg_batch_size"] = self._batcher.texts / batches if batches else 0.0
+        return stats
+
+
+def export_quantized_onnx(
+    model_name: str,
+    quantization: str = EMBEDDING_QUANTIZATION,
+    onnx_dir: str = EMBEDDING_ONNX_DIR,
+) -> tuple[str, str]:
+    """
+    Export a sentence-transformers model to ONNX with dynamic int8
+    quantization, unless a previous run already did. The export is written to
+    a temporary directory and renamed into place, so workers exporting the
+    same model at once never load a half-written one.
+
+    Args:
+        model_name (str): The sentence-transformers model name.
+        quantization (str): The quantization config (arm64, avx2, avx512,
+            avx512_vnni).
+        onnx_dir (str): Where exported models are kept.
+    Returns:
+        tuple[str, str]: The exported model directory, and the quantized ONNX
+        file within it.
+    """
+    # slow to import, and only needed for this one-off export
+    from sentence_transformers import (
+        SentenceTransformer,
+        export_dynamic_quantized_onnx_model,
+    )
+
+    file_name = f"onnx/model_qint8_{quantization}.onnx"
+    path = os.path.join(
+        onnx_dir, f"{model_name.replace('/', '__')}__qint8_{quantization}"
+    )
+    if os.path.exists(os.path.join(path, file_name)):
+        return path, file_name
+
+    os.makedirs(onnx_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=onnx_dir)
+    try:
+        model = SentenceTransformer(model_name, backend="onnx", device="cpu")
+        model.save(staging)
+        export_dynamic_quantized_onnx_model(model, quantization, staging)
+        os.rename(staging, path)
+    except OSError:
+        # another worker finished the same export first
+        if not os.path.exists(os.path.join(path, file_name)):
+            raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return path, file_name
+
+
+def load_embedding_model(
+    model_name: str, backend: str = EMBEDDING_BACKEND
+) -> HuggingFaceEmbeddings:
+    """
+    Load a sentence-transformers model on the given backend.
+
+    Args:
+        model_name (str): The sentence-transformers model name.
+        backend (str): One of EMBEDDING_BACKENDS.
+    Returns:
+        HuggingFaceEmbeddings: The model.
+    """
+    if backend == "torch":
+        return HuggingFaceEmbeddings(model_name=model_name)
+    if backend == "onnx":
+        return HuggingFaceEmbeddings(
+            model_name=model_name, model_kwargs={"backend": "onnx"}
+        )
+    if backend == "onnx-int8":
+        path, file_name = export_quantized_onnx(model_name)
+        return HuggingFaceEmbeddings(
+            model_name=path,
+            model_kwargs={"backend": "onnx", "model_kwargs": {"file_name": file_name}},
+        )
+    raise ValueError(
+        f"Unknown embedding backend {backend!r}, expected one of {EMBEDDING_BACKENDS}"
+    )
+
+
+# one Lazy per model, so a cold load only blocks the callers of that model;
+# the lock only guards the dictionary
+_models: dict[tuple[str, str], Lazy[SharedEmbeddings]] = {}
+_models_lock = threading.Lock()
+
+
+def get_embeddings(
+    model_name: str, backend: str = EMBEDDING_BACKEND
+) -> SharedEmbeddings:
+    """
+    The shared embeddings of a model, loading the model on first use.
+
+    Args:
+        model_name (str): The sentence-transformers model name.
+        backend (str): One of EMBEDDING_BACKENDS.
+    Returns:
+        SharedEmbeddings: The same instance for every caller asking for the
+        same model and backend.
+    """
+    key = (model_name, backend)
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            model = _models[key] = Lazy(
+                lambda: SharedEmbeddings(
+                    model_name, load_embedding_model(model_name, backend), backend
+                )
+            )
+    return model.get()
+
+
+def embeddings_stats() -> dict[str, Any]:
+    """
+    Report the counters of every loaded model.
+
+    Returns:
+        dict: Stats by model name and backend.
+    """
+    with _models_lock:
+        models = dict(_models)
+    return {
+        f"{name} ({backend})": model.get().stats()
+        for (name, backend), model in models.items()
+        if model.ready
+    }
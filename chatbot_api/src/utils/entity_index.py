@@ -0,0 +1,143 @@
+"""
+In-memory index of entity names (hospitals, physicians) for spotting them in
+user questions without an LLM call
+"""
+import re
+import threading
+from typing import Callable, Iterable, Optional
+
+from utils.neo4j_client import get_graph, graph_version
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+# company suffixes users tend to leave out ("Jordan Inc" -> "Jordan")
+_NAME_SUFFIXES = ("inc", "llc", "ltd", "plc", "group", "and sons", "hospital")
+
+HOSPITAL_NAMES_QUERY = """
+MATCH (h:Hospital)
+RETURN h.name AS name
+"""
+
+PHYSICIAN_NAMES_QUERY = """
+MATCH (p:Physician)
+RETURN p.name AS name
+"""
+
+
+def normalize_name(text: str) -> str:
+    """
+    Lowercase text and turn punctuation into single spaces, so "Wallace-Hamilton"
+    and "wallace hamilton" compare equal.
+
+    Args:
+        text (str): A name or a question.
+    Returns:
+        str: The normalized text.
+    """
+    return _NON_ALNUM.sub(" ", text.lower()).strip()
+
+
+class EntityNameIndex:
+    """
+    Maps normalized name variants to canonical names. A variant without a
+    company suffix is only indexed if no other name shares it.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self.names = sorted(set(names))
+        variants: dict[str, set[str]] = {}
+        for name in self.names:
+            for variant in self._variants(name):
+                variants.setdefault(variant, set()).add(name)
+
+        # full names always win over a shared short variant
+        self._variants_to_name = {
+            variant: next(iter(names))
+            for variant, names in variants.items()
+            if len(names) == 1
+        }
+        # longest variants first, so "brown golden and carroll" is matched
+        # before "brown"
+        alternatives = sorted(self._variants_to_name, key=len, reverse=True)
+        self._pattern = (
+            re.compile(r"\b(" + "|".join(map(re.escape, alternatives)) + r")\b")
+            if alternatives
+            else None
+        )
+
+    @staticmethod
+    def _variants(name: str) -> set[str]:
+        normalized = normalize_name(name)
+        variants = {normalized}
+        for suffix in _NAME_SUFFIXES:
+            if normalized.endswith(" " + suffix):
+                variants.add(normalized[: -len(suffix) - 1].strip())
+        return {v for v in variants if v}
+
+    def find(self, text: str) -> list[str]:
+        """
+        Find the names mentioned in a piece of text.
+
+        Args:
+            text (str): The text to search, e.g. a user question.
+        Returns:
+            list[str]: The canonical names found, in order of appearance,
+            without duplicates.
+        """
+        if self._pattern is None:
+            return []
+        found = []
+        for match in self._pattern.finditer(normalize_name(text)):
+            name = self._variants_to_name[match.group(1)]
+            if name not in found:
+                found.append(name)
+        return found
+
+    def canonical(self, name: str) -> Optional[str]:
+        """
+        The canonical spelling of a name, if it is in the index.
+
+        Args:
+            name (str): The name in any case or punctuation.
+        Returns:
+            Optional[str]: The canonical name, or None.
+        """
+        return self._variants_to_name.get(normalize_name(name))
+
+
+class GraphNameIndex:
+    """
+    EntityNameIndex loaded from the graph on first use and rebuilt after the
+    graph data version changes.
+    """
+
+    def __init__(self, query: str, query_fn: Optional[Callable[[str], list]] = None):
+        self._query = query
+        self._query_fn = query_fn or (lambda q: get_graph().query(q))
+        self._index: Optional[EntityNameIndex] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> EntityNameIndex:
+        """
+        The index, loading the names from the graph if needed.
+        """
+        with self._lock:
+            if self._index is None:
+                rows = self._query_fn(self._query)
+                self._index = EntityNameIndex(r["name"] for r in rows if r["name"])
+            return self._index
+
+    def invalidate(self, *_) -> None:
+        """
+        Drop the index, so the next get() reloads the names. Accepts (and
+        ignores) arguments so it can be registered as a change callback.
+        """
+        with self._lock:
+            self._index = None
+
+
+hospital_names = GraphNameIndex(HOSPITAL_NAMES_QUERY)
+physician_names = GraphNameIndex(PHYSICIAN_NAMES_QUERY)
+
+graph_version.on_change(hospital_names.invalidate)
+graph_version.on_change(physician_names.invalidate)
@@ -0,0 +1,128 @@
+"""
+Tracks the data version written by the ETL as a marker node, so that caches
+built on top of the graph can be dropped when the graph is reloaded
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Optional
+
+LOGGER = logging.getLogger(__name__)
+
+DATA_VERSION_LABEL = "DataVersion"
+
+DATA_VERSION_QUERY = f"""
+MATCH (v:{DATA_VERSION_LABEL})
+RETURN v.version AS version
+ORDER BY v.loaded_at DESC
+LIMIT 1
+"""
+
+
+class GraphVersionWatcher:
+    """
+    Cheaply polls the graph for the current data version. The marker node is
+    queried at most once every check_interval seconds, and registered callbacks
+    are called with the new version whenever it changes. A failing callback is
+    logged and does not stop the others. Slow callbacks can be registered to
+    run in a background thread, off the request that noticed the change.
+    """
+
+    def __init__(
+        self,
+        query_fn: Callable[[str], list[dict[str, Any]]],
+        check_interval: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._query_fn = query_fn
+        self._check_interval = check_interval
+        self._clock = clock
+        self._version: Optional[str] = None
+        self._seen_version = False
+        self._last_check: Optional[float] = None
+        self._callbacks: list[tuple[Callable[[Optional[str]], None], bool]] = []
+        self._lock = threading.Lock()
+        # background callbacks run one at a time, in the order of the changes
+        self._background_lock = threading.Lock()
+
+    @property
+    def version(self) -> Optional[str]:
+        """The last data version seen, without querying the graph."""
+        return self._version
+
+    def on_change(
+        self, callback: Callable[[Optional[str]], None], background: bool = False
+    ) -> None:
+        """
+        Register a callback to run when the data version changes.
+
+        Args:
+            callback: Called with the new data version.
+            background (bool): Run it in a daemon thread instead of in the
+                caller of check().
+        Returns:
+            None
+        """
+        self._callbacks.append((callback, background))
+
+    @staticmethod
+    def _run_callback(
+        callback: Callable[[Optional[str]], None], version: Optional[str]
+    ) -> None:
+        try:
+            callback(version)
+        except Exception:
+            LOGGER.exception(f"Graph data version callback {callback!r} failed")
+
+    def _run_background_callback(
+        self, callback: Callable[[Optional[str]], None], version: Optional[str]
+    ) -> None:
+        with self._background_lock:
+            self._run_callback(callback, version)
+
+    def check(self, force: bool = False) -> Optional[str]:
+        """
+        Return the current data version, querying the graph if the last check
+        is older than check_interval (or force is set).
+
+        Args:
+            force (bool): Query the graph regardless of the check interval.
+        Returns:
+            Optional[str]: The current data version, or None if no marker exists.
+        """
+        with self._lock:
+            now = self._clock()
+            if (
+                not force
+                and self._last_check is not None
+                and now - self._last_check < self._check_interval
+            ):
+                return self._version
+            self._last_check = now
+
+            try:
+                rows = self._query_fn(DATA_VERSION_QUERY)
+            except Exception as e:
+                LOGGER.warning(f"Unable to read graph data version: {e}")
+                return self._version
+
+            version = rows[0]["version"] if rows else None
+            previous, self._version = self._version, version
+            # the first version seen is the baseline, not a change
+            changed = self._seen_version and version != previous
+            self._seen_version = True
+
+        if changed:
+            LOGGER.info(f"Graph data version changed: {previous} -> {version}")
+            for callback, background in self._callbacks:
+                if background:
+                    threading.Thread(
+                        target=self._run_background_callback,
+                        args=(callback, version),
+                        name="graph-version-callback",
+                        daemon=True,
+                    ).start()
+                else:
+                    self._run_callback(callback, version)
+
+        return version
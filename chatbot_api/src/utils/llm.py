@@ -0,0 +1,119 @@
+"""
+Factory for the chat models used by the agent and its chains, so every model
+instance goes through the shared per-model rate limiter and retry policy
+"""
+import asyncio
+import time
+from typing import Any, AsyncIterator, Iterator, Optional
+
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from utils.rate_limit import TokenUsageCallback, get_rate_limiter
+from utils.retry import next_delay
+
+
+class RetryingChatGoogleGenerativeAI(ChatGoogleGenerativeAI):
+    """
+    ChatGoogleGenerativeAI that retries failed calls with utils.retry rather
+    than with the client's built-in retries, which also retry permanent errors
+    (e.g. invalid arguments) and ignore the per-request retry budget. Every
+    retry waits for the rate limiter again. A stream is only retried if it
+    failed before producing any output.
+    """
+
+    def _wait_for_rate_limit(self) -> None:
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(blocking=True)
+
+    async def _await_rate_limit(self) -> None:
+        if self.rate_limiter is not None:
+            await self.rate_limiter.aacquire(blocking=True)
+
+    def _generate(self, *args: Any, **kwargs: Any) -> ChatResult:
+        generate = super()._generate
+        attempt = 1
+        while True:
+            try:
+                return generate(*args, **kwargs)
+            except Exception as e:
+                delay = next_delay(e, attempt)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            self._wait_for_rate_limit()
+            attempt += 1
+
+    async def _agenerate(self, *args: Any, **kwargs: Any) -> ChatResult:
+        agenerate = super()._agenerate
+        attempt = 1
+        while True:
+            try:
+                return await agenerate(*args, **kwargs)
+            except Exception as e:
+                delay = next_delay(e, attempt)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            await self._await_rate_limit()
+            attempt += 1
+
+    def _stream(self, *args: Any, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        stream = super()._stream
+        attempt = 1
+        while True:
+            started = False
+            try:
+                for chunk in stream(*args, **kwargs):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                delay = None if started else next_delay(e, attempt)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            self._wait_for_rate_limit()
+            attempt += 1
+
+    async def _astream(
+        self, *args: Any, **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        astream = super()._astream
+        attempt = 1
+        while True:
+            started = False
+            try:
+                async for chunk in astream(*args, **kwargs):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                delay = None if started else next_delay(e, attempt)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            await self._await_rate_limit()
+            attempt += 1
+
+
+def make_chat_model(model: Optional[str], **kwargs: Any) -> ChatGoogleGenerativeAI:
+    """
+    Build a Gemini chat model that waits for the model's rate limiter before
+    each call, reports its token usage to it and retries transient errors.
+
+    Args:
+        model (Optional[str]): The model name.
+        **kwargs: Other ChatGoogleGenerativeAI arguments (e.g. tags).
+    Returns:
+        ChatGoogleGenerativeAI: The chat model.
+    """
+    limiter = get_rate_limiter(model)
+    return RetryingChatGoogleGenerativeAI(
+        model=model,
+        rate_limiter=limiter,
+        callbacks=[TokenUsageCallback(limiter)],
+        # a single attempt per call; retries are done by the class above
+        max_retries=1,
+        **kwargs,
+    )
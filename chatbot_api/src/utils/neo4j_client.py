@@ -0,0 +1,366 @@
+"""
+Process-wide Neo4j client. Every chain and tool in the API shares one graph
+object, and therefore one driver with a single, configured connection pool,
+instead of opening connections of their own.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Optional
+
+from langchain_neo4j import Neo4jGraph
+from neo4j import AsyncDriver, AsyncGraphDatabase, Query, RoutingControl
+
+from utils.graph_version import GraphVersionWatcher
+from utils.query_log import query_log
+from utils.retry import aretry_call, retry_call
+from utils.warmup import Lazy
+
+LOGGER = logging.getLogger(__name__)
+
+NEO4J_MAX_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", "50"))
+# seconds to wait for a free connection before failing
+NEO4J_CONNECTION_ACQUISITION_TIMEOUT = float(
+    os.getenv("NEO4J_CONNECTION_ACQUISITION_TIMEOUT", "30")
+)
+NEO4J_MAX_CONNECTION_LIFETIME = float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "3600"))
+# pooled connections idle for longer than this are checked before reuse, since
+# AuraDB silently drops idle connections
+NEO4J_LIVENESS_CHECK_TIMEOUT = float(os.getenv("NEO4J_LIVENESS_CHECK_TIMEOUT", "60"))
+# server-side transaction timeout, in seconds, for every query
+NEO4J_QUERY_TIMEOUT = float(os.getenv("NEO4J_QUERY_TIMEOUT", "30"))
+
+NEO4J_DATABASE = os.getenv("NEO4J_DATABASE", "neo4j")
+
+GRAPH_VERSION_CHECK_INTERVAL = float(os.getenv("GRAPH_VERSION_CHECK_INTERVAL", "30"))
+GRAPH_SCHEMA_SNAPSHOT_PATH = os.getenv(
+    "GRAPH_SCHEMA_SNAPSHOT_PATH", "cache_data/graph_schema.json"
+)
+
+
+class _QueryMetrics:
+    """
+    Thread-safe counters for the queries run through the shared clients. The
+    driver does not expose pool usage, so in-flight queries are tracked here as
+    a proxy for the number of connections checked out of the pools.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.queries = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def start(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def end(self, seconds: float, failed: bool) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.queries += 1
+            self.errors += int(failed)
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "queries": self.queries,
+                "errors": self.errors,
+                "avg_ms": 1000 * self.total_seconds / self.queries if self.queries else 0.0,
+                "max_ms": 1000 * self.max_seconds,
+            }
+
+
+query_metrics = _QueryMetrics()
+
+
+def _record_query(
+    query: str,
+    params: Optional[dict],
+    seconds: float,
+    result: Optional[list[dict[str, Any]]],
+) -> None:
+    # result is None if the query raised
+    failed = result is None
+    query_metrics.end(seconds, failed)
+    query_log.record(
+        query, seconds, None if failed else len(result), failed, params=params
+    )
+
+
+_DRIVER_CONFIG = {
+    "max_connection_pool_size": NEO4J_MAX_POOL_SIZE,
+    "connection_acquisition_timeout": NEO4J_CONNECTION_ACQUISITION_TIMEOUT,
+    "max_connection_lifetime": NEO4J_MAX_CONNECTION_LIFETIME,
+    "liveness_check_timeout": NEO4J_LIVENESS_CHECK_TIMEOUT,
+    "keep_alive": True,
+}
+
+
+class PooledNeo4jGraph(Neo4jGraph):
+    """
+    Neo4jGraph that records metrics for, and retries transient errors of,
+    every query. Each query borrows a connection from the driver's pool for
+    the duration of a short-lived session, so connections (and their TLS
+    handshakes with AuraDB) are reused across requests.
+    """
+
+    def query(
+        self,
+        query: str,
+        params: dict = {},
+        session_params: dict = {},
+        timeout: Optional[float] = None,
+        read_only: bool = False,
+    ) -> list[dict[str, Any]]:
+        """
+        Run a query, with the graph's transaction timeout unless timeout is
+        given. With read_only, it runs in a read transaction, in which the
+        server rejects any write.
+        """
+        query_metrics.start()
+        start_time = time.perf_counter()
+        result = None
+        try:
+            # transient failures (dropped connections, leader changes) are
+            # retried here, instead of failing the whole agent run
+            result = retry_call(
+                lambda: self._run(query, params, session_params, timeout, read_only)
+            )
+            return result
+        finally:
+            _record_query(query, params, time.perf_counter() - start_time, result)
+
+    def _run(
+        self,
+        query: str,
+        params: dict,
+        session_params: dict,
+        timeout: Optional[float],
+        read_only: bool = False,
+    ) -> list[dict[str, Any]]:
+        if timeout is None and not read_only:
+            return super().query(query, params, session_params)
+        records, _, _ = self._driver.execute_query(
+            Query(query, timeout=timeout or self.timeout),
+            parameters_=params,
+            database_=self._database,
+            routing_=RoutingControl.READ if read_only else RoutingControl.WRITE,
+        )
+        return [record.data() for record in records]
+
+    def explain(self, query: str) -> dict[str, Any]:
+        """
+        Plan a query with EXPLAIN, without running it.
+
+        Args:
+            query (str): The Cypher query.
+        Returns:
+            dict: The plan from the result summary.
+        """
+        query_metrics.start()
+        start_time = time.perf_counter()
+        failed = True
+        try:
+            _, summary, _ = retry_call(
+                lambda: self._driver.execute_query(
+                    Query(f"EXPLAIN {query}", timeout=NEO4J_QUERY_TIMEOUT),
+                    database_=self._database,
+                    routing_=RoutingControl.READ,
+                )
+            )
+            failed = False
+        finally:
+            # plans are not logged: the query log only holds executed queries
+            query_metrics.end(time.perf_counter() - start_time, failed)
+        return summary.plan or {}
+
+
+def _load_schema_snapshot(graph: Neo4jGraph, path: str) -> bool:
+    """
+    Set the graph schema from a snapshot on disk instead of introspecting the
+    database, which takes several round trips.
+
+    Args:
+        graph (Neo4jGraph): The graph to set the schema on.
+        path (str): The snapshot file.
+    Returns:
+        bool: Whether a snapshot was loaded.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            snapshot = json.load(f)
+        graph.schema = snapshot["schema"]
+        graph.structured_schema = snapshot["structured_schema"]
+    except (OSError, ValueError, KeyError):
+        return False
+    return True
+
+
+def save_schema_snapshot(graph: Neo4jGraph, path: str) -> None:
+    """
+    Write the current graph schema to disk for the next cold start.
+
+    Args:
+        graph (Neo4jGraph): The graph whose schema is saved.
+        path (str): The snapshot file.
+    Returns:
+        None
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"schema": graph.schema, "structured_schema": graph.structured_schema},
+            f,
+            default=str,
+        )
+    os.replace(tmp_path, path)
+
+
+def _connect_graph() -> PooledNeo4jGraph:
+    """
+    Connect to Neo4j, taking the schema from the on-disk snapshot if there is
+    one. The snapshot is refreshed in the background by refresh_graph_schema().
+    """
+    graph = PooledNeo4jGraph(
+        url=os.getenv("NEO4J_URI"),
+        username=os.getenv("NEO4J_USERNAME"),
+        password=os.getenv("NEO4J_PASSWORD"),
+        timeout=NEO4J_QUERY_TIMEOUT,
+        refresh_schema=False,
+        database=NEO4J_DATABASE,
+        driver_config=_DRIVER_CONFIG,
+    )
+    if not _load_schema_snapshot(graph, GRAPH_SCHEMA_SNAPSHOT_PATH):
+        graph.refresh_schema()
+        save_schema_snapshot(graph, GRAPH_SCHEMA_SNAPSHOT_PATH)
+    return graph
+
+
+_graph = Lazy(_connect_graph)
+
+
+def get_graph() -> PooledNeo4jGraph:
+    """
+    The shared graph connection, created on first use.
+    """
+    return _graph.get()
+
+
+# The async driver has its own pool, used by the coroutine implementations of
+# the agent tools so that database I/O never occupies a worker thread.
+_async_driver = Lazy(
+    lambda: AsyncGraphDatabase.driver(
+        os.getenv("NEO4J_URI"),
+        auth=(os.getenv("NEO4J_USERNAME"), os.getenv("NEO4J_PASSWORD")),
+        **_DRIVER_CONFIG,
+    )
+)
+
+
+def get_async_driver() -> AsyncDriver:
+    """
+    The shared async driver, created on first use.
+    """
+    return _async_driver.get()
+
+
+async def aquery(
+    query: str,
+    params: Optional[dict] = None,
+    timeout: float = NEO4J_QUERY_TIMEOUT,
+    read_only: bool = False,
+) -> list[dict[str, Any]]:
+    """
+    Run a query on the async driver. execute_query runs it in a managed
+    transaction, which the driver already retries on transient errors.
+
+    Args:
+        query (str): The Cypher query.
+        params (Optional[dict]): The query parameters.
+        timeout (float): The server-side transaction timeout, in seconds.
+        read_only (bool): Run it in a read transaction, in which the server
+            rejects any write.
+    Returns:
+        list[dict]: One dictionary per result record.
+    """
+    query_metrics.start()
+    start_time = time.perf_counter()
+    result = None
+    try:
+        records, _, _ = await get_async_driver().execute_query(
+            Query(query, timeout=timeout),
+            parameters_=params or {},
+            database_=NEO4J_DATABASE,
+            routing_=RoutingControl.READ if read_only else RoutingControl.WRITE,
+        )
+        result = [record.data() for record in records]
+        return result
+    finally:
+        _record_query(query, params, time.perf_counter() - start_time, result)
+
+
+async def aexplain(query: str) -> dict[str, Any]:
+    """
+    Async version of PooledNeo4jGraph.explain(), on the async driver, with the
+    same retries and metrics.
+    """
+    query_metrics.start()
+    start_time = time.perf_counter()
+    failed = True
+    try:
+        _, summary, _ = await aretry_call(
+            lambda: get_async_driver().execute_query(
+                Query(f"EXPLAIN {query}", timeout=NEO4J_QUERY_TIMEOUT),
+                database_=NEO4J_DATABASE,
+                routing_=RoutingControl.READ,
+            )
+        )
+        failed = False
+    finally:
+        query_metrics.end(time.perf_counter() - start_time, failed)
+    return summary.plan or {}
+
+
+async def close_async_driver() -> None:
+    """
+    Close the async driver, if it was ever created.
+    """
+    if _async_driver.ready:
+        await get_async_driver().close()
+
+
+def pool_metrics() -> dict[str, Any]:
+    """
+    Report the pool configuration and query metrics of the shared clients.
+
+    Returns:
+        dict: The pool settings and query counters.
+    """
+    return {
+        "max_pool_size": NEO4J_MAX_POOL_SIZE,
+        "query_timeout_seconds": NEO4J_QUERY_TIMEOUT,
+        "graph_connected": _graph.ready,
+        "async_driver_connected": _async_driver.ready,
+        **query_metrics.snapshot(),
+    }
+
+
+# the ETL stamps every load with a DataVersion marker node; caches subscribe to this
+graph_version = GraphVersionWatcher(
+    lambda query: get_graph().query(query),
+    check_interval=GRAPH_VERSION_CHECK_INTERVAL,
+)
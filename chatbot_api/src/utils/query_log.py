@@ -0,0 +1,126 @@
+"""
+JSON-lines log of every Cypher query the API runs, with its timing and small
+parameter values, read by the ETL's index advisor to pick secondary indexes
+from real traffic and to replay the queries when timing them
+"""
+import json
+import logging
+import os
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from typing import Optional
+
+from utils.text import normalize_whitespace
+
+CYPHER_QUERY_LOG_ENABLED = os.getenv("CYPHER_QUERY_LOG_ENABLED", "true").lower() == "true"
+CYPHER_QUERY_LOG_PATH = os.getenv(
+    "CYPHER_QUERY_LOG_PATH", "query_logs/cypher_queries.jsonl"
+)
+# the log is rotated at this size, keeping CYPHER_QUERY_LOG_BACKUPS old files
+CYPHER_QUERY_LOG_MAX_BYTES = int(os.getenv("CYPHER_QUERY_LOG_MAX_BYTES", "10000000"))
+CYPHER_QUERY_LOG_BACKUPS = int(os.getenv("CYPHER_QUERY_LOG_BACKUPS", "3"))
+# parameters are logged if their JSON is at most this long, which leaves out
+# embeddings; 0 never logs them
+CYPHER_QUERY_LOG_MAX_PARAMS_CHARS = int(
+    os.getenv("CYPHER_QUERY_LOG_MAX_PARAMS_CHARS", "1000")
+)
+
+
+class QueryLog:
+    """
+    Appends one JSON object per query to a size-rotated file: the query text,
+    its duration, the number of rows, whether it failed and, if they are small
+    and plain JSON, its parameters. The file is opened on the first record.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        enabled: bool = True,
+        max_bytes: int = CYPHER_QUERY_LOG_MAX_BYTES,
+        backups: int = CYPHER_QUERY_LOG_BACKUPS,
+        max_params_chars: int = CYPHER_QUERY_LOG_MAX_PARAMS_CHARS,
+    ):
+        self.path = path
+        self.enabled = enabled
+        self._max_bytes = max_bytes
+        self._backups = backups
+        self._max_params_chars = max_params_chars
+        self._handler: Optional[RotatingFileHandler] = None
+        self._lock = threading.Lock()
+
+    def _get_handler(self) -> RotatingFileHandler:
+        with self._lock:
+            if self._handler is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._handler = RotatingFileHandler(
+                    self.path,
+                    maxBytes=self._max_bytes,
+                    backupCount=self._backups,
+                    encoding="utf-8",
+                )
+                self._handler.setFormatter(logging.Formatter("%(message)s"))
+            return self._handler
+
+    def _loggable_params(self, params: Optional[dict]) -> Optional[dict]:
+        if not params:
+            return {}
+        try:
+            encoded = json.dumps(params)
+        except (TypeError, ValueError):
+            return None
+        return params if len(encoded) <= self._max_params_chars else None
+
+    def record(
+        self,
+        query: str,
+        seconds: float,
+        rows: Optional[int],
+        failed: bool,
+        params: Optional[dict] = None,
+    ) -> None:
+        """
+        Log an executed query.
+
+        Args:
+            query (str): The Cypher query.
+            seconds (float): How long it took.
+            rows (Optional[int]): The number of result rows, None if it failed.
+            failed (bool): Whether it raised.
+            params (Optional[dict]): The query parameters, left out if too large
+                or not plain JSON.
+        Returns:
+            None
+        """
+        if not self.enabled:
+            return
+        entry = {
+            "ts": time.time(),
+            "ms": round(1000 * seconds, 3),
+            "rows": rows,
+            "failed": failed,
+            "query": normalize_whitespace(query),
+        }
+        params = self._loggable_params(params)
+        if params is not None:
+            entry["params"] = params
+        line = json.dumps(entry)
+        # handle() locks around the write and the rotation
+        self._get_handler().handle(
+            logging.LogRecord("query_log", logging.INFO, "", 0, line, None, None)
+        )
+
+    def close(self) -> None:
+        """
+        Close the log file, if it was opened.
+        """
+        with self._lock:
+            if self._handler is not None:
+                self._handler.close()
+                self._handler = None
+
+
+query_log = QueryLog(CYPHER_QUERY_LOG_PATH, enabled=CYPHER_QUERY_LOG_ENABLED)
@@ -0,0 +1,212 @@
+"""
+Client-side rate limiting of LLM calls. Each model gets a requests-per-minute
+and a tokens-per-minute bucket shared by every chain using it, so bursts are
+smoothed out locally instead of being rejected (and retried) by the provider
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.rate_limiters import BaseRateLimiter
+
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "1000000"))
+# per-model overrides, e.g. '{"gemini-2.0-flash": {"rpm": 15, "tpm": 1000000}}'
+LLM_RATE_LIMITS = json.loads(os.getenv("LLM_RATE_LIMITS", "{}"))
+# upper bound of a single sleep while waiting for the buckets to refill
+_MAX_SLEEP_SECONDS = 1.0
+
+
+class TokenBucket:
+    """
+    Classic token bucket: holds up to capacity tokens and refills continuously
+    at refill_per_second. charge() may take the balance below zero, so usage
+    only known after the fact (LLM tokens) is still accounted for.
+    """
+
+    def __init__(
+        self,
+        capacity: float,
+        refill_per_second: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._clock = clock
+        self._tokens = capacity
+        self._updated_at = clock()
+
+    @property
+    def tokens(self) -> float:
+        """The current balance, after refilling."""
+        now = self._clock()
+        self._tokens = min(
+            self.capacity,
+            self._tokens + (now - self._updated_at) * self.refill_per_second,
+        )
+        self._updated_at = now
+        return self._tokens
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Seconds until the balance reaches amount (0 if it already has).
+        """
+        missing = amount - self.tokens
+        return max(0.0, missing / self.refill_per_second)
+
+    def charge(self, amount: float) -> None:
+        """
+        Take amount from the balance, even if this leaves it negative.
+        """
+        self._tokens = self.tokens - amount
+
+
+class ModelRateLimiter(BaseRateLimiter):
+    """
+    Rate limiter for one model. A call is let through once a request is
+    available in the requests bucket and the tokens bucket is not in debt;
+    tokens are charged after the call, by TokenUsageCallback.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60, clock)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60, clock)
+        self._lock = threading.Lock()
+
+        self._acquired = 0
+        self._throttled = 0
+        self._tokens_used = 0
+
+    def _try_acquire(self) -> float:
+        """
+        Take a request if one is available.
+
+        Returns:
+            float: 0 if the call may proceed, otherwise seconds to wait.
+        """
+        with self._lock:
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(0))
+            if wait == 0:
+                self.requests.charge(1)
+                self._acquired += 1
+            return wait
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        wait = self._try_acquire()
+        if wait > 0:
+            self._throttled += 1
+        while wait > 0:
+            if not blocking:
+                return False
+            time.sleep(min(wait, _MAX_SLEEP_SECONDS))
+            wait = self._try_acquire()
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        wait = self._try_acquire()
+        if wait > 0:
+            self._throttled += 1
+        while wait > 0:
+            if not blocking:
+                return False
+            await asyncio.sleep(min(wait, _MAX_SLEEP_SECONDS))
+            wait = self._try_acquire()
+        return True
+
+    def record_tokens(self, count: int) -> None:
+        """
+        Charge the tokens used by a finished call.
+
+        Args:
+            count (int): Prompt plus completion tokens.
+        Returns:
+            None
+        """
+        with self._lock:
+            self.tokens.charge(count)
+            self._tokens_used += count
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Report limiter counters.
+
+        Returns:
+            dict: Calls let through, calls that had to wait, tokens used and
+            the current bucket balances.
+        """
+        with self._lock:
+            return {
+                "requests_per_minute": self.requests.capacity,
+                "tokens_per_minute": self.tokens.capacity,
+                "acquired": self._acquired,
+                "throttled": self._throttled,
+                "tokens_used": self._tokens_used,
+                "requests_available": round(self.requests.tokens, 2),
+                "tokens_available": round(self.tokens.tokens, 2),
+            }
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """
+    Charges the token usage reported by the provider to a rate limiter.
+    """
+
+    def __init__(self, limiter: ModelRateLimiter):
+        self.limiter = limiter
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        total = 0
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None) or {}
+                total += usage.get("total_tokens", 0)
+        if total:
+            self.limiter.record_tokens(total)
+
+
+_limiters: dict[str, ModelRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model: Optional[str]) -> ModelRateLimiter:
+    """
+    The rate limiter shared by every chat model instance of a model.
+
+    Args:
+        model (Optional[str]): The model name.
+    Returns:
+        ModelRateLimiter: The limiter, created on first use from
+        LLM_RATE_LIMITS or the LLM_*_PER_MINUTE defaults.
+    """
+    key = model or "default"
+    with _limiters_lock:
+        if key not in _limiters:
+            limits = LLM_RATE_LIMITS.get(key, {})
+            _limiters[key] = ModelRateLimiter(
+                requests_per_minute=float(limits.get("rpm", LLM_REQUESTS_PER_MINUTE)),
+                tokens_per_minute=float(limits.get("tpm", LLM_TOKENS_PER_MINUTE)),
+            )
+        return _limiters[key]
+
+
+def rate_limit_stats() -> dict[str, Any]:
+    """
+    Report the counters of every model's limiter.
+
+    Returns:
+        dict: Limiter stats by model name.
+    """
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {model: limiter.stats() for model, limiter in limiters.items()}
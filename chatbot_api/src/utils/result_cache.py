@@ -0,0 +1,164 @@
+"""
+Cache of Cypher query results, valid for a single graph data version
+"""
+import asyncio
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+from utils.text import normalize_whitespace
+
+
+class VersionedResultCache:
+    """
+    Size-bounded LRU cache of query results keyed by Cypher text and parameters.
+    The graph only changes when the ETL runs, so results stay valid until the
+    data version reported by version_fn changes, at which point every entry is
+    dropped. Nothing is cached while the data version is unknown.
+    """
+
+    def __init__(
+        self,
+        version_fn: Callable[[], Optional[str]],
+        max_size: int = 2000,
+    ):
+        self._version_fn = version_fn
+        self.max_size = max_size
+        self._version: Optional[str] = None
+        self._entries: OrderedDict[tuple[str, str], list[dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._version_changes = 0
+
+    @staticmethod
+    def _key(cypher: str, params: Optional[dict]) -> tuple[str, str]:
+        return (
+            normalize_whitespace(cypher),
+            json.dumps(params or {}, sort_keys=True, default=str),
+        )
+
+    def _sync_version(self, version: Optional[str]) -> Optional[str]:
+        # must be called with the lock held; the version is read before taking
+        # it, since reading it may query the graph and run change callbacks
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+            self._version_changes += 1
+        return version
+
+    def get(
+        self, cypher: str, params: Optional[dict] = None
+    ) -> Optional[list[dict[str, Any]]]:
+        """
+        Look up the result of a query for the current data version.
+
+        Args:
+            cypher (str): The Cypher statement.
+            params (Optional[dict]): The query parameters.
+        Returns:
+            Optional[list[dict]]: The cached rows, or None on a miss.
+        """
+        key = self._key(cypher, params)
+        version = self._version_fn()
+        with self._lock:
+            self._sync_version(version)
+            rows = self._entries.get(key)
+            if rows is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return list(rows)
+
+    def put(
+        self, cypher: str, params: Optional[dict], rows: list[dict[str, Any]]
+    ) -> bool:
+        """
+        Store the result of a query for the current data version.
+
+        Args:
+            cypher (str): The Cypher statement.
+            params (Optional[dict]): The query parameters.
+            rows (list[dict]): The query result.
+        Returns:
+            bool: Whether the result was cached.
+        """
+        key = self._key(cypher, params)
+        version = self._version_fn()
+        with self._lock:
+            if self._sync_version(version) is None:
+                return False
+            self._entries[key] = list(rows)
+            self._entries.move_to_end(key)
+            self._stores += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            return True
+
+    def query(
+        self,
+        query_fn: Callable[..., list[dict[str, Any]]],
+        cypher: str,
+        params: Optional[dict] = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Return the cached result of a query, running it with query_fn on a miss.
+
+        Args:
+            query_fn: Called as query_fn(cypher, params) on a miss.
+            cypher (str): The Cypher statement.
+            params (Optional[dict]): The query parameters.
+        Returns:
+            list[dict]: The query result.
+        """
+        rows = self.get(cypher, params)
+        if rows is None:
+            rows = query_fn(cypher, params or {})
+            self.put(cypher, params, rows)
+        return rows
+
+    async def aquery(
+        self,
+        aquery_fn: Callable[..., Awaitable[list[dict[str, Any]]]],
+        cypher: str,
+        params: Optional[dict] = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Async variant of query(). Checking the data version may hit the
+        database, so cache access runs in a worker thread.
+
+        Args:
+            aquery_fn: Awaited as aquery_fn(cypher, params) on a miss.
+            cypher (str): The Cypher statement.
+            params (Optional[dict]): The query parameters.
+        Returns:
+            list[dict]: The query result.
+        """
+        rows = await asyncio.to_thread(self.get, cypher, params)
+        if rows is None:
+            rows = await aquery_fn(cypher, params or {})
+            await asyncio.to_thread(self.put, cypher, params, rows)
+        return rows
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Report cache counters.
+
+        Returns:
+            dict: Size, data version and hit/miss counts of the cache.
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "data_version": self._version,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "stores": self._stores,
+                "version_changes": self._version_changes,
+            }
@@ -0,0 +1,265 @@
+"""
+Retry policy for the individual LLM and Neo4j calls made while answering a
+question. Errors are classified first: transport failures, timeouts and rate
+limiting are retried with exponential backoff and full jitter, while errors
+that cannot succeed on a second try (e.g. the ValueError raised for unsafe
+Cypher) are raised right away. All retries of one request draw from a shared
+budget, so a partial outage cannot multiply the work done per request.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterator, Optional, TypeVar
+
+from google.api_core import exceptions as google_exceptions
+from neo4j import exceptions as neo4j_exceptions
+
+LOGGER = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "8"))
+# retries allowed across all calls made while answering one question
+REQUEST_RETRY_BUDGET = int(os.getenv("REQUEST_RETRY_BUDGET", "4"))
+
+# errors worth retrying: the call may succeed once the network, the database or
+# the provider's rate limit recovers
+RETRYABLE_ERRORS = (
+    ConnectionError,
+    TimeoutError,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.Aborted,
+    neo4j_exceptions.ServiceUnavailable,
+    neo4j_exceptions.SessionExpired,
+    neo4j_exceptions.TransientError,
+)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Classify an error as transient (worth retrying) or permanent. Errors not
+    known to be transient, including every ValueError (invalid or unsafe
+    Cypher, bad input), are permanent.
+
+    Args:
+        error (BaseException): The error raised by the call.
+    Returns:
+        bool: Whether retrying the call may succeed.
+    """
+    while error is not None:
+        if isinstance(error, RETRYABLE_ERRORS):
+            return True
+        if isinstance(error, ValueError):
+            return False
+        # wrappers (e.g. LangChain's) keep the original error as the cause
+        error = error.__cause__
+    return False
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    How often and how long to retry a call.
+    """
+    max_attempts: int = RETRY_MAX_ATTEMPTS
+    base_delay: float = RETRY_BASE_DELAY
+    max_delay: float = RETRY_MAX_DELAY
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Seconds to wait after a failed attempt: exponential backoff with full
+        jitter, so clients failing together do not retry together.
+
+        Args:
+            attempt (int): The failed attempt, starting at 1.
+        Returns:
+            float: The delay before the next attempt.
+        """
+        cap = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(0, cap)
+
+
+DEFAULT_POLICY = RetryPolicy()
+
+
+class RetryBudget:
+    """
+    Number of retries left for one request, shared by all its calls.
+    """
+
+    def __init__(self, retries: int):
+        self.remaining = retries
+        self._lock = threading.Lock()
+
+    def spend(self) -> bool:
+        """
+        Take one retry from the budget.
+
+        Returns:
+            bool: False if the budget is exhausted.
+        """
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+_budget: ContextVar[Optional[RetryBudget]] = ContextVar("retry_budget", default=None)
+
+
+@contextmanager
+def retry_budget(retries: int = REQUEST_RETRY_BUDGET) -> Iterator[RetryBudget]:
+    """
+    Limit the retries of every call made within the block (including calls
+    made from worker threads and tasks started in it) to a shared budget.
+
+    Args:
+        retries (int): Retries allowed in total.
+    Returns:
+        Iterator[RetryBudget]: The budget, for inspection.
+    """
+    budget = RetryBudget(retries)
+    token = _budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _budget.reset(token)
+
+
+class _RetryStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.permanent_errors = 0
+        self.attempts_exhausted = 0
+        self.budget_exhausted = 0
+
+    def count(self, field: str) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def snapshot(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "retries": self.retries,
+                "permanent_errors": self.permanent_errors,
+                "attempts_exhausted": self.attempts_exhausted,
+                "budget_exhausted": self.budget_exhausted,
+            }
+
+
+_stats = _RetryStats()
+
+
+def retry_stats() -> dict[str, int]:
+    """
+    Report retry counters.
+
+    Returns:
+        dict: Retries made, and failures by reason for not retrying.
+    """
+    return _stats.snapshot()
+
+
+def next_delay(
+    error: BaseException,
+    attempt: int,
+    policy: RetryPolicy = DEFAULT_POLICY,
+    classify: Callable[[BaseException], bool] = is_retryable,
+) -> Optional[float]:
+    """
+    Decide whether to retry a failed attempt.
+
+    Args:
+        error (BaseException): The error raised by the attempt.
+        attempt (int): The failed attempt, starting at 1.
+        policy (RetryPolicy): Attempts and backoff.
+        classify: Tells transient errors from permanent ones.
+    Returns:
+        Optional[float]: Seconds to wait before retrying, or None to give up.
+    """
+    if not classify(error):
+        _stats.count("permanent_errors")
+        return None
+    if attempt >= policy.max_attempts:
+        _stats.count("attempts_exhausted")
+        return None
+    budget = _budget.get()
+    if budget is not None and not budget.spend():
+        _stats.count("budget_exhausted")
+        return None
+
+    _stats.count("retries")
+    delay = policy.backoff(attempt)
+    LOGGER.warning(
+        f"Attempt {attempt} failed with {type(error).__name__}: {error}; "
+        f"retrying in {delay:.2f}s"
+    )
+    return delay
+
+
+def retry_call(
+    fn: Callable[[], T],
+    policy: RetryPolicy = DEFAULT_POLICY,
+    classify: Callable[[BaseException], bool] = is_retryable,
+) -> T:
+    """
+    Call fn, retrying transient errors.
+
+    Args:
+        fn: The call to make.
+        policy (RetryPolicy): Attempts and backoff.
+        classify: Tells transient errors from permanent ones.
+    Returns:
+        The result of fn. The last error is raised if every attempt failed.
+    """
+    attempt = 1
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            delay = next_delay(e, attempt, policy, classify)
+            if delay is None:
+                raise
+        time.sleep(delay)
+        attempt += 1
+
+
+async def aretry_call(
+    fn: Callable[[], Awaitable[T]],
+    policy: RetryPolicy = DEFAULT_POLICY,
+    classify: Callable[[BaseException], bool] = is_retryable,
+) -> T:
+    """
+    Async version of retry_call.
+
+    Args:
+        fn: Coroutine function making the call.
+        policy (RetryPolicy): Attempts and backoff.
+        classify: Tells transient errors from permanent ones.
+    Returns:
+        The result of fn. The last error is raised if every attempt failed.
+    """
+    attempt = 1
+    while True:
+        try:
+            return await fn()
+        except Exception as e:
+            delay = next_delay(e, attempt, policy, classify)
+            if delay is None:
+                raise
+        await asyncio.sleep(delay)
+        attempt += 1
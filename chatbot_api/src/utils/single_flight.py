@@ -0,0 +1,59 @@
+"""
+Coalesces concurrent calls for the same key into a single execution, so a
+burst of identical questions runs the agent once
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time. Callers arriving while a call for
+    their key is in flight wait for it and receive its result (or exception)
+    instead of starting their own.
+    """
+
+    def __init__(self):
+        self._in_flight: dict[Hashable, asyncio.Task] = {}
+        self._calls = 0
+        self._executions = 0
+        self._coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn, unless a call for key is already in flight.
+
+        Args:
+            key (Hashable): Identifies calls that can share a result.
+            fn: Coroutine function to run if no call for key is in flight.
+        Returns:
+            Any: The result of the (possibly shared) call.
+        """
+        self._calls += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            self._executions += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self._coalesced += 1
+
+        # a caller that goes away (e.g. a closed connection) must not cancel
+        # the call the other callers are waiting for
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Report coalescing counters.
+
+        Returns:
+            dict: Call, execution and coalesced counts, and calls in flight.
+        """
+        return {
+            "calls": self._calls,
+            "executions": self._executions,
+            "coalesced": self._coalesced,
+            "coalesced_rate": self._coalesced / self._calls if self._calls else 0.0,
+            "in_flight": len(self._in_flight),
+        }
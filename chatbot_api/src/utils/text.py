@@ -0,0 +1,45 @@
+"""
+Text helpers shared by the caches and request de-duplication
+"""
+import hashlib
+import re
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalize a question so trivially different spellings share a key:
+    lowercased, whitespace collapsed, trailing punctuation removed.
+
+    Args:
+        question (str): The raw question.
+    Returns:
+        str: The normalized question.
+    """
+    question = normalize_whitespace(question.lower())
+    return question.rstrip(" ?.!")
+
+
+def normalize_whitespace(text: str) -> str:
+    """
+    Collapse runs of whitespace (including newlines) into single spaces.
+
+    Args:
+        text (str): The text to normalize.
+    Returns:
+        str: The text on a single line, stripped.
+    """
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def fingerprint(text: str) -> str:
+    """
+    Stable short fingerprint of a piece of text (e.g. a graph schema).
+
+    Args:
+        text (str): The text to fingerprint.
+    Returns:
+        str: Hex digest identifying the text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,155 @@
+"""
+Lazy initialization and background warmup of the expensive API components
+(graph connection, embedding models, vector stores, chains and agent)
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+LOGGER = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Lazy(Generic[T]):
+    """
+    Builds a value on first use, exactly once, even under concurrent access.
+    If the factory raises, nothing is cached and the next get() tries again.
+    """
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._value: Optional[T] = None
+        self._ready = False
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def get(self) -> T:
+        if self._ready:
+            return self._value
+        with self._lock:
+            if not self._ready:
+                self._value = self._factory()
+                self._ready = True
+        return self._value
+
+    async def aget(self) -> T:
+        """
+        Like get(), but builds the value in a worker thread so the event loop
+        is never blocked by initialization.
+        """
+        if self._ready:
+            return self._value
+        return await asyncio.to_thread(self.get)
+
+
+class Warmup:
+    """
+    Runs named initialization stages one after another in a background thread
+    and reports their progress, so the API can serve requests (and readiness
+    probes) while it warms up. A failed stage does not stop the following
+    ones; failed stages are retried with exponential backoff until they all
+    succeed, and whatever they build is also retried lazily on first use.
+    """
+
+    def __init__(
+        self,
+        retry_delay: float = 5.0,
+        max_retry_delay: float = 300.0,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self._stages: list[tuple[str, Callable[[], Any]]] = []
+        self._status: dict[str, dict[str, Any]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._retry_delay = retry_delay
+        self._max_retry_delay = max_retry_delay
+        self._sleep = sleep
+
+    def add_stage(self, name: str, fn: Callable[[], Any]) -> None:
+        """
+        Register a stage. Stages run in registration order.
+
+        Args:
+            name (str): The stage name reported by status().
+            fn: Callable doing the work of the stage.
+        Returns:
+            None
+        """
+        self._stages.append((name, fn))
+        self._status[name] = {"state": "pending"}
+
+    def start(self) -> None:
+        """
+        Start running the stages in a daemon thread, retrying failed ones until
+        every stage is ready. Does nothing if already started.
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self.run_until_ready, name="warmup", daemon=True
+        )
+        self._thread.start()
+
+    def run(self) -> bool:
+        """
+        Run every stage that is not ready yet in the calling thread.
+
+        Returns:
+            bool: Whether every stage is ready.
+        """
+        for name, fn in self._stages:
+            if self._status[name]["state"] == "ready":
+                continue
+            attempts = self._status[name].get("attempts", 0) + 1
+            self._status[name] = {"state": "running", "attempts": attempts}
+            start_time = time.perf_counter()
+            try:
+                fn()
+            except Exception as e:
+                LOGGER.exception(f"Warmup stage '{name}' failed")
+                self._status[name] = {
+                    "state": "failed",
+                    "attempts": attempts,
+                    "error": str(e),
+                }
+                continue
+            duration = time.perf_counter() - start_time
+            LOGGER.info(f"Warmup stage '{name}' ready in {duration:.2f}s")
+            self._status[name] = {
+                "state": "ready",
+                "attempts": attempts,
+                "seconds": round(duration, 3),
+            }
+        return self.ready
+
+    def run_until_ready(self) -> None:
+        """
+        Run the stages, then retry the failed ones with exponential backoff
+        until every stage is ready, so a transient failure at startup does not
+        keep the API unready.
+        """
+        delay = self._retry_delay
+        while not self.run():
+            failed = [n for n, s in self._status.items() if s["state"] == "failed"]
+            LOGGER.warning(f"Retrying warmup stages {failed} in {delay:.0f}s")
+            self._sleep(delay)
+            delay = min(2 * delay, self._max_retry_delay)
+
+    @property
+    def ready(self) -> bool:
+        return all(s["state"] == "ready" for s in self._status.values())
+
+    def status(self) -> dict[str, dict[str, Any]]:
+        """
+        Report the state of every stage.
+
+        Returns:
+            dict: Stage name -> state ("pending", "running", "ready" or "failed")
+            and attempts so far.
+        """
+        return {name: dict(status) for name, status in self._status.items()}
@@ -1,6 +1,7 @@
 """
 A simple Streamlit app that serves as a frontend for our chatbot.
 """
+import json
 import os
 
 import requests
@@ -9,6 +10,10 @@ import streamlit as st
 CHATBOT_URL = os.getenv(
     "CHATBOT_URL", "http://localhost:8000/hospital-rag-agent"
 )
+# streaming variant of the agent endpoint, so the answer shows up as it is written
+CHATBOT_STREAM_URL = os.getenv("CHATBOT_STREAM_URL", f"{CHATBOT_URL}/stream")
+ERROR_MESSAGE = """An error occurred while processing your message.
+            Please try again or rephrase your message."""
 
 with st.sidebar:
     st.header("What is this app?")
@@ -73,21 +78,50 @@ if prompt := st.chat_input("Enter your question here..."):
     st.session_state.messages.append({"role": "user", "output": prompt})
 
     data = {"text": prompt}
+    result = {"output": ERROR_MESSAGE, "explanation": ERROR_MESSAGE, "failed": False}
 
-    with st.spinner("Searching for an answer..."):
-        response = requests.post(CHATBOT_URL, json=data)
-
-        if response.status_code == 200:
-            output_text = response.json()["output"]
-            explanation = response.json()["intermediate_steps"]
-
-        else:
-            output_text = """An error occurred while processing your message.
-            Please try again or rephrase your message."""
-            explanation = output_text
-
-    st.chat_message("assistant").markdown(output_text)
-    st.status("How was this generated?", state="complete").info(explanation)
+    def stream_answer():
+        """
+        Yield the final answer tokens, showing tool calls as they happen. On an
+        error, stop and flag the result as failed.
+        """
+        with requests.post(CHATBOT_STREAM_URL, json=data, stream=True) as response:
+            if response.status_code != 200:
+                result["failed"] = True
+                return
+
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event["event"] == "tool_start":
+                    status.update(label=f"Using {event['tool']}: {event['input']}")
+                elif event["event"] == "token":
+                    yield event["token"]
+                elif event["event"] == "final":
+                    result["output"] = event["response"]["output"]
+                    result["explanation"] = event["response"]["intermediate_steps"]
+                elif event["event"] == "error":
+                    result["failed"] = True
+                    return
+
+    with st.chat_message("assistant"):
+        status = st.status("Searching for an answer...")
+        answer = st.empty()
+        with answer.container():
+            streamed_text = st.write_stream(stream_answer())
+        if result["failed"]:
+            # tokens streamed before the error are not an answer: replace them
+            result["output"] = result["explanation"] = ERROR_MESSAGE
+            answer.markdown(ERROR_MESSAGE)
+        # cached answers arrive as a single final event, without tokens
+        elif not streamed_text and result["output"] != ERROR_MESSAGE:
+            answer.markdown(result["output"])
+        status.update(label="How was this generated?", state="complete")
+        status.info(result["explanation"])
+
+    output_text = result["output"]
+    explanation = result["explanation"]
 
     st.session_state.messages.append(
         {
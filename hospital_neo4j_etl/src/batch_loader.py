@@ -0,0 +1,622 @@
+"""
+Helpers for streaming CSV files into Neo4j in parameterized batches: each file
+is read once, row by row, and written with UNWIND statements in transactions
+of a bounded size
+"""
+import csv
+import io
+import logging
+import random
+import time
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, Optional
+
+from neo4j.exceptions import DriverError, Neo4jError
+
+from state_store import RowStateStore, row_hash
+
+LOGGER = logging.getLogger(__name__)
+
+# backoff between attempts of a transaction that hit a transient error
+_RETRY_BASE_DELAY = 0.2
+_RETRY_MAX_DELAY = 5.0
+
+Row = dict[str, Any]
+
+
+def to_int(value: Optional[str]) -> Optional[int]:
+    """
+    Parse an integer CSV field. Empty fields become None, like in LOAD CSV.
+    """
+    if value is None or not value.strip():
+        return None
+    return int(float(value.strip()))
+
+
+def to_float(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a float CSV field. Empty fields become None, like in LOAD CSV.
+    """
+    if value is None or not value.strip():
+        return None
+    return float(value.strip())
+
+
+def to_str(value: Optional[str]) -> Optional[str]:
+    """
+    Keep a text CSV field. Empty fields become None, like in LOAD CSV.
+    """
+    return value if value else None
+
+
+@contextmanager
+def open_csv(path: str) -> Iterator[io.TextIOBase]:
+    """
+    Open a CSV file from a URL (http, https, file) or a local path as a text
+    stream, without reading it into memory.
+
+    Args:
+        path (str): The URL or path of the file.
+    Returns:
+        Iterator[io.TextIOBase]: The open text stream.
+    """
+    if path.startswith(("http://", "https://", "file://")):
+        with urllib.request.urlopen(path) as response:
+            yield io.TextIOWrapper(response, encoding="utf-8", newline="")
+    else:
+        with open(path, encoding="utf-8", newline="") as f:
+            yield f
+
+
+def iter_csv_batches(
+    path: str,
+    batch_size: int,
+    transform: Callable[[dict[str, str]], Row],
+) -> Iterator[list[Row]]:
+    """
+    Stream a CSV file as batches of typed rows.
+
+    Args:
+        path (str): The URL or path of the file.
+        batch_size (int): Rows per batch.
+        transform: Turns a raw CSV record into the row sent to Neo4j.
+    Returns:
+        Iterator[list[dict]]: Batches of at most batch_size rows.
+    """
+    with open_csv(path) as f:
+        batch = []
+        for record in csv.DictReader(f):
+            batch.append(transform(record))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+@dataclass
+class Stage:
+    """
+    One entity of the ETL: the CSV file it comes from, how to type its rows,
+    and the UNWIND $rows statements writing a batch of them (the nodes, then
+    their relationships).
+    """
+    label: str
+    path: str
+    transform: Callable[[dict[str, str]], Row]
+    queries: list[str]
+    # run on updated rows before the queries, to drop relationships whose
+    # endpoints may have changed
+    stale_queries: list[str] = field(default_factory=list)
+    # row fields naming the many-valued nodes the stage's relationships lock
+    # besides the row's own; in parallel mode, batches written concurrently
+    # never share a value of these. Nodes with only a few values (e.g. payers)
+    # would cap a round at one batch per value, so they are left out and the
+    # conflicts over them retried.
+    partition_keys: tuple[str, ...] = ()
+
+    @property
+    def delete_query(self) -> str:
+        return f"""
+        UNWIND $ids AS id
+        MATCH (n:{self.label} {{id: id}})
+        DETACH DELETE n
+        """
+
+
+class StageProgress:
+    """
+    Counts the rows handled by an ETL stage and logs progress and throughput.
+    """
+
+    def __init__(self, name: str, log_every: int = 10):
+        self.name = name
+        self.log_every = log_every
+        self.rows = 0
+        self.batches = 0
+        self.inserted = 0
+        self.updated = 0
+        self.skipped = 0
+        self.deleted = 0
+        self.retries = 0
+        self._started_at = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._started_at
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def changed(self) -> int:
+        return self.inserted + self.updated + self.deleted
+
+    def add(self, inserted: int, updated: int = 0, skipped: int = 0) -> None:
+        """
+        Record a processed batch.
+
+        Args:
+            inserted (int): New rows written.
+            updated (int): Changed rows written.
+            skipped (int): Unchanged rows, not written.
+        Returns:
+            None
+        """
+        self.rows += inserted + updated + skipped
+        self.inserted += inserted
+        self.updated += updated
+        self.skipped += skipped
+        self.batches += 1
+        if self.batches % self.log_every == 0:
+            LOGGER.info(
+                f"{self.name}: {self.rows} rows in {self.batches} batches "
+                f"({self.rows_per_second:.0f} rows/s)"
+            )
+
+    def done(self) -> None:
+        """
+        Log the stage summary.
+        """
+        LOGGER.info(
+            f"{self.name}: done, {self.rows} rows in {self.elapsed:.1f}s "
+            f"({self.rows_per_second:.0f} rows/s): {self.inserted} inserted, "
+            f"{self.updated} updated, {self.skipped} skipped, {self.deleted} deleted, "
+            f"{self.retries} retried transactions"
+        )
+
+
+@dataclass
+class BatchPlan:
+    """
+    A batch of rows to write, and the state to record once it is written.
+    """
+    rows: list[Row]
+    updated_rows: list[Row]
+    hashes: dict[int, str]
+    skipped: int = 0
+
+    @property
+    def inserted(self) -> int:
+        return len(self.rows) - len(self.updated_rows)
+
+
+def plan_batch(
+    stage: Stage,
+    rows: list[Row],
+    state: Optional[RowStateStore] = None,
+    incremental: bool = False,
+) -> BatchPlan:
+    """
+    Sort a batch of rows into new, updated and unchanged ones.
+
+    Args:
+        stage (Stage): The stage the rows belong to.
+        rows (list[dict]): The typed rows.
+        state (Optional[RowStateStore]): Row hashes of the previous runs.
+        incremental (bool): Skip rows unchanged since the previous run.
+    Returns:
+        BatchPlan: The rows to write (all of them unless incremental).
+    """
+    hashes = {row["id"]: row_hash(row) for row in rows} if state else {}
+    previous = state.hashes(stage.label, list(hashes)) if incremental else {}
+
+    new_rows = [r for r in rows if r["id"] not in previous]
+    updated_rows = [
+        r
+        for r in rows
+        if r["id"] in previous and previous[r["id"]] != hashes[r["id"]]
+    ]
+    changed_rows = new_rows + updated_rows
+    return BatchPlan(
+        changed_rows, updated_rows, hashes, len(rows) - len(changed_rows)
+    )
+
+
+def write_batch(
+    tx, stage: Stage, rows: list[Row], updated_rows: list[Row] = ()
+) -> None:
+    """
+    Write one batch of a stage in a single transaction.
+
+    Args:
+        tx: The Neo4j transaction object.
+        stage (Stage): The stage.
+        rows (list[dict]): Rows to write (new and updated ones).
+        updated_rows (list[dict]): The rows that already exist in the graph.
+    Returns:
+        None
+    """
+    if updated_rows:
+        for query in stage.stale_queries:
+            tx.run(query, rows=updated_rows).consume()
+    for query in stage.queries:
+        tx.run(query, rows=rows).consume()
+
+
+def _delete_batch(tx, stage: Stage, ids: list[int]) -> None:
+    tx.run(stage.delete_query, ids=ids).consume()
+
+
+def execute_write_with_retry(
+    session, work: Callable[..., Any], *args: Any, max_attempts: int = 5
+) -> int:
+    """
+    Run a unit of work in a write transaction, retrying it on transient errors
+    such as deadlocks between concurrent writers or lost connections. Retries
+    wait an exponential, jittered delay, so the transactions that deadlocked
+    do not collide again right away.
+
+    Args:
+        session: The Neo4j session.
+        work: Called with the transaction and args.
+        *args: Arguments of work.
+        max_attempts (int): Attempts before giving up.
+    Returns:
+        int: The number of retries it took.
+    """
+    attempt = 1
+    while True:
+        try:
+            with session.begin_transaction() as tx:
+                work(tx, *args)
+                tx.commit()
+            return attempt - 1
+        except (Neo4jError, DriverError) as e:
+            if not e.is_retryable() or attempt >= max_attempts:
+                raise
+            delay = min(_RETRY_BASE_DELAY * 2 ** (attempt - 1), _RETRY_MAX_DELAY)
+            delay *= random.uniform(0.5, 1.5)
+            LOGGER.warning(
+                f"Transient error on attempt {attempt}, retrying in "
+                f"{delay:.2f}s: {e}"
+            )
+            time.sleep(delay)
+            attempt += 1
+
+
+def _record(
+    state: Optional[RowStateStore],
+    stage: Stage,
+    plan: BatchPlan,
+    run: int,
+    progress: StageProgress,
+) -> None:
+    if state:
+        state.record(stage.label, plan.hashes, run)
+    progress.add(plan.inserted, len(plan.updated_rows), plan.skipped)
+
+
+def _delete_missing(
+    session,
+    stage: Stage,
+    state: RowStateStore,
+    run: int,
+    batch_size: int,
+    progress: StageProgress,
+    max_attempts: int,
+) -> None:
+    missing = list(state.missing_ids(stage.label, run))
+    for start in range(0, len(missing), batch_size):
+        ids = missing[start : start + batch_size]
+        progress.retries += execute_write_with_retry(
+            session, _delete_batch, stage, ids, max_attempts=max_attempts
+        )
+        state.forget(stage.label, ids)
+    progress.deleted = len(missing)
+
+
+def load_csv_stage(
+    driver,
+    stage: Stage,
+    batch_size: int,
+    state: Optional[RowStateStore] = None,
+    run: int = 0,
+    incremental: bool = False,
+    delete_missing: bool = False,
+    database: str = "neo4j",
+    max_attempts: int = 5,
+) -> StageProgress:
+    """
+    Stream a CSV file into Neo4j: every batch of rows is written with all the
+    stage's queries (e.g. a node and its relationships) in one transaction.
+
+    In incremental mode, rows whose hash matches the state store are skipped,
+    and only new or changed rows are written; rows that disappeared from the
+    file can be deleted. The state store, if given, is updated after every
+    batch written, so an interrupted run resumes where it stopped.
+
+    Args:
+        driver: The Neo4j driver.
+        stage (Stage): What to load and how.
+        batch_size (int): Rows per transaction.
+        state (Optional[RowStateStore]): Row hashes of the previous runs.
+        run (int): The current run of the state store.
+        incremental (bool): Skip rows unchanged since the previous run.
+        delete_missing (bool): Delete nodes whose row is no longer in the file.
+        database (str): The Neo4j database.
+        max_attempts (int): Attempts per transaction on transient errors.
+    Returns:
+        StageProgress: The stage counters.
+    """
+    LOGGER.info(f"{stage.label}: loading from {stage.path}")
+    progress = StageProgress(stage.label)
+    with driver.session(database=database) as session:
+        for rows in iter_csv_batches(stage.path, batch_size, stage.transform):
+            plan = plan_batch(stage, rows, state, incremental)
+            if plan.rows:
+                progress.retries += execute_write_with_retry(
+                    session,
+                    write_batch,
+                    stage,
+                    plan.rows,
+                    plan.updated_rows,
+                    max_attempts=max_attempts,
+                )
+            _record(state, stage, plan, run, progress)
+
+        if delete_missing and state:
+            _delete_missing(
+                session, stage, state, run, batch_size, progress, max_attempts
+            )
+
+    progress.done()
+    return progress
+
+
+def _write_plans(
+    driver, stage: Stage, plans: list[BatchPlan], database: str, max_attempts: int
+) -> int:
+    """
+    Write batches one after the other in a session of their own, as one task
+    of a worker. Returns the number of retries.
+    """
+    retries = 0
+    with driver.session(database=database) as session:
+        for plan in plans:
+            retries += execute_write_with_retry(
+                session,
+                write_batch,
+                stage,
+                plan.rows,
+                plan.updated_rows,
+                max_attempts=max_attempts,
+            )
+    return retries
+
+
+def partition_round(
+    rows: list[Row], keys: tuple[str, ...], workers: int, batch_size: int
+) -> tuple[list[list[Row]], list[Row]]:
+    """
+    Pick the batches of one round from rows: up to `workers` batches of at
+    most batch_size rows that share no value of any key, so they can be
+    written concurrently without locking the same nodes.
+
+    Rows are taken in order. A row joins the batch that already holds one of
+    its key values, or the smallest batch if none does. A row whose values
+    are held by two different batches, or whose batch is full, is left for a
+    later round.
+
+    Args:
+        rows (list[dict]): The rows waiting to be written.
+        keys (tuple[str, ...]): Row fields naming the locked endpoints.
+        workers (int): The number of concurrent writers.
+        batch_size (int): Rows per transaction.
+    Returns:
+        tuple[list[list[dict]], list[dict]]: The non-empty batches of the
+        round, and the rows left for later rounds, in their original order.
+    """
+    owners: dict[tuple[str, Any], int] = {}
+    batches: list[list[Row]] = [[] for _ in range(workers)]
+    deferred: list[Row] = []
+    capacity = workers * batch_size
+    taken = 0
+    for i, row in enumerate(rows):
+        if taken >= capacity:
+            deferred.extend(rows[i:])
+            break
+        values = [(key, row[key]) for key in keys if row[key] is not None]
+        holders = {owners[value] for value in values if value in owners}
+        if len(holders) > 1:
+            deferred.append(row)
+            continue
+        if holders:
+            batch = holders.pop()
+        else:
+            batch = min(range(workers), key=lambda b: len(batches[b]))
+        if len(batches[batch]) >= batch_size:
+            deferred.append(row)
+            continue
+        batches[batch].append(row)
+        taken += 1
+        for value in values:
+            owners[value] = batch
+    return [batch for batch in batches if batch], deferred
+
+
+def load_csv_stages_parallel(
+    driver,
+    stages: list[Stage],
+    batch_size: int,
+    workers: int,
+    state: Optional[RowStateStore] = None,
+    run: int = 0,
+    incremental: bool = False,
+    delete_missing: bool = False,
+    database: str = "neo4j",
+    max_attempts: int = 5,
+) -> list[StageProgress]:
+    """
+    Load independent stages concurrently with a pool of writers, one session
+    each. Stages without partition keys (e.g. nodes of different labels) are
+    streamed, and their batches written by whichever writer is free. Stages
+    with partition keys are streamed through a window of a few batches per
+    writer, and written in rounds of batches that share no endpoint, so
+    concurrent transactions do not wait on (or deadlock over) the same nodes.
+    Endpoints outside the partition keys, and the old endpoints of updated
+    rows, are not partitioned on, so conflicts over them are retried.
+
+    The state store is only used from the calling thread, and updated once
+    a batch is written, as in load_csv_stage.
+
+    Args:
+        driver: The Neo4j driver.
+        stages (list[Stage]): Stages that do not depend on each other.
+        batch_size (int): Rows per transaction.
+        workers (int): The number of concurrent writers.
+        state (Optional[RowStateStore]): Row hashes of the previous runs.
+        run (int): The current run of the state store.
+        incremental (bool): Skip rows unchanged since the previous run.
+        delete_missing (bool): Delete nodes whose row is no longer in the file.
+        database (str): The Neo4j database.
+        max_attempts (int): Attempts per transaction on transient errors.
+    Returns:
+        list[StageProgress]: The counters of each stage.
+    """
+    progresses = {stage.label: StageProgress(stage.label) for stage in stages}
+    in_flight: deque = deque()
+
+    def finish_oldest():
+        future, stage, plan = in_flight.popleft()
+        progress = progresses[stage.label]
+        progress.retries += future.result()
+        _record(state, stage, plan, run, progress)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for stage in stages:
+            if stage.partition_keys:
+                continue
+            LOGGER.info(f"{stage.label}: loading from {stage.path}")
+            for rows in iter_csv_batches(stage.path, batch_size, stage.transform):
+                plan = plan_batch(stage, rows, state, incremental)
+                if not plan.rows:
+                    _record(state, stage, plan, run, progresses[stage.label])
+                    continue
+                future = pool.submit(
+                    _write_plans, driver, stage, [plan], database, max_attempts
+                )
+                in_flight.append((future, stage, plan))
+                # bound the rows held in memory
+                while len(in_flight) > 2 * workers:
+                    finish_oldest()
+
+        while in_flight:
+            finish_oldest()
+
+        for stage in stages:
+            if stage.partition_keys:
+                _load_partitioned_stage(
+                    pool,
+                    driver,
+                    stage,
+                    batch_size,
+                    workers,
+                    state,
+                    run,
+                    incremental,
+                    database,
+                    max_attempts,
+                    progresses[stage.label],
+                )
+
+    for stage in stages:
+        progress = progresses[stage.label]
+        if delete_missing and state:
+            with driver.session(database=database) as session:
+                _delete_missing(
+                    session, stage, state, run, batch_size, progress, max_attempts
+                )
+        progress.done()
+    return list(progresses.values())
+
+
+def _load_partitioned_stage(
+    pool: ThreadPoolExecutor,
+    driver,
+    stage: Stage,
+    batch_size: int,
+    workers: int,
+    state: Optional[RowStateStore],
+    run: int,
+    incremental: bool,
+    database: str,
+    max_attempts: int,
+    progress: StageProgress,
+) -> None:
+    LOGGER.info(f"{stage.label}: loading from {stage.path}")
+    # rows waiting to be written, and their hashes and whether they are updates;
+    # the window bounds memory while leaving rounds rows to choose from
+    window = 2 * workers * batch_size
+    pending: list[Row] = []
+    hashes: dict[int, str] = {}
+    updated_ids: set[int] = set()
+    batches = iter_csv_batches(stage.path, batch_size, stage.transform)
+    exhausted = False
+    while True:
+        while not exhausted and len(pending) < window:
+            rows = next(batches, None)
+            if rows is None:
+                exhausted = True
+                break
+            plan = plan_batch(stage, rows, state, incremental)
+            pending.extend(plan.rows)
+            changed_ids = {r["id"] for r in plan.rows}
+            updated_ids.update(r["id"] for r in plan.updated_rows)
+            hashes.update(
+                {k: v for k, v in plan.hashes.items() if k in changed_ids}
+            )
+            # unchanged rows have nothing to write, so they are recorded now
+            if plan.skipped:
+                unchanged = {
+                    k: v for k, v in plan.hashes.items() if k not in changed_ids
+                }
+                skipped = BatchPlan([], [], unchanged, plan.skipped)
+                _record(state, stage, skipped, run, progress)
+        if not pending:
+            break
+
+        round_, pending = partition_round(
+            pending, stage.partition_keys, workers, batch_size
+        )
+        tasks = []
+        for rows in round_:
+            plan = BatchPlan(
+                rows,
+                [r for r in rows if r["id"] in updated_ids],
+                {r["id"]: hashes.pop(r["id"]) for r in rows if r["id"] in hashes},
+            )
+            updated_ids.difference_update(r["id"] for r in rows)
+            future = pool.submit(
+                _write_plans, driver, stage, [plan], database, max_attempts
+            )
+            tasks.append((future, plan))
+        # the pending rows may share endpoints with this round: wait for it
+        for future, plan in tasks:
+            progress.retries += future.result()
+            _record(state, stage, plan, run, progress)
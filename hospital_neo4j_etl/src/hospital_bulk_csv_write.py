@@ -1,9 +1,24 @@
 import logging
 import os
+import time
+import uuid
 
 from neo4j import GraphDatabase
 from retry import retry
 
+from batch_loader import (
+    Stage,
+    load_csv_stage,
+    load_csv_stages_parallel,
+    to_float,
+    to_int,
+    to_str,
+)
+from index_advisor import advise_indexes
+from review_embeddings import embed_reviews
+from rollups import build_rollups, drop_rollups, missing_rollups
+from state_store import RowStateStore
+
 HOSPITALS_CSV_PATH = os.getenv("HOSPITALS_CSV_PATH")
 PAYERS_CSV_PATH = os.getenv("PAYERS_CSV_PATH")
 PHYSICIANS_CSV_PATH = os.getenv("PHYSICIANS_CSV_PATH")
@@ -15,6 +30,36 @@ NEO4J_URI = os.getenv("NEO4J_URI")
 NEO4J_USERNAME = os.getenv("NEO4J_USERNAME")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
 
+# rows written per transaction
+ETL_BATCH_SIZE = int(os.getenv("ETL_BATCH_SIZE", "1000"))
+# "full" reloads every row; "incremental" only writes rows that changed since
+# the last run, using the row hashes kept in ETL_STATE_PATH
+ETL_MODE = os.getenv("ETL_MODE", "full").lower()
+ETL_STATE_PATH = os.getenv("ETL_STATE_PATH", "etl_state/row_state.sqlite")
+# in incremental mode, delete nodes whose rows were removed from the CSVs
+ETL_DELETE_MISSING = os.getenv("ETL_DELETE_MISSING", "false").lower() == "true"
+# concurrent writers (one Neo4j connection each); 1 loads the stages in order
+ETL_WORKERS = int(os.getenv("ETL_WORKERS", "1"))
+# attempts per transaction on transient errors such as deadlocks
+ETL_MAX_ATTEMPTS = int(os.getenv("ETL_MAX_ATTEMPTS", "5"))
+# embed new and changed reviews for the API's vector search
+ETL_EMBED_REVIEWS = os.getenv("ETL_EMBED_REVIEWS", "true").lower() == "true"
+REVIEW_EMBEDDINGS_MODEL = os.getenv(
+    "REVIEW_EMBEDDINGS_MODEL", "sentence-transformers/all-MiniLM-L6-v2"
+)
+ETL_EMBEDDING_BATCH_SIZE = int(os.getenv("ETL_EMBEDDING_BATCH_SIZE", "64"))
+ETL_EMBEDDING_PROCESSES = int(os.getenv("ETL_EMBEDDING_PROCESSES", "1"))
+# precompute common aggregates into summary nodes for the API's Cypher
+ETL_ROLLUPS = os.getenv("ETL_ROLLUPS", "true").lower() == "true"
+# secondary indexes picked from the API's query log: "off", "report" only
+# logs the recommendations, "apply" creates them and times sample queries
+ETL_INDEX_ADVISOR = os.getenv("ETL_INDEX_ADVISOR", "report").lower()
+ETL_QUERY_LOG_PATH = os.getenv(
+    "ETL_QUERY_LOG_PATH", "query_logs/cypher_queries.jsonl"
+)
+ETL_INDEX_MIN_QUERIES = int(os.getenv("ETL_INDEX_MIN_QUERIES", "10"))
+ETL_INDEX_MIN_ENTITIES = int(os.getenv("ETL_INDEX_MIN_ENTITIES", "1000"))
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s]: %(message)s",
@@ -24,6 +69,11 @@ logging.basicConfig(
 LOGGER = logging.getLogger(__name__)
 
 NODES = ["Hospital", "Payer", "Physician", "Patient", "Visit", "Review"]
+# properties the API filters reviews on before vector ranking
+PROPERTY_INDEXES = [("Review", "hospital_name"), ("Review", "physician_name")]
+
+# marker node read by the API to detect that the graph has been reloaded
+DATA_VERSION_LABEL = "DataVersion"
 
 
 def _set_uniqueness_constraints(tx, node):
@@ -40,13 +90,282 @@ def _set_uniqueness_constraints(tx, node):
         REQUIRE n.id IS UNIQUE;"""
     _ = tx.run(query, {})
 
-# TODO: refactor this:
-    # modularity (split queries into sep functions)
-    # make queries less shitty
+def _create_property_index(tx, node, prop):
+    """
+    Ensures a range index on a Neo4j node property.
+    
+    Args:
+        tx: The Neo4j transaction object.
+        node: The node label.
+        prop: The indexed property.
+    Returns:
+        None
+    """
+    query = f"""CREATE INDEX {node.lower()}_{prop} IF NOT EXISTS
+        FOR (n:{node}) ON (n.{prop});"""
+    _ = tx.run(query, {})
+
+def _set_data_version(tx, version):
+    """
+    Stamps the graph with a new data version, invalidating API-side caches.
+    
+    Args:
+        tx: The Neo4j transaction object.
+        version: The identifier of this load.
+    Returns:
+        None
+    """
+    query = f"""MERGE (v:{DATA_VERSION_LABEL} {{id: 'hospital_graph'}})
+        SET v.version = $version, v.loaded_at = datetime();"""
+    _ = tx.run(query, {"version": version})
+
+def _get_data_version(tx):
+    """
+    Reads the data version the graph was last stamped with.
+    
+    Args:
+        tx: The Neo4j transaction object.
+    Returns:
+        The data version, or None if the graph was never loaded.
+    """
+    query = f"""MATCH (v:{DATA_VERSION_LABEL} {{id: 'hospital_graph'}})
+        RETURN v.version AS version"""
+    record = tx.run(query).single()
+    return record["version"] if record else None
+
+def _hospital_row(record):
+    return {
+        "id": to_int(record["hospital_id"]),
+        "name": to_str(record["hospital_name"]),
+        "state_name": to_str(record["hospital_state"]),
+    }
+
+
+def _payer_row(record):
+    return {"id": to_int(record["payer_id"]), "name": to_str(record["payer_name"])}
+
+
+def _physician_row(record):
+    return {
+        "id": to_int(record["physician_id"]),
+        "name": to_str(record["physician_name"]),
+        "dob": to_str(record["physician_dob"]),
+        "grad_year": to_str(record["physician_grad_year"]),
+        "school": to_str(record["medical_school"]),
+        "salary": to_float(record["salary"]),
+    }
+
+
+def _patient_row(record):
+    return {
+        "id": to_int(record["patient_id"]),
+        "name": to_str(record["patient_name"]),
+        "sex": to_str(record["patient_sex"]),
+        "dob": to_str(record["patient_dob"]),
+        "blood_type": to_str(record["patient_blood_type"]),
+    }
+
+
+def _visit_row(record):
+    return {
+        "id": to_int(record["visit_id"]),
+        "room_number": to_int(record["room_number"]),
+        "admission_type": to_str(record["admission_type"]),
+        "admission_date": to_str(record["date_of_admission"]),
+        "test_results": to_str(record["test_results"]),
+        "status": to_str(record["visit_status"]),
+        "chief_complaint": to_str(record["chief_complaint"]),
+        "treatment_description": to_str(record["treatment_description"]),
+        "diagnosis": to_str(record["primary_diagnosis"]),
+        "discharge_date": to_str(record["discharge_date"]),
+        "billing_amount": to_float(record["billing_amount"]),
+        "hospital_id": to_int(record["hospital_id"]),
+        "physician_id": to_int(record["physician_id"]),
+        "patient_id": to_int(record["patient_id"]),
+        "payer_id": to_int(record["payer_id"]),
+    }
+
+
+def _review_row(record):
+    return {
+        "id": to_int(record["review_id"]),
+        "visit_id": to_int(record["visit_id"]),
+        "text": to_str(record["review"]),
+        "patient_name": to_str(record["patient_name"]),
+        "physician_name": to_str(record["physician_name"]),
+        "hospital_name": to_str(record["hospital_name"]),
+    }
+
+
+HOSPITAL_QUERIES = [
+    """
+    UNWIND $rows AS row
+    MERGE (h:Hospital {id: row.id})
+    SET h.name = row.name, h.state_name = row.state_name
+    """
+]
+
+PAYER_QUERIES = [
+    """
+    UNWIND $rows AS row
+    MERGE (p:Payer {id: row.id})
+    SET p.name = row.name
+    """
+]
+
+PHYSICIAN_QUERIES = [
+    """
+    UNWIND $rows AS row
+    MERGE (p:Physician {id: row.id})
+    SET p.name = row.name, p.dob = row.dob, p.grad_year = row.grad_year,
+        p.school = row.school, p.salary = row.salary
+    """
+]
+
+PATIENT_QUERIES = [
+    """
+    UNWIND $rows AS row
+    MERGE (p:Patient {id: row.id})
+    SET p.name = row.name, p.sex = row.sex, p.dob = row.dob,
+        p.blood_type = row.blood_type
+    """
+]
+
+# a visit row carries the visit and all of its relationships, so the visits
+# file is read once instead of once per relationship type
+VISIT_QUERIES = [
+    """
+    UNWIND $rows AS row
+    MERGE (v:Visit {id: row.id})
+    SET v.room_number = row.room_number,
+        v.admission_type = row.admission_type,
+        v.admission_date = row.admission_date,
+        v.test_results = row.test_results,
+        v.status = row.status,
+        v.chief_complaint = row.chief_complaint,
+        v.treatment_description = row.treatment_description,
+        v.diagnosis = row.diagnosis,
+        v.discharge_date = row.discharge_date
+    """,
+    """
+    UNWIND $rows AS row
+    MATCH (v:Visit {id: row.id})
+    MATCH (h:Hospital {id: row.hospital_id})
+    MERGE (v)-[:AT]->(h)
+    """,
+    """
+    UNWIND $rows AS row
+    MATCH (p:Physician {id: row.physician_id})
+    MATCH (v:Visit {id: row.id})
+    MERGE (p)-[:TREATS]->(v)
+    """,
+    """
+    UNWIND $rows AS row
+    MATCH (v:Visit {id: row.id})
+    MATCH (p:Payer {id: row.payer_id})
+    MERGE (v)-[covered_by:COVERED_BY]->(p)
+    ON CREATE SET
+        covered_by.service_date = row.discharge_date,
+        covered_by.billing_amount = row.billing_amount
+    """,
+    """
+    UNWIND $rows AS row
+    MATCH (p:Patient {id: row.patient_id})
+    MATCH (v:Visit {id: row.id})
+    MERGE (p)-[:HAS]->(v)
+    """,
+    """
+    UNWIND $rows AS row
+    WITH DISTINCT row.hospital_id AS hospital_id, row.physician_id AS physician_id
+    MATCH (h:Hospital {id: hospital_id})
+    MATCH (p:Physician {id: physician_id})
+    MERGE (h)-[:EMPLOYS]->(p)
+    """,
+]
+
+REVIEW_QUERIES = [
+    """
+    UNWIND $rows AS row
+    MERGE (r:Review {id: row.id})
+    SET r.text = row.text, r.patient_name = row.patient_name,
+        r.physician_name = row.physician_name, r.hospital_name = row.hospital_name
+    """,
+    """
+    UNWIND $rows AS row
+    MATCH (v:Visit {id: row.visit_id})
+    MATCH (r:Review {id: row.id})
+    MERGE (v)-[:WRITES]->(r)
+    """,
+]
+
+# relationships owned by a visit or review row, dropped before an updated row
+# is written again in case they now point elsewhere. EMPLOYS is shared by all
+# the visits of a hospital and physician, so it is never dropped here.
+VISIT_STALE_QUERIES = [
+    """
+    UNWIND $rows AS row
+    MATCH (v:Visit {id: row.id})-[r:AT|COVERED_BY]->()
+    DELETE r
+    """,
+    """
+    UNWIND $rows AS row
+    MATCH (v:Visit {id: row.id})<-[r:TREATS|HAS]-()
+    DELETE r
+    """,
+]
+
+REVIEW_STALE_QUERIES = [
+    """
+    UNWIND $rows AS row
+    MATCH (:Review {id: row.id})<-[r:WRITES]-()
+    DELETE r
+    """
+]
+
+# nodes first, so the relationships of visits and reviews find their endpoints.
+# Stages of a group only depend on earlier groups, so in parallel mode they are
+# loaded concurrently. Visits are partitioned by physician and patient; every
+# batch touches most of the few hospitals and payers, so conflicts over those
+# are retried instead.
+STAGE_GROUPS = [
+    [
+        Stage("Hospital", HOSPITALS_CSV_PATH, _hospital_row, HOSPITAL_QUERIES),
+        Stage("Payer", PAYERS_CSV_PATH, _payer_row, PAYER_QUERIES),
+        Stage("Physician", PHYSICIANS_CSV_PATH, _physician_row, PHYSICIAN_QUERIES),
+        Stage("Patient", PATIENTS_CSV_PATH, _patient_row, PATIENT_QUERIES),
+    ],
+    [
+        Stage(
+            "Visit",
+            VISITS_CSV_PATH,
+            _visit_row,
+            VISIT_QUERIES,
+            VISIT_STALE_QUERIES,
+            partition_keys=("physician_id", "patient_id"),
+        ),
+    ],
+    [
+        Stage(
+            "Review",
+            REVIEWS_CSV_PATH,
+            _review_row,
+            REVIEW_QUERIES,
+            REVIEW_STALE_QUERIES,
+        ),
+    ],
+]
+
+
 @retry(tries=100, delay=10)
 def load_hospital_graph_from_csv() -> None:
     """
-    Loads structured hospital CSV data following a specific ontology into Neo4j
+    Loads structured hospital CSV data following a specific ontology into Neo4j.
+    Each CSV file is streamed once and written in UNWIND batches of
+    ETL_BATCH_SIZE rows, one transaction per batch. In incremental mode, only
+    new and changed rows are written. With ETL_WORKERS > 1, independent stages
+    and batches are written concurrently. The rollup summary nodes are then
+    rebuilt, reviews are embedded for the API's vector search, and the index
+    advisor checks the API's query log for missing secondary indexes.
     
     Args:
         None
@@ -55,164 +374,125 @@ def load_hospital_graph_from_csv() -> None:
     """
 
     driver = GraphDatabase.driver(
-        NEO4J_URI, auth=(NEO4J_USERNAME, NEO4J_PASSWORD)
+        NEO4J_URI,
+        auth=(NEO4J_USERNAME, NEO4J_PASSWORD),
+        # a connection per writer, so workers never wait for one
+        max_connection_pool_size=max(100, ETL_WORKERS + 1),
     )
 
     LOGGER.info("Setting uniqueness constraints on nodes")
     with driver.session(database="neo4j") as session:
         for node in NODES:
             session.execute_write(_set_uniqueness_constraints, node)
+        for node, prop in PROPERTY_INDEXES:
+            session.execute_write(_create_property_index, node, prop)
 
-    LOGGER.info("Loading hospital nodes")
-    with driver.session(database="neo4j") as session:
-        query = f"""
-        LOAD CSV WITH HEADERS
-        FROM '{HOSPITALS_CSV_PATH}' AS hospitals
-        MERGE (h:Hospital {{id: toInteger(hospitals.hospital_id),
-                            name: hospitals.hospital_name,
-                            state_name: hospitals.hospital_state}});
-        """
-        _ = session.run(query, {})
-
-    LOGGER.info("Loading payer nodes")
-    with driver.session(database="neo4j") as session:
-        query = f"""
-        LOAD CSV WITH HEADERS
-        FROM '{PAYERS_CSV_PATH}' AS payers
-        MERGE (p:Payer {{id: toInteger(payers.payer_id),
-        name: payers.payer_name}});
-        """
-        _ = session.run(query, {})
-
-    LOGGER.info("Loading physician nodes")
-    with driver.session(database="neo4j") as session:
-        query = f"""
-        LOAD CSV WITH HEADERS
-        FROM '{PHYSICIANS_CSV_PATH}' AS physicians
-        MERGE (p:Physician {{id: toInteger(physicians.physician_id),
-                            name: physicians.physician_name,
-                            dob: physicians.physician_dob,
-                            grad_year: physicians.physician_grad_year,
-                            school: physicians.medical_school,
-                            salary: toFloat(physicians.salary)
-                            }});
-        """
-        _ = session.run(query, {})
-
-    LOGGER.info("Loading visit nodes")
-    with driver.session(database="neo4j") as session:
-        query = f"""
-        LOAD CSV WITH HEADERS FROM '{VISITS_CSV_PATH}' AS visits
-        MERGE (v:Visit {{id: toInteger(visits.visit_id),
-                            room_number: toInteger(visits.room_number),
-                            admission_type: visits.admission_type,
-                            admission_date: visits.date_of_admission,
-                            test_results: visits.test_results,
-                            status: visits.visit_status
-        }})
-            ON CREATE SET v.chief_complaint = visits.chief_complaint
-            ON MATCH SET v.chief_complaint = visits.chief_complaint
-            ON CREATE SET v.treatment_description =
-            visits.treatment_description
-            ON MATCH SET v.treatment_description = visits.treatment_description
-            ON CREATE SET v.diagnosis = visits.primary_diagnosis
-            ON MATCH SET v.diagnosis = visits.primary_diagnosis
-            ON CREATE SET v.discharge_date = visits.discharge_date
-            ON MATCH SET v.discharge_date = visits.discharge_date
-         """
-        _ = session.run(query, {})
-
-    LOGGER.info("Loading patient nodes")
-    with driver.session(database="neo4j") as session:
-        query = f"""
-        LOAD CSV WITH HEADERS
-        FROM '{PATIENTS_CSV_PATH}' AS patients
-        MERGE (p:Patient {{id: toInteger(patients.patient_id),
-                        name: patients.patient_name,
-                        sex: patients.patient_sex,
-                        dob: patients.patient_dob,
-                        blood_type: patients.patient_blood_type
-                        }});
-        """
-        _ = session.run(query, {})
-
-    LOGGER.info("Loading review nodes")
-    with driver.session(database="neo4j") as session:
-        query = f"""
-        LOAD CSV WITH HEADERS
-        FROM '{REVIEWS_CSV_PATH}' AS reviews
-        MERGE (r:Review {{id: toInteger(reviews.review_id),
-                         text: reviews.review,
-                         patient_name: reviews.patient_name,
-                         physician_name: reviews.physician_name,
-                         hospital_name: reviews.hospital_name
-                        }});
-        """
-        _ = session.run(query, {})
-
-    LOGGER.info("Loading 'AT' relationships")
-    with driver.session(database="neo4j") as session:
-        query = f"""
-        LOAD CSV WITH HEADERS FROM '{VISITS_CSV_PATH}' AS row
-        MATCH (source: `Visit` {{ `id`: toInteger(trim(row.`visit_id`)) }})
-        MATCH (target: `Hospital` {{ `id`:
-        toInteger(trim(row.`hospital_id`))}})
-        MERGE (source)-[r: `AT`]->(target)
-        """
-        _ = session.run(query, {})
-
-    LOGGER.info("Loading 'WRITES' relationships")
-    with driver.session(database="neo4j") as session:
-        query = f"""
-        LOAD CSV WITH HEADERS FROM '{REVIEWS_CSV_PATH}' AS reviews
-            MATCH (v:Visit {{id: toInteger(reviews.visit_id)}})
-            MATCH (r:Review {{id: toInteger(reviews.review_id)}})
-            MERGE (v)-[writes:WRITES]->(r)
-        """
-        _ = session.run(query, {})
-
-    LOGGER.info("Loading 'TREATS' relationships")
-    with driver.session(database="neo4j") as session:
-        query = f"""
-        LOAD CSV WITH HEADERS FROM '{VISITS_CSV_PATH}' AS visits
-            MATCH (p:Physician {{id: toInteger(visits.physician_id)}})
-            MATCH (v:Visit {{id: toInteger(visits.visit_id)}})
-            MERGE (p)-[treats:TREATS]->(v)
-        """
-        _ = session.run(query, {})
-
-    LOGGER.info("Loading 'COVERED_BY' relationships")
-    with driver.session(database="neo4j") as session:
-        query = f"""
-        LOAD CSV WITH HEADERS FROM '{VISITS_CSV_PATH}' AS visits
-            MATCH (v:Visit {{id: toInteger(visits.visit_id)}})
-            MATCH (p:Payer {{id: toInteger(visits.payer_id)}})
-            MERGE (v)-[covered_by:COVERED_BY]->(p)
-            ON CREATE SET
-                covered_by.service_date = visits.discharge_date,
-                covered_by.billing_amount = toFloat(visits.billing_amount)
-        """
-        _ = session.run(query, {})
-
-    LOGGER.info("Loading 'HAS' relationships")
-    with driver.session(database="neo4j") as session:
-        query = f"""
-        LOAD CSV WITH HEADERS FROM '{VISITS_CSV_PATH}' AS visits
-            MATCH (p:Patient {{id: toInteger(visits.patient_id)}})
-            MATCH (v:Visit {{id: toInteger(visits.visit_id)}})
-            MERGE (p)-[has:HAS]->(v)
-        """
-        _ = session.run(query, {})
-
-    LOGGER.info("Loading 'EMPLOYS' relationships")
-    with driver.session(database="neo4j") as session:
-        query = f"""
-        LOAD CSV WITH HEADERS FROM '{VISITS_CSV_PATH}' AS visits
-            MATCH (h:Hospital {{id: toInteger(visits.hospital_id)}})
-            MATCH (p:Physician {{id: toInteger(visits.physician_id)}})
-            MERGE (h)-[employs:EMPLOYS]->(p)
-        """
-        _ = session.run(query, {})
+    state = RowStateStore(ETL_STATE_PATH)
+    incremental = ETL_MODE == "incremental"
+    if incremental:
+        with driver.session(database="neo4j") as session:
+            graph_version = session.execute_read(_get_data_version)
+        # the state only describes the graph if the graph is the one it loaded
+        if graph_version is None or graph_version != state.get_meta("data_version"):
+            LOGGER.warning(
+                "State store does not match the graph, running a full load"
+            )
+            incremental = False
+    # a run that crashed may have written rows (and recorded their hashes)
+    # without rebuilding the rollups or stamping a new data version, so the
+    # next run does both even if it finds no changed row
+    resumed = state.get_meta("in_progress") is not None
+    if resumed and incremental:
+        LOGGER.warning("Previous run did not finish, forcing a new data version")
+    if not incremental:
+        state.reset()
+    run = state.start_run()
+    state.set_meta("in_progress", str(run))
+    forced = resumed or not incremental
+
+    LOGGER.info(f"ETL mode: {'incremental' if incremental else 'full'}")
+    started_at = time.perf_counter()
+    changed = 0
+    for group in STAGE_GROUPS:
+        if ETL_WORKERS > 1:
+            progresses = load_csv_stages_parallel(
+                driver,
+                group,
+                ETL_BATCH_SIZE,
+                ETL_WORKERS,
+                state=state,
+                run=run,
+                incremental=incremental,
+                delete_missing=incremental and ETL_DELETE_MISSING,
+                max_attempts=ETL_MAX_ATTEMPTS,
+            )
+        else:
+            progresses = [
+                load_csv_stage(
+                    driver,
+                    stage,
+                    ETL_BATCH_SIZE,
+                    state=state,
+                    run=run,
+                    incremental=incremental,
+                    delete_missing=incremental and ETL_DELETE_MISSING,
+                    max_attempts=ETL_MAX_ATTEMPTS,
+                )
+                for stage in group
+            ]
+        changed += sum(progress.changed for progress in progresses)
+    LOGGER.info(
+        f"Loaded all CSV files in {time.perf_counter() - started_at:.1f}s, "
+        f"{changed} rows changed"
+    )
+
+    # new or removed summary labels change the schema the API sends to the LLM,
+    # so they need a new data version even if no row changed
+    rollups_changed = False
+    if ETL_ROLLUPS:
+        missing = missing_rollups(driver)
+        if changed or forced or missing:
+            build_rollups(driver, max_attempts=ETL_MAX_ATTEMPTS)
+            rollups_changed = bool(missing)
+    else:
+        rollups_changed = drop_rollups(driver, max_attempts=ETL_MAX_ATTEMPTS) > 0
+
+    if ETL_EMBED_REVIEWS:
+        embed_reviews(
+            driver,
+            REVIEW_EMBEDDINGS_MODEL,
+            ETL_BATCH_SIZE,
+            encode_batch_size=ETL_EMBEDDING_BATCH_SIZE,
+            processes=ETL_EMBEDDING_PROCESSES,
+            max_attempts=ETL_MAX_ATTEMPTS,
+        )
+
+    # an unchanged graph keeps its version, so API caches stay valid
+    if changed or rollups_changed or forced:
+        data_version = uuid.uuid4().hex
+        LOGGER.info(f"Setting graph data version to {data_version}")
+        with driver.session(database="neo4j") as session:
+            session.execute_write(_set_data_version, data_version)
+        state.set_meta("data_version", data_version)
+    state.delete_meta("in_progress")
+
+    # indexes do not change the data, so they need no new data version; a
+    # failing advisor must not rerun the whole load
+    if ETL_INDEX_ADVISOR in ("report", "apply"):
+        try:
+            advise_indexes(
+                driver,
+                ETL_QUERY_LOG_PATH,
+                apply=ETL_INDEX_ADVISOR == "apply",
+                min_queries=ETL_INDEX_MIN_QUERIES,
+                min_entities=ETL_INDEX_MIN_ENTITIES,
+                max_attempts=ETL_MAX_ATTEMPTS,
+            )
+        except Exception as e:
+            LOGGER.warning(f"Index advisor failed: {e}")
+
+    state.close()
+    driver.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,297 @@
+"""
+Secondary index advisor driven by the API's Cypher query log: it finds the
+label/property pairs the logged queries filter on most, ranked by the time
+those queries took, and in apply mode creates range or text indexes for them
+and reports query latency before and after each index, replaying logged
+queries with their logged parameters
+"""
+import glob
+import json
+import logging
+import re
+import statistics
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from neo4j import Query
+
+from batch_loader import execute_write_with_retry
+
+LOGGER = logging.getLogger(__name__)
+
+# how long a timed sample query may run, and how long to wait for new indexes
+_SAMPLE_TIMEOUT_SECONDS = 30
+_INDEX_ONLINE_TIMEOUT_SECONDS = 300
+
+_NODE_VARIABLE = re.compile(r"\(\s*(\w+)\s*:\s*`?(\w+)`?")
+_RELATIONSHIP_VARIABLE = re.compile(r"\[\s*(\w+)\s*:\s*`?(\w+)`?")
+_INLINE_MAP = re.compile(r"[(\[]\s*\w*\s*:\s*`?(\w+)`?\s*\{([^}]*)\}")
+_MAP_KEY = re.compile(r"(\w+)\s*:")
+# a WHERE clause runs up to the next clause; the WITH of STARTS WITH and
+# ENDS WITH does not end it (logged queries have single spaces)
+_WHERE = re.compile(
+    r"\bWHERE\b(.*?)(?=\b(?:RETURN|(?<!STARTS )(?<!ENDS )WITH|MATCH|OPTIONAL|"
+    r"ORDER|UNWIND|CALL|LIMIT|SKIP|UNION)\b|$)",
+    re.IGNORECASE | re.DOTALL,
+)
+# predicates a range index serves; CONTAINS and ENDS WITH need a text index
+_PREDICATE = re.compile(
+    r"\b(\w+)\.(\w+)\s*(=|<=|>=|<|>|IN\b|STARTS\s+WITH|ENDS\s+WITH|CONTAINS)",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class IndexCandidate:
+    """A label or relationship property that logged queries filter on."""
+    label: str
+    prop: str
+    index_type: str  # "RANGE" or "TEXT"
+    relationship: bool = False
+    queries: int = 0
+    total_ms: float = 0.0
+    # (query, parameters) pairs that can be replayed for timing
+    samples: list[tuple[str, dict]] = field(default_factory=list)
+
+    @property
+    def key(self) -> tuple[str, str, str]:
+        return self.label, self.prop, self.index_type
+
+    @property
+    def name(self) -> str:
+        return f"advisor_{self.label.lower()}_{self.prop}_{self.index_type.lower()}"
+
+    def create_statement(self) -> str:
+        if self.relationship:
+            pattern = f"()-[e:{self.label}]-()"
+        else:
+            pattern = f"(e:{self.label})"
+        return (
+            f"CREATE {self.index_type} INDEX {self.name} IF NOT EXISTS "
+            f"FOR {pattern} ON (e.{self.prop})"
+        )
+
+
+def read_query_log(path: str) -> list[dict]:
+    """
+    Read the API's query log, rotated files included. Failed queries and
+    malformed lines are skipped.
+
+    Args:
+        path (str): The current log file.
+    Returns:
+        list[dict]: The logged queries.
+    """
+    entries = []
+    for log_file in sorted(glob.glob(f"{glob.escape(path)}*")):
+        with open(log_file, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if not entry.get("failed") and entry.get("query"):
+                    entries.append(entry)
+    return entries
+
+
+def filtered_properties(cypher: str) -> set[tuple[str, str, str, bool]]:
+    """
+    Find the properties a query filters on, in inline property maps and in
+    WHERE predicates on variables bound to a label or relationship type.
+
+    Args:
+        cypher (str): The Cypher query.
+    Returns:
+        set[tuple[str, str, str, bool]]: (label or type, property, index type,
+        whether it is a relationship property) per filter.
+    """
+    nodes = {var: label for var, label in _NODE_VARIABLE.findall(cypher)}
+    relationships = {
+        var: rel_type for var, rel_type in _RELATIONSHIP_VARIABLE.findall(cypher)
+    }
+    found = set()
+    for match in _INLINE_MAP.finditer(cypher):
+        relationship = match.group(0).startswith("[")
+        for key in _MAP_KEY.findall(match.group(2)):
+            found.add((match.group(1), key, "RANGE", relationship))
+    for where in _WHERE.findall(cypher):
+        for var, prop, operator in _PREDICATE.findall(where):
+            operator = " ".join(operator.upper().split())
+            index_type = "TEXT" if operator in ("CONTAINS", "ENDS WITH") else "RANGE"
+            if var in nodes:
+                found.add((nodes[var], prop, index_type, False))
+            elif var in relationships:
+                found.add((relationships[var], prop, index_type, True))
+    return found
+
+
+def find_candidates(entries: list[dict], max_samples: int = 3) -> list[IndexCandidate]:
+    """
+    Aggregate the filters of logged queries.
+
+    Args:
+        entries (list[dict]): The logged queries.
+        max_samples (int): Distinct replayable queries kept per candidate for
+            timing: queries without parameters, or logged with their values.
+    Returns:
+        list[IndexCandidate]: Candidates, the most query time first.
+    """
+    candidates: dict[tuple[str, str, str], IndexCandidate] = {}
+    for entry in entries:
+        for label, prop, index_type, relationship in filtered_properties(
+            entry["query"]
+        ):
+            candidate = candidates.setdefault(
+                (label, prop, index_type),
+                IndexCandidate(label, prop, index_type, relationship),
+            )
+            candidate.queries += 1
+            candidate.total_ms += float(entry.get("ms", 0))
+            # parameterized queries logged without their values (e.g. with an
+            # embedding) cannot be replayed
+            params = entry.get("params")
+            if params is None and "$" not in entry["query"]:
+                params = {}
+            sample = (entry["query"], params)
+            if (
+                params is not None
+                and len(candidate.samples) < max_samples
+                and sample not in candidate.samples
+            ):
+                candidate.samples.append(sample)
+    return sorted(candidates.values(), key=lambda c: c.total_ms, reverse=True)
+
+
+def _existing_indexes(tx) -> set[tuple[str, str, str]]:
+    result = tx.run(
+        "SHOW INDEXES YIELD type, labelsOrTypes, properties "
+        "WHERE labelsOrTypes IS NOT NULL AND size(properties) > 0 "
+        "RETURN type, labelsOrTypes[0] AS label, properties[0] AS prop"
+    )
+    return {(r["label"], r["prop"], r["type"]) for r in result}
+
+
+def _count(tx, candidate: IndexCandidate) -> int:
+    pattern = (
+        f"()-[e:{candidate.label}]->()" if candidate.relationship
+        else f"(e:{candidate.label})"
+    )
+    return tx.run(f"MATCH {pattern} RETURN count(e) AS n").single()["n"]
+
+
+def _time_query(session, cypher: str, params: dict, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        started_at = time.perf_counter()
+        # read transactions, so a logged query can never write
+        session.execute_read(
+            lambda tx: tx.run(
+                Query(cypher, timeout=_SAMPLE_TIMEOUT_SECONDS), params
+            ).consume()
+        )
+        timings.append(1000 * (time.perf_counter() - started_at))
+    return statistics.median(timings)
+
+
+def _sample_latency(
+    session, candidate: IndexCandidate, repeats: int
+) -> Optional[float]:
+    timings = []
+    for cypher, params in candidate.samples:
+        try:
+            timings.append(_time_query(session, cypher, params, repeats))
+        except Exception as e:
+            LOGGER.warning(f"Index advisor: sample query failed: {e}")
+    return statistics.mean(timings) if timings else None
+
+
+def _format_latency(report: dict) -> str:
+    if "before_ms" not in report:
+        return "not applied"
+    if report["before_ms"] is None or report["after_ms"] is None:
+        return "latency not measured, no replayable logged query"
+    return f"{report['before_ms']:.1f} ms -> {report['after_ms']:.1f} ms"
+
+
+def _create_index(tx, candidate: IndexCandidate) -> None:
+    tx.run(candidate.create_statement()).consume()
+
+
+def advise_indexes(
+    driver,
+    log_path: str,
+    apply: bool = False,
+    min_queries: int = 10,
+    min_entities: int = 1000,
+    max_indexes: int = 5,
+    repeats: int = 3,
+    database: str = "neo4j",
+    max_attempts: int = 5,
+) -> list[dict]:
+    """
+    Recommend, and in apply mode create, secondary indexes for the properties
+    that the logged queries filter on. A candidate needs at least min_queries
+    logged queries, a label or type with at least min_entities nodes or
+    relationships (smaller ones scan fast enough), and no index of the same
+    type yet.
+
+    Args:
+        driver: The Neo4j driver.
+        log_path (str): The API's query log.
+        apply (bool): Create the indexes and time sample queries before and
+            after; otherwise only report.
+        min_queries (int): Logged queries needed per candidate.
+        min_entities (int): Nodes or relationships needed per candidate.
+        max_indexes (int): Indexes recommended per run, most query time first.
+        repeats (int): Runs per sample query, the median is reported.
+        database (str): The Neo4j database.
+        max_attempts (int): Attempts per transaction on transient errors.
+    Returns:
+        list[dict]: One report per recommended index; in apply mode,
+        before_ms and after_ms are None if no logged query could be replayed.
+    """
+    entries = read_query_log(log_path)
+    if not entries:
+        LOGGER.info(f"Index advisor: no logged queries in {log_path}")
+        return []
+
+    reports = []
+    with driver.session(database=database) as session:
+        existing = session.execute_read(_existing_indexes)
+        for candidate in find_candidates(entries):
+            if len(reports) >= max_indexes:
+                break
+            if candidate.queries < min_queries or candidate.key in existing:
+                continue
+            if session.execute_read(_count, candidate) < min_entities:
+                continue
+
+            report = {
+                "index": candidate.name,
+                "statement": candidate.create_statement(),
+                "queries": candidate.queries,
+                "avg_logged_ms": candidate.total_ms / candidate.queries,
+            }
+            if apply:
+                report["before_ms"] = _sample_latency(session, candidate, repeats)
+                execute_write_with_retry(
+                    session, _create_index, candidate, max_attempts=max_attempts
+                )
+                session.run(
+                    "CALL db.awaitIndexes($timeout)",
+                    timeout=_INDEX_ONLINE_TIMEOUT_SECONDS,
+                ).consume()
+                report["after_ms"] = _sample_latency(session, candidate, repeats)
+            reports.append(report)
+
+            LOGGER.info(
+                f"Index advisor: {report['statement']} "
+                f"({report['queries']} queries, "
+                f"{report['avg_logged_ms']:.1f} ms average in the log, "
+                f"{_format_latency(report)})"
+            )
+    if not reports:
+        LOGGER.info("Index advisor: no new index needed")
+    return reports
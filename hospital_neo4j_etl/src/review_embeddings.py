@@ -0,0 +1,179 @@
+"""
+ETL stage embedding Review nodes for the API's vector search: review texts are
+read from the graph, embedded in large batches (on several processes if
+configured) and written back in UNWIND batches with a hash of the embedded
+text, so later runs only embed reviews whose text changed
+"""
+import hashlib
+import logging
+import time
+
+from sentence_transformers import SentenceTransformer
+
+from batch_loader import execute_write_with_retry
+
+LOGGER = logging.getLogger(__name__)
+
+REVIEW_INDEX_NAME = "reviews"
+# must match REVIEW_TEXT_PROPERTIES in the API's chains/review_chain.py
+REVIEW_TEXT_PROPERTIES = [
+    "physician_name",
+    "patient_name",
+    "text",
+    "hospital_name",
+]
+
+REVIEW_TEXTS_QUERY = """
+MATCH (r:Review)
+WHERE any(k IN $props WHERE r[k] IS NOT NULL)
+RETURN r.id AS id,
+       [k IN $props | r[k]] AS values,
+       r.embedding_hash AS hash,
+       r.embedding IS NOT NULL AS embedded
+"""
+
+WRITE_EMBEDDINGS_QUERY = """
+UNWIND $rows AS row
+MATCH (r:Review {id: row.id})
+CALL db.create.setNodeVectorProperty(r, 'embedding', row.embedding)
+SET r.embedding_hash = row.hash
+"""
+
+VECTOR_INDEX_QUERY = f"""
+CREATE VECTOR INDEX {REVIEW_INDEX_NAME} IF NOT EXISTS
+FOR (r:Review) ON r.embedding
+OPTIONS {{indexConfig: {{
+    `vector.dimensions`: toInteger($dimensions),
+    `vector.similarity_function`: 'cosine'
+}}}}
+"""
+
+
+def review_text(values: list) -> str:
+    """
+    The document text of a review, as Neo4jVector.from_existing_graph embeds
+    it: a "\\n<property>:<value>" line per text property, missing values empty.
+
+    Args:
+        values (list): The values of REVIEW_TEXT_PROPERTIES, in order.
+    Returns:
+        str: The text to embed.
+    """
+    return "".join(
+        f"\n{prop}:{'' if value is None else value}"
+        for prop, value in zip(REVIEW_TEXT_PROPERTIES, values)
+    )
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def reviews_to_embed(reviews: list[dict]) -> list[dict]:
+    """
+    Pick the reviews without an embedding, or whose text changed since they
+    were embedded.
+
+    Args:
+        reviews (list[dict]): Rows of REVIEW_TEXTS_QUERY.
+    Returns:
+        list[dict]: The reviews to embed, with their "text" and "new_hash".
+    """
+    todo = []
+    for review in reviews:
+        review["text"] = review_text(review["values"])
+        review["new_hash"] = _text_hash(review["text"])
+        if not review["embedded"] or review["hash"] != review["new_hash"]:
+            todo.append(review)
+    return todo
+
+
+def _read_reviews(tx) -> list[dict]:
+    result = tx.run(REVIEW_TEXTS_QUERY, props=REVIEW_TEXT_PROPERTIES)
+    return [record.data() for record in result]
+
+
+def _write_embeddings(tx, rows: list[dict]) -> None:
+    tx.run(WRITE_EMBEDDINGS_QUERY, rows=rows).consume()
+
+
+def _create_vector_index(tx, dimensions: int) -> None:
+    tx.run(VECTOR_INDEX_QUERY, dimensions=dimensions).consume()
+
+
+def embed_reviews(
+    driver,
+    model_name: str,
+    batch_size: int,
+    encode_batch_size: int = 64,
+    processes: int = 1,
+    database: str = "neo4j",
+    max_attempts: int = 5,
+) -> int:
+    """
+    Embed the reviews that have no embedding, or whose text changed since
+    they were embedded, and create the vector index the API searches.
+
+    Args:
+        driver: The Neo4j driver.
+        model_name (str): The sentence-transformers model, the same one the
+            API embeds questions with.
+        batch_size (int): Reviews embedded and written per transaction.
+        encode_batch_size (int): Texts per forward pass of the model.
+        processes (int): Processes encoding in parallel, on CPU.
+        database (str): The Neo4j database.
+        max_attempts (int): Attempts per transaction on transient errors.
+    Returns:
+        int: The number of reviews embedded.
+    """
+    started_at = time.perf_counter()
+    with driver.session(database=database) as session:
+        reviews = session.execute_read(_read_reviews)
+        todo = reviews_to_embed(reviews)
+        LOGGER.info(
+            f"Review embeddings: {len(todo)} of {len(reviews)} reviews to embed"
+        )
+
+        model = SentenceTransformer(model_name, device="cpu")
+        pool = (
+            model.start_multi_process_pool(["cpu"] * processes)
+            if processes > 1 and todo
+            else None
+        )
+        try:
+            for start in range(0, len(todo), batch_size):
+                batch = todo[start : start + batch_size]
+                texts = [r["text"] for r in batch]
+                if pool is not None:
+                    embeddings = model.encode_multi_process(
+                        texts, pool, batch_size=encode_batch_size
+                    )
+                else:
+                    embeddings = model.encode(texts, batch_size=encode_batch_size)
+                rows = [
+                    {"id": r["id"], "embedding": e.tolist(), "hash": r["new_hash"]}
+                    for r, e in zip(batch, embeddings)
+                ]
+                execute_write_with_retry(
+                    session, _write_embeddings, rows, max_attempts=max_attempts
+                )
+                LOGGER.info(
+                    f"Review embeddings: {start + len(batch)} of {len(todo)} "
+                    f"written"
+                )
+        finally:
+            if pool is not None:
+                model.stop_multi_process_pool(pool)
+
+        execute_write_with_retry(
+            session,
+            _create_vector_index,
+            model.get_sentence_embedding_dimension(),
+            max_attempts=max_attempts,
+        )
+
+    LOGGER.info(
+        f"Review embeddings: done, {len(todo)} reviews embedded in "
+        f"{time.perf_counter() - started_at:.1f}s"
+    )
+    return len(todo)
@@ -0,0 +1,147 @@
+"""
+ETL stage materializing the aggregates the API's Graph tool is asked for most
+(billing per payer and year, stays by admission type, visits per state and
+year, reviews per physician) into summary nodes, so generated Cypher reads a
+few precomputed rows instead of aggregating every visit on each question
+"""
+import logging
+import time
+
+from batch_loader import execute_write_with_retry
+
+LOGGER = logging.getLogger(__name__)
+
+# summary label -> query creating its nodes from the loaded graph. Years are
+# admission years; stays only count discharged visits.
+ROLLUP_QUERIES = {
+    "PayerYearSummary": """
+    MATCH (v:Visit)-[c:COVERED_BY]->(p:Payer)
+    WHERE v.admission_date IS NOT NULL
+    WITH p.name AS payer_name, date(v.admission_date).year AS year,
+         count(v) AS visit_count, sum(c.billing_amount) AS total_billing
+    CREATE (:PayerYearSummary {
+        payer_name: payer_name,
+        year: year,
+        visit_count: visit_count,
+        total_billing: total_billing,
+        average_billing: total_billing / visit_count
+    })
+    """,
+    "AdmissionTypeSummary": """
+    MATCH (v:Visit)
+    WHERE v.admission_type IS NOT NULL
+    WITH v.admission_type AS admission_type, count(v) AS visit_count,
+         avg(CASE WHEN v.discharge_date IS NOT NULL THEN
+             duration.inDays(date(v.admission_date), date(v.discharge_date)).days
+         END) AS average_stay_days
+    CREATE (:AdmissionTypeSummary {
+        admission_type: admission_type,
+        visit_count: visit_count,
+        average_stay_days: average_stay_days
+    })
+    """,
+    "StateYearSummary": """
+    MATCH (v:Visit)-[:AT]->(h:Hospital)
+    WHERE v.admission_date IS NOT NULL
+    WITH h.state_name AS state_name, date(v.admission_date).year AS year,
+         count(v) AS visit_count
+    CREATE (:StateYearSummary {
+        state_name: state_name,
+        year: year,
+        visit_count: visit_count
+    })
+    """,
+    "PhysicianReviewSummary": """
+    MATCH (phy:Physician)
+    OPTIONAL MATCH (phy)-[:TREATS]->(:Visit)-[:WRITES]->(r:Review)
+    WITH phy, count(r) AS review_count
+    CREATE (:PhysicianReviewSummary {
+        physician_id: phy.id,
+        physician_name: phy.name,
+        review_count: review_count
+    })
+    """,
+}
+
+
+def _rebuild_rollup(tx, label: str, counts: dict[str, int]) -> None:
+    # old and new summaries are swapped in one transaction, so readers never
+    # see a missing or half-built rollup
+    tx.run(f"MATCH (s:{label}) DETACH DELETE s").consume()
+    summary = tx.run(ROLLUP_QUERIES[label]).consume()
+    counts[label] = summary.counters.nodes_created
+
+
+def _drop_rollups(tx, counts: dict[str, int]) -> None:
+    for label in ROLLUP_QUERIES:
+        summary = tx.run(f"MATCH (s:{label}) DETACH DELETE s").consume()
+        counts[label] = summary.counters.nodes_deleted
+
+
+def _missing_rollups(tx) -> list[str]:
+    return [
+        label
+        for label in ROLLUP_QUERIES
+        if tx.run(f"MATCH (s:{label}) RETURN count(s) AS n").single()["n"] == 0
+    ]
+
+
+def missing_rollups(driver, database: str = "neo4j") -> list[str]:
+    """
+    Find the rollups that have no summary nodes yet.
+
+    Args:
+        driver: The Neo4j driver.
+        database (str): The Neo4j database.
+    Returns:
+        list[str]: The summary labels without nodes.
+    """
+    with driver.session(database=database) as session:
+        return session.execute_read(_missing_rollups)
+
+
+def build_rollups(
+    driver, database: str = "neo4j", max_attempts: int = 5
+) -> dict[str, int]:
+    """
+    Recompute every rollup from the loaded graph, one transaction per rollup.
+
+    Args:
+        driver: The Neo4j driver.
+        database (str): The Neo4j database.
+        max_attempts (int): Attempts per transaction on transient errors.
+    Returns:
+        dict[str, int]: The number of summary nodes per summary label.
+    """
+    started_at = time.perf_counter()
+    counts: dict[str, int] = {}
+    with driver.session(database=database) as session:
+        for label in ROLLUP_QUERIES:
+            execute_write_with_retry(
+                session, _rebuild_rollup, label, counts, max_attempts=max_attempts
+            )
+            LOGGER.info(f"Rollups: {label} rebuilt, {counts[label]} nodes")
+    LOGGER.info(f"Rollups: done in {time.perf_counter() - started_at:.1f}s")
+    return counts
+
+
+def drop_rollups(driver, database: str = "neo4j", max_attempts: int = 5) -> int:
+    """
+    Delete every summary node, so disabled rollups do not go stale.
+
+    Args:
+        driver: The Neo4j driver.
+        database (str): The Neo4j database.
+        max_attempts (int): Attempts per transaction on transient errors.
+    Returns:
+        int: The number of summary nodes deleted.
+    """
+    counts: dict[str, int] = {}
+    with driver.session(database=database) as session:
+        execute_write_with_retry(
+            session, _drop_rollups, counts, max_attempts=max_attempts
+        )
+    deleted = sum(counts.values())
+    if deleted:
+        LOGGER.info(f"Rollups: disabled, deleted {deleted} summary nodes")
+    return deleted
@@ -0,0 +1,160 @@
+"""
+Local state of the last ETL run: a hash of every row loaded, keyed by entity
+and id, used by the incremental mode to write only new and changed rows
+"""
+import hashlib
+import json
+import os
+import sqlite3
+from typing import Any, Iterable, Iterator, Optional
+
+# SQLite limits the number of parameters of a statement
+_MAX_PARAMS = 900
+
+
+def row_hash(row: dict[str, Any]) -> str:
+    """
+    Stable hash of a typed row.
+
+    Args:
+        row (dict): The row, as sent to Neo4j.
+    Returns:
+        str: Hex digest of the row's content.
+    """
+    payload = json.dumps(row, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RowStateStore:
+    """
+    SQLite table of (entity, id) -> (row hash, run in which the row was last
+    seen), plus a few metadata values such as the data version written to the
+    graph by the run that produced this state.
+    """
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS row_state (
+                entity TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                hash TEXT NOT NULL,
+                run INTEGER NOT NULL,
+                PRIMARY KEY (entity, id)
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            """
+        )
+        self._conn.commit()
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+        self._conn.commit()
+
+    def delete_meta(self, key: str) -> None:
+        self._conn.execute("DELETE FROM meta WHERE key = ?", (key,))
+        self._conn.commit()
+
+    def reset(self) -> None:
+        """
+        Forget every row, e.g. before a full load.
+        """
+        self._conn.execute("DELETE FROM row_state")
+        self._conn.execute("DELETE FROM meta WHERE key = 'data_version'")
+        self._conn.commit()
+
+    def start_run(self) -> int:
+        """
+        Start a new run.
+
+        Returns:
+            int: The run number, used to tell rows seen in this run from rows
+            that disappeared from the source.
+        """
+        run = int(self.get_meta("run") or 0) + 1
+        self.set_meta("run", str(run))
+        return run
+
+    def hashes(self, entity: str, ids: list[int]) -> dict[int, str]:
+        """
+        Look up the stored hashes of some rows.
+
+        Args:
+            entity (str): The entity (node label).
+            ids (list[int]): The row ids.
+        Returns:
+            dict[int, str]: Stored hash by id, for the ids that have one.
+        """
+        found = {}
+        for start in range(0, len(ids), _MAX_PARAMS):
+            chunk = ids[start : start + _MAX_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            found.update(
+                self._conn.execute(
+                    f"SELECT id, hash FROM row_state "
+                    f"WHERE entity = ? AND id IN ({placeholders})",
+                    (entity, *chunk),
+                ).fetchall()
+            )
+        return found
+
+    def record(self, entity: str, hashes: dict[int, str], run: int) -> None:
+        """
+        Store the hashes of rows loaded (or found unchanged) in a run.
+
+        Args:
+            entity (str): The entity (node label).
+            hashes (dict[int, str]): Row hash by id.
+            run (int): The current run.
+        Returns:
+            None
+        """
+        self._conn.executemany(
+            "INSERT INTO row_state (entity, id, hash, run) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (entity, id) DO UPDATE "
+            "SET hash = excluded.hash, run = excluded.run",
+            [(entity, id_, hash_, run) for id_, hash_ in hashes.items()],
+        )
+        self._conn.commit()
+
+    def missing_ids(self, entity: str, run: int) -> Iterator[int]:
+        """
+        Ids of rows loaded by earlier runs but not seen in this one.
+
+        Args:
+            entity (str): The entity (node label).
+            run (int): The current run.
+        Returns:
+            Iterator[int]: The ids.
+        """
+        rows = self._conn.execute(
+            "SELECT id FROM row_state WHERE entity = ? AND run < ?", (entity, run)
+        ).fetchall()
+        return (id_ for (id_,) in rows)
+
+    def forget(self, entity: str, ids: Iterable[int]) -> None:
+        """
+        Drop rows from the state, after deleting them from the graph.
+        """
+        self._conn.executemany(
+            "DELETE FROM row_state WHERE entity = ? AND id = ?",
+            [(entity, id_) for id_ in ids],
+        )
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,230 @@
+import itertools
+from random import Random
+
+from batch_loader import (
+    Stage,
+    iter_csv_batches,
+    load_csv_stages_parallel,
+    partition_round,
+    plan_batch,
+    to_int,
+)
+from hospital_bulk_csv_write import STAGE_GROUPS
+from state_store import RowStateStore, row_hash
+
+KEYS = ("hospital_id", "payer_id", "physician_id", "patient_id")
+VISIT_PARTITION_KEYS = next(
+    stage.partition_keys
+    for group in STAGE_GROUPS
+    for stage in group
+    if stage.label == "Visit"
+)
+
+
+def visit(visit_id, hospital, payer, physician, patient):
+    return {
+        "id": visit_id,
+        "hospital_id": hospital,
+        "payer_id": payer,
+        "physician_id": physician,
+        "patient_id": patient,
+    }
+
+
+def shared_values(batches):
+    seen = {}
+    shared = set()
+    for i, batch in enumerate(batches):
+        for row in batch:
+            for key in KEYS:
+                owner = seen.setdefault((key, row[key]), i)
+                if owner != i:
+                    shared.add((key, row[key]))
+    return shared
+
+
+def test_partition_round_batches_share_no_endpoint():
+    rows = [
+        visit(i, i % 7, i % 3, i % 11, i % 13)
+        for i in range(200)
+    ]
+    batches, deferred = partition_round(rows, KEYS, workers=4, batch_size=50)
+
+    assert batches
+    assert not shared_values(batches)
+    assert all(len(batch) <= 50 for batch in batches)
+    written = [row["id"] for batch in batches for row in batch]
+    assert sorted(written + [row["id"] for row in deferred]) == list(range(200))
+
+
+def test_partition_round_spreads_independent_rows():
+    rows = [visit(i, i, i, i, i) for i in range(8)]
+    batches, deferred = partition_round(rows, KEYS, workers=4, batch_size=2)
+
+    assert [len(batch) for batch in batches] == [2, 2, 2, 2]
+    assert deferred == []
+
+
+def test_partition_round_defers_rows_joining_two_batches_and_full_batches():
+    rows = [
+        visit(1, "h1", "p1", "d1", "a1"),
+        visit(2, "h2", "p2", "d2", "a2"),
+        # hospital of the first batch, payer of the second
+        visit(3, "h1", "p2", "d3", "a3"),
+        visit(4, "h1", "p1", "d4", "a4"),
+        visit(5, "h1", "p1", "d5", "a5"),
+    ]
+    batches, deferred = partition_round(rows, KEYS, workers=2, batch_size=2)
+
+    assert [[row["id"] for row in batch] for batch in batches] == [[1, 4], [2]]
+    assert [row["id"] for row in deferred] == [3, 5]
+
+
+def test_rounds_eventually_write_every_row():
+    rows = [visit(i, i % 2, 0, i % 5, i) for i in range(30)]
+    written, pending = [], rows
+    for _ in itertools.count():
+        batches, pending = partition_round(pending, KEYS, workers=3, batch_size=4)
+        assert not shared_values(batches)
+        written += [row["id"] for batch in batches for row in batch]
+        if not pending:
+            break
+    assert sorted(written) == list(range(30))
+
+
+def test_partition_round_fills_every_writer_with_realistic_cardinalities():
+    # the visits file: 30 hospitals, 5 payers, 500 physicians, ~10k patients
+    random = Random(0)
+    rows = [
+        visit(
+            i,
+            random.randrange(30),
+            random.randrange(5),
+            random.randrange(500),
+            random.randrange(10000),
+        )
+        for i in range(16000)
+    ]
+    batches, deferred = partition_round(
+        rows, VISIT_PARTITION_KEYS, workers=8, batch_size=1000
+    )
+
+    assert len(batches) == 8
+    assert sum(len(batch) for batch in batches) >= 7500
+    assert len(rows) - len(deferred) == sum(len(batch) for batch in batches)
+
+
+def test_iter_csv_batches(tmp_path):
+    path = tmp_path / "payers.csv"
+    path.write_text("payer_id,payer_name\n1,Cigna\n2,Aetna\n3,\n", encoding="utf-8")
+
+    batches = list(
+        iter_csv_batches(
+            str(path),
+            2,
+            lambda r: {"id": to_int(r["payer_id"]), "name": r["payer_name"] or None},
+        )
+    )
+
+    assert batches == [
+        [{"id": 1, "name": "Cigna"}, {"id": 2, "name": "Aetna"}],
+        [{"id": 3, "name": None}],
+    ]
+
+
+def test_plan_batch_sorts_new_updated_and_unchanged_rows(tmp_path):
+    stage = Stage("Payer", "", lambda r: r, [])
+    state = RowStateStore(str(tmp_path / "state.sqlite"))
+    run = state.start_run()
+    old = [{"id": 1, "name": "Cigna"}, {"id": 2, "name": "Aetna"}]
+    state.record("Payer", {row["id"]: row_hash(row) for row in old}, run)
+
+    rows = [
+        {"id": 1, "name": "Cigna"},
+        {"id": 2, "name": "Aetna Health"},
+        {"id": 3, "name": "Medicaid"},
+    ]
+    plan = plan_batch(stage, rows, state, incremental=True)
+
+    assert [row["id"] for row in plan.rows] == [3, 2]
+    assert [row["id"] for row in plan.updated_rows] == [2]
+    assert plan.skipped == 1 and plan.inserted == 1
+    assert set(plan.hashes) == {1, 2, 3}
+    state.close()
+
+
+def test_plan_batch_writes_every_row_in_full_mode(tmp_path):
+    stage = Stage("Payer", "", lambda r: r, [])
+    state = RowStateStore(str(tmp_path / "state.sqlite"))
+    rows = [{"id": 1, "name": "Cigna"}]
+    state.record("Payer", {1: row_hash(rows[0])}, state.start_run())
+
+    plan = plan_batch(stage, rows, state, incremental=False)
+
+    assert plan.rows == rows and plan.updated_rows == [] and plan.skipped == 0
+    state.close()
+
+
+class FakeTransaction:
+    def __init__(self, writes):
+        self.writes = writes
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, rows=None, **params):
+        self.writes.append([row["id"] for row in rows or []])
+        return self
+
+    def consume(self):
+        return None
+
+    def commit(self):
+        pass
+
+
+class FakeDriver:
+    def __init__(self):
+        self.writes = []
+
+    def session(self, **kwargs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def begin_transaction(self):
+        return FakeTransaction(self.writes)
+
+
+def test_partitioned_stage_writes_and_records_every_row(tmp_path):
+    path = tmp_path / "visits.csv"
+    lines = ["visit_id,hospital_id,payer_id,physician_id,patient_id"]
+    lines += [f"{i},{i % 5},{i % 3},{i % 7},{i}" for i in range(100)]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    stage = Stage(
+        "Visit",
+        str(path),
+        lambda r: {k: to_int(v) for k, v in r.items()} | {"id": to_int(r["visit_id"])},
+        ["UNWIND $rows AS row MERGE (v:Visit {id: row.id})"],
+        partition_keys=KEYS,
+    )
+    state = RowStateStore(str(tmp_path / "state.sqlite"))
+    driver = FakeDriver()
+
+    [progress] = load_csv_stages_parallel(
+        driver, [stage], batch_size=10, workers=3, state=state, run=state.start_run()
+    )
+
+    written = sorted(i for batch in driver.writes for i in batch)
+    assert written == list(range(100))
+    assert all(len(batch) <= 10 for batch in driver.writes)
+    assert progress.inserted == 100
+    assert len(state.hashes("Visit", list(range(100)))) == 100
+    state.close()
@@ -0,0 +1,83 @@
+import types
+
+import hospital_bulk_csv_write as etl
+from batch_loader import StageProgress
+from state_store import RowStateStore
+
+
+class FakeSession:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute_read(self, fn, *args):
+        assert fn is etl._get_data_version
+        return self.graph["version"]
+
+    def execute_write(self, fn, *args):
+        if fn is etl._set_data_version:
+            self.graph["version"] = args[0]
+
+
+class FakeDriver:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def session(self, database=None):
+        return FakeSession(self.graph)
+
+    def close(self):
+        pass
+
+
+def test_run_after_a_crash_rebuilds_rollups_and_bumps_the_version(
+    tmp_path, monkeypatch
+):
+    state_path = str(tmp_path / "state.sqlite")
+    state = RowStateStore(state_path)
+    state.start_run()
+    state.set_meta("data_version", "v1")
+    state.close()
+    graph = {"version": "v1"}
+    # rows change in the first attempt only: the rerun finds their hashes
+    changes = {"Visit": 3}
+    rollup_builds = []
+
+    def load_csv_stage(driver, stage, batch_size, **kwargs):
+        progress = StageProgress(stage.label)
+        progress.inserted = changes.pop(stage.label, 0)
+        return progress
+
+    def build_rollups(driver, **kwargs):
+        rollup_builds.append(graph["version"])
+        if len(rollup_builds) == 1:
+            raise RuntimeError("connection dropped")
+
+    monkeypatch.setattr(
+        etl, "GraphDatabase", types.SimpleNamespace(driver=lambda *a, **k: FakeDriver(graph))
+    )
+    monkeypatch.setattr(etl, "ETL_MODE", "incremental")
+    monkeypatch.setattr(etl, "ETL_STATE_PATH", state_path)
+    monkeypatch.setattr(etl, "ETL_WORKERS", 1)
+    monkeypatch.setattr(etl, "ETL_ROLLUPS", True)
+    monkeypatch.setattr(etl, "ETL_EMBED_REVIEWS", False)
+    monkeypatch.setattr(etl, "ETL_INDEX_ADVISOR", "off")
+    monkeypatch.setattr(etl, "load_csv_stage", load_csv_stage)
+    monkeypatch.setattr(etl, "missing_rollups", lambda driver: [])
+    monkeypatch.setattr(etl, "build_rollups", build_rollups)
+    # the retry decorator waits between attempts
+    monkeypatch.setattr("time.sleep", lambda seconds: None)
+
+    etl.load_hospital_graph_from_csv()
+
+    assert rollup_builds == ["v1", "v1"]
+    assert graph["version"] != "v1"
+    state = RowStateStore(state_path)
+    assert state.get_meta("data_version") == graph["version"]
+    assert state.get_meta("in_progress") is None
+    state.close()
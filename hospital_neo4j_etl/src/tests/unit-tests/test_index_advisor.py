@@ -0,0 +1,150 @@
+import json
+
+from index_advisor import (
+    advise_indexes,
+    filtered_properties,
+    find_candidates,
+    read_query_log,
+)
+
+
+def test_filtered_properties_in_maps_and_where_clauses():
+    found = filtered_properties(
+        "MATCH (v:Visit)-[c:COVERED_BY]->(p:Payer {name: 'Cigna'}) "
+        "WHERE v.admission_type = 'Urgent' AND c.billing_amount > 1000 RETURN v"
+    )
+
+    assert found == {
+        ("Payer", "name", "RANGE", False),
+        ("Visit", "admission_type", "RANGE", False),
+        ("COVERED_BY", "billing_amount", "RANGE", True),
+    }
+
+
+def test_text_predicates_and_with_clauses():
+    found = filtered_properties(
+        "MATCH (r:Review) WHERE r.text CONTAINS 'rude' "
+        "AND r.physician_name STARTS WITH 'J' WITH r "
+        "MATCH (h:Hospital) WHERE h.state_name = 'TX' RETURN r, h"
+    )
+
+    assert found == {
+        ("Review", "text", "TEXT", False),
+        ("Review", "physician_name", "RANGE", False),
+        ("Hospital", "state_name", "RANGE", False),
+    }
+
+
+def test_candidates_rank_by_total_time(tmp_path):
+    path = tmp_path / "queries.jsonl"
+    entries = [
+        {"ms": 5, "query": "MATCH (p:Payer) WHERE p.name = 'Cigna' RETURN p"},
+        {"ms": 50, "query": "MATCH (v:Visit) WHERE v.status = 'DISCHARGED' RETURN v"},
+        {"ms": 1, "failed": True, "query": "MATCH (x:Visit) WHERE x.y = 1 RETURN x"},
+        {"ms": 7, "query": "MATCH (p:Payer) WHERE p.name = $name RETURN p"},
+        {
+            "ms": 3,
+            "query": "MATCH (p:Payer) WHERE p.name = $name RETURN p",
+            "params": {"name": "Aetna"},
+        },
+    ]
+    path.write_text(
+        "\n".join(json.dumps(e) for e in entries) + "\nnot json\n", encoding="utf-8"
+    )
+
+    candidates = find_candidates(read_query_log(str(path)))
+
+    assert [(c.label, c.prop) for c in candidates] == [
+        ("Visit", "status"),
+        ("Payer", "name"),
+    ]
+    payer = candidates[1]
+    assert payer.queries == 3 and payer.total_ms == 15
+    # parameterized queries logged without their values are not replayable
+    assert payer.samples == [
+        ("MATCH (p:Payer) WHERE p.name = 'Cigna' RETURN p", {}),
+        ("MATCH (p:Payer) WHERE p.name = $name RETURN p", {"name": "Aetna"}),
+    ]
+
+
+class FakeResult(list):
+    def consume(self):
+        return None
+
+    def single(self):
+        return self[0]
+
+
+class FakeTransaction:
+    def __init__(self, runs):
+        self.runs = runs
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, params=None, **kwargs):
+        text = getattr(query, "text", query)
+        self.runs.append((text, params))
+        if text.startswith("SHOW INDEXES"):
+            return FakeResult()
+        if "count(e)" in text:
+            return FakeResult([{"n": 5000}])
+        return FakeResult()
+
+    def commit(self):
+        pass
+
+
+class FakeDriver:
+    def __init__(self):
+        self.runs = []
+
+    def session(self, **kwargs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute_read(self, work, *args):
+        return work(FakeTransaction(self.runs), *args)
+
+    def begin_transaction(self):
+        return FakeTransaction(self.runs)
+
+    def run(self, query, **params):
+        return FakeResult()
+
+
+def write_log(path, entries):
+    path.write_text("\n".join(json.dumps(e) for e in entries), encoding="utf-8")
+
+
+def test_apply_replays_logged_parameters(tmp_path):
+    path = tmp_path / "queries.jsonl"
+    query = "MATCH (v:Visit) WHERE v.admission_type = $type RETURN v"
+    write_log(path, [{"ms": 40, "query": query, "params": {"type": "Urgent"}}] * 3)
+    driver = FakeDriver()
+
+    [report] = advise_indexes(driver, str(path), apply=True, min_queries=3, repeats=1)
+
+    assert report["index"] == "advisor_visit_admission_type_range"
+    assert report["before_ms"] >= 0 and report["after_ms"] >= 0
+    assert (query, {"type": "Urgent"}) in driver.runs
+
+
+def test_apply_without_replayable_queries_is_not_measured(tmp_path):
+    path = tmp_path / "queries.jsonl"
+    query = "MATCH (v:Visit) WHERE v.admission_type = $type RETURN v"
+    write_log(path, [{"ms": 40, "query": query}] * 3)
+
+    [report] = advise_indexes(
+        FakeDriver(), str(path), apply=True, min_queries=3, repeats=1
+    )
+
+    assert report["before_ms"] is None and report["after_ms"] is None
@@ -0,0 +1,122 @@
+import numpy as np
+
+import review_embeddings
+from review_embeddings import (
+    REVIEW_TEXT_PROPERTIES,
+    _text_hash,
+    embed_reviews,
+    review_text,
+    reviews_to_embed,
+)
+
+VALUES = ["Dr. Lee", "Ann Park", "Great care.", "Wallace-Hamilton"]
+
+
+def review(id_, values=VALUES, hash_=None, embedded=False):
+    return {"id": id_, "values": list(values), "hash": hash_, "embedded": embedded}
+
+
+def test_review_text_matches_neo4j_vector_documents():
+    # reduce(str='', k IN $props | str + '\n' + k + ':' + coalesce(n[k], ''))
+    assert REVIEW_TEXT_PROPERTIES == [
+        "physician_name", "patient_name", "text", "hospital_name",
+    ]
+    assert review_text(VALUES) == (
+        "\nphysician_name:Dr. Lee\npatient_name:Ann Park"
+        "\ntext:Great care.\nhospital_name:Wallace-Hamilton"
+    )
+    assert review_text(["Dr. Lee", None, "Great care.", None]) == (
+        "\nphysician_name:Dr. Lee\npatient_name:\ntext:Great care.\nhospital_name:"
+    )
+
+
+def test_text_hash_is_stable_and_content_based():
+    assert _text_hash("a") == _text_hash("a")
+    assert _text_hash("a") != _text_hash("b")
+    assert len(_text_hash("a")) == 64
+
+
+def test_reviews_to_embed_picks_missing_and_changed_embeddings():
+    current = _text_hash(review_text(VALUES))
+    changed = ["Dr. Lee", "Ann Park", "Long wait.", "Wallace-Hamilton"]
+    reviews = [
+        review(1),
+        review(2, hash_=current, embedded=True),
+        review(3, changed, hash_=current, embedded=True),
+        # embedded by an older ETL, without a hash
+        review(4, embedded=True),
+    ]
+
+    todo = reviews_to_embed(reviews)
+
+    assert [r["id"] for r in todo] == [1, 3, 4]
+    assert todo[1]["text"] == review_text(changed)
+    assert todo[1]["new_hash"] == _text_hash(review_text(changed))
+
+
+class FakeSession:
+    def __init__(self, reviews):
+        self.reviews = reviews
+        self.writes = []
+        self.dimensions = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute_read(self, work):
+        return self.reviews
+
+    def begin_transaction(self):
+        return self
+
+    def run(self, query, rows=None, dimensions=None, **params):
+        if rows is not None:
+            self.writes.append(rows)
+        if dimensions is not None:
+            self.dimensions = dimensions
+        return self
+
+    def consume(self):
+        return None
+
+    def commit(self):
+        pass
+
+
+class FakeDriver:
+    def __init__(self, session):
+        self._session = session
+
+    def session(self, **kwargs):
+        return self._session
+
+
+class FakeModel:
+    def __init__(self, name, device=None):
+        self.encoded = []
+
+    def encode(self, texts, batch_size=None):
+        self.encoded.extend(texts)
+        return np.array([[float(len(text)), 1.0] for text in texts])
+
+    def get_sentence_embedding_dimension(self):
+        return 2
+
+
+def test_embed_reviews_writes_only_the_reviews_to_embed(monkeypatch):
+    monkeypatch.setattr(review_embeddings, "SentenceTransformer", FakeModel)
+    current = _text_hash(review_text(VALUES))
+    session = FakeSession(
+        [review(i) for i in range(3)] + [review(3, hash_=current, embedded=True)]
+    )
+
+    assert embed_reviews(FakeDriver(session), "model", batch_size=2) == 3
+
+    assert [[row["id"] for row in rows] for rows in session.writes] == [[0, 1], [2]]
+    row = session.writes[0][0]
+    assert row["hash"] == current
+    assert row["embedding"] == [float(len(review_text(VALUES))), 1.0]
+    assert session.dimensions == 2
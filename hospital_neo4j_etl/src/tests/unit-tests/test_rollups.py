@@ -0,0 +1,130 @@
+import re
+
+from rollups import ROLLUP_QUERIES, build_rollups, drop_rollups, missing_rollups
+
+# the summary labels and properties the API's schema hints and Cypher examples
+# read (chatbot_api/src/chains/cypher_chain.py, cypher_examples.json)
+API_ROLLUP_PROPERTIES = {
+    "PayerYearSummary": {
+        "payer_name", "year", "visit_count", "total_billing", "average_billing",
+    },
+    "AdmissionTypeSummary": {"admission_type", "visit_count", "average_stay_days"},
+    "StateYearSummary": {"state_name", "year", "visit_count"},
+    "PhysicianReviewSummary": {"physician_id", "physician_name", "review_count"},
+}
+
+_CREATE = re.compile(r"CREATE \(:(\w+) \{(.*?)\}\)", re.DOTALL)
+
+
+class FakeResult:
+    def __init__(self, created=0, deleted=0, count=None):
+        self.counters = self
+        self.nodes_created = created
+        self.nodes_deleted = deleted
+        self.count = count
+
+    def consume(self):
+        return self
+
+    def single(self):
+        return {"n": self.count}
+
+
+class FakeTransaction:
+    """
+    Runs the rollup statements against a count of summary nodes per label.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.queries = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, **params):
+        self.queries.append(query)
+        if query.startswith("MATCH (s:"):
+            label = re.match(r"MATCH \(s:(\w+)\)", query).group(1)
+            if "DETACH DELETE" in query:
+                return FakeResult(deleted=self.graph.pop(label, 0))
+            return FakeResult(count=self.graph.get(label, 0))
+        label = _CREATE.search(query).group(1)
+        created = 3
+        self.graph[label] = created
+        return FakeResult(created=created)
+
+    def commit(self):
+        self.graph.setdefault("commits", 0)
+        self.graph["commits"] += 1
+
+
+class FakeDriver:
+    def __init__(self, graph):
+        self.graph = graph
+        self.transactions = []
+
+    def session(self, **kwargs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def begin_transaction(self):
+        tx = FakeTransaction(self.graph)
+        self.transactions.append(tx)
+        return tx
+
+    def execute_read(self, work, *args):
+        return work(FakeTransaction(self.graph), *args)
+
+
+def test_rollups_create_the_labels_and_properties_the_api_reads():
+    created = {}
+    for label, query in ROLLUP_QUERIES.items():
+        [(created_label, properties)] = _CREATE.findall(query)
+        assert created_label == label
+        created[label] = set(re.findall(r"(\w+):", properties))
+
+    assert created == API_ROLLUP_PROPERTIES
+
+
+def test_build_rollups_swaps_each_rollup_in_one_transaction():
+    graph = {"PayerYearSummary": 7}
+    driver = FakeDriver(graph)
+
+    counts = build_rollups(driver)
+
+    assert counts == {label: 3 for label in ROLLUP_QUERIES}
+    assert len(driver.transactions) == len(ROLLUP_QUERIES)
+    for tx, label in zip(driver.transactions, ROLLUP_QUERIES):
+        # the old nodes are deleted in the transaction creating the new ones
+        assert tx.queries[0] == f"MATCH (s:{label}) DETACH DELETE s"
+        assert tx.queries[1] == ROLLUP_QUERIES[label]
+    assert graph["commits"] == len(ROLLUP_QUERIES)
+    assert missing_rollups(driver) == []
+
+
+def test_missing_rollups_are_labels_without_nodes():
+    graph = {"PayerYearSummary": 7, "StateYearSummary": 2}
+
+    assert missing_rollups(FakeDriver(graph)) == [
+        "AdmissionTypeSummary",
+        "PhysicianReviewSummary",
+    ]
+
+
+def test_drop_rollups_deletes_every_summary_label():
+    graph = {"PayerYearSummary": 7, "StateYearSummary": 2}
+    driver = FakeDriver(graph)
+
+    assert drop_rollups(driver) == 9
+    assert len(driver.transactions) == 1
+    assert missing_rollups(driver) == list(ROLLUP_QUERIES)
+    assert drop_rollups(driver) == 0
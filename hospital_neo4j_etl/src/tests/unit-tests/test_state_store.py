@@ -0,0 +1,36 @@
+from state_store import RowStateStore, row_hash
+
+
+def test_row_hash_ignores_key_order():
+    assert row_hash({"id": 1, "name": "Cigna"}) == row_hash({"name": "Cigna", "id": 1})
+    assert row_hash({"id": 1, "name": "Cigna"}) != row_hash({"id": 1, "name": "Aetna"})
+
+
+def test_missing_ids_are_rows_not_seen_in_the_run(tmp_path):
+    state = RowStateStore(str(tmp_path / "state.sqlite"))
+    first = state.start_run()
+    state.record("Payer", {1: "a", 2: "b"}, first)
+    second = state.start_run()
+    state.record("Payer", {1: "a"}, second)
+
+    assert list(state.missing_ids("Payer", second)) == [2]
+    state.forget("Payer", [2])
+    assert list(state.missing_ids("Payer", second)) == []
+    assert state.hashes("Payer", [1, 2]) == {1: "a"}
+    state.close()
+
+
+def test_reset_keeps_the_run_counter(tmp_path):
+    path = str(tmp_path / "state.sqlite")
+    state = RowStateStore(path)
+    run = state.start_run()
+    state.record("Payer", {1: "a"}, run)
+    state.set_meta("data_version", "v1")
+    state.close()
+
+    state = RowStateStore(path)
+    state.reset()
+    assert state.hashes("Payer", [1]) == {}
+    assert state.get_meta("data_version") is None
+    assert state.start_run() == run + 1
+    state.close()
@@ -0,0 +1,153 @@
+"""
+Compare the embedding backends (PyTorch, ONNX, int8 ONNX) on the review and
+hospital document corpora: model load time, memory, corpus encoding
+throughput, single-query latency, and recall@k of each backend's search
+against the PyTorch results.
+
+Run from the repository root, with the API requirements installed:
+
+    python tests/perf-smoke-tests/embedding_backends.py
+"""
+import argparse
+import csv
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+API_SRC = os.path.join(os.path.dirname(__file__), "..", "..", "chatbot_api", "src")
+sys.path.insert(0, API_SRC)
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter  # noqa: E402
+
+from chains.file_retrieval import LOADERS, _list_docs  # noqa: E402
+from utils.embeddings import EMBEDDING_BACKENDS, load_embedding_model  # noqa: E402
+
+REVIEWS_CSV = os.path.join(os.path.dirname(__file__), "..", "..", "data", "reviews.csv")
+DOCS_PATH = os.path.join(API_SRC, "kb_docs_retrievable")
+REVIEW_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+DOCS_MODEL = os.getenv("FILE_RETRIEVAL_EMBEDDINGS", REVIEW_MODEL)
+
+REVIEW_QUESTIONS = [
+    "What are patients saying about the nursing staff at Castaneda-Hardy?",
+    "At which hospitals are patients complaining about billing and insurance issues?",  # E501
+    "Have any patients complained about noise?",
+    "What do patients think about the food?",
+    "Did anyone have a bad experience with the doctors?",
+    "Are patients happy with how clean the rooms are?",
+    "What do patients say about waiting times in the emergency room?",
+    "Which reviews mention friendly staff?",
+]
+
+DOC_QUESTIONS = [
+    "What services does Brown-Golden offer?",
+    "When was Castaneda-Hardy founded?",
+    "Which hospital has a cardiology department?",
+    "What are the visiting hours?",
+    "Does the hospital have a pediatric unit?",
+    "Where is Boyd PLC located?",
+]
+
+
+def load_reviews() -> list[str]:
+    # same text as the ETL embeds
+    properties = ["physician_name", "patient_name", "review", "hospital_name"]
+    names = ["physician_name", "patient_name", "text", "hospital_name"]
+    with open(REVIEWS_CSV, encoding="utf-8", newline="") as f:
+        return [
+            "".join(f"\n{n}:{row[p]}" for n, p in zip(names, properties))
+            for row in csv.DictReader(f)
+        ]
+
+
+def load_doc_chunks() -> list[str]:
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    chunks = []
+    for path in _list_docs(DOCS_PATH):
+        loader = LOADERS[os.path.splitext(path)[1]](path)
+        chunks += [d.page_content for d in splitter.split_documents(loader.load())]
+    return chunks
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    corpus = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    return np.argsort(-(queries @ corpus.T), axis=1)[:, :k]
+
+
+def recall_at_k(results: np.ndarray, baseline: np.ndarray) -> float:
+    k = baseline.shape[1]
+    return float(
+        np.mean([len(set(r) & set(b)) / k for r, b in zip(results, baseline)])
+    )
+
+
+def bench(model_name, backend, corpus, questions, k):
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    model = load_embedding_model(model_name, backend)
+    load_s = time.perf_counter() - started
+    model.embed_query(questions[0])  # warm up
+
+    started = time.perf_counter()
+    corpus_vectors = np.array(model.embed_documents(corpus))
+    throughput = len(corpus) / (time.perf_counter() - started)
+
+    latencies, query_vectors = [], []
+    for _ in range(5):
+        for question in questions:
+            started = time.perf_counter()
+            model.embed_query(question)
+            latencies.append((time.perf_counter() - started) * 1000)
+    for question in questions:
+        query_vectors.append(model.embed_query(question))
+
+    return {
+        "load_s": load_s,
+        "rss_mb": rss_mb() - rss_before,
+        "texts_per_s": throughput,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": statistics.quantiles(latencies, n=20)[-1],
+        "top_k": top_k(corpus_vectors, np.array(query_vectors), k),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--backends", nargs="+", default=list(EMBEDDING_BACKENDS))
+    parser.add_argument("--k", type=int, default=7)
+    args = parser.parse_args()
+    # recall is measured against the first backend: PyTorch, if benchmarked
+    backends = sorted(args.backends, key=lambda backend: backend != "torch")
+
+    corpora = [
+        ("reviews", REVIEW_MODEL, load_reviews(), REVIEW_QUESTIONS),
+        ("documents", DOCS_MODEL, load_doc_chunks(), DOC_QUESTIONS),
+    ]
+    for corpus_name, model_name, corpus, questions in corpora:
+        print(f"\n{corpus_name}: {len(corpus)} texts, {model_name}")
+        print(
+            f"{'backend':<10} {'load s':>7} {'RSS MB':>7} {'texts/s':>8} "
+            f"{'p50 ms':>7} {'p95 ms':>7} {'recall@' + str(args.k):>9}"
+        )
+        baseline = None
+        for backend in backends:
+            r = bench(model_name, backend, corpus, questions, args.k)
+            if baseline is None:
+                baseline = r["top_k"]
+            print(
+                f"{backend:<10} {r['load_s']:>7.1f} {r['rss_mb']:>7.0f} "
+                f"{r['texts_per_s']:>8.0f} {r['p50_ms']:>7.1f} {r['p95_ms']:>7.1f} "
+                f"{recall_at_k(r['top_k'], baseline):>9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()